@@ -0,0 +1,67 @@
+from __future__ import annotations
+from typing import List
+import argparse
+import json
+import sys
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument(
+        "--threshold", type=float, default=0.10, help="Allowed median slowdown as a fraction (default 0.10)"
+    )
+    parser.add_argument(
+        "--rss-threshold", type=float, default=0.10, help="Allowed peak RSS growth as a fraction (default 0.10)"
+    )
+    parser.add_argument(
+        "--min-delta-mb", type=float, default=5.0, help="Ignore peak RSS changes below this (allocator noise)"
+    )
+    parser.add_argument(
+        "--min-delta-ms", type=float, default=1.0, help="Ignore absolute changes below this (timer noise)"
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        base = json.load(f)
+    with open(args.candidate) as f:
+        cand = json.load(f)
+
+    regressions = 0
+    print(f"{'benchmark':<40} {'baseline ms':>12} {'candidate ms':>13} {'change':>8}")
+    for name in sorted(set(base["results"]) & set(cand["results"])):
+        old = base["results"][name]["median_s"]
+        new = cand["results"][name]["median_s"]
+        change = (new - old) / old if old else 0.0
+        flag = ""
+        if change > args.threshold and (new - old) * 1000 >= args.min_delta_ms:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{name:<40} {old * 1000:12.2f} {new * 1000:13.2f} {change:+8.1%}{flag}")
+
+    # Memory benchmarks also record peak RSS; compared only where both runs have it
+    memory = [
+        name
+        for name in sorted(set(base["results"]) & set(cand["results"]))
+        if "peak_rss_mb" in base["results"][name] and "peak_rss_mb" in cand["results"][name]
+    ]
+    if memory:
+        print(f"\n{'benchmark':<40} {'baseline MB':>12} {'candidate MB':>13} {'change':>8}")
+    for name in memory:
+        old = base["results"][name]["peak_rss_mb"]
+        new = cand["results"][name]["peak_rss_mb"]
+        change = (new - old) / old if old else 0.0
+        flag = ""
+        if change > args.rss_threshold and new - old >= args.min_delta_mb:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{name:<40} {old:12.1f} {new:13.1f} {change:+8.1%}{flag}")
+
+    commits = f"{base['meta'].get('commit')} -> {cand['meta'].get('commit')}"
+    print(f"{regressions} regression(s) ({commits})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
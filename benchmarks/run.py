@@ -0,0 +1,302 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from insight_agent.column_mapper import map_columns, mapping_cache
+from insight_agent.engine import InsightEngine
+from insight_agent.frame import build_frame
+from benchmarks.synth import synth_daily, synth_export, to_csv
+
+# Modules timed by bench_startup; service.api is what a fresh API instance imports
+STARTUP_MODULES = ("insight_agent", "insight_agent.engine", "service.api")
+
+
+def timeit(fn: Callable[[], Any], repeat: int, warmup: int = 1) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        "median_s": statistics.median(samples),
+        "min_s": min(samples),
+        "mean_s": statistics.fmean(samples),
+        "runs": float(repeat),
+    }
+
+
+def bench_mapper(repeat: int) -> Dict[str, Dict[str, float]]:
+    headers = [synth_export(0, variant=v)[0] for v in range(12)]
+
+    def cold() -> None:
+        mapping_cache.clear()
+        for h in headers:
+            map_columns(h)
+
+    def warm() -> None:
+        for h in headers:
+            map_columns(h)
+
+    return {"map_columns.cold": timeit(cold, repeat), "map_columns.warm": timeit(warm, repeat * 10)}
+
+
+def bench_engine(rows: int, null_density: float, repeat: int) -> Dict[str, Dict[str, float]]:
+    engine = InsightEngine()
+    columns, data = synth_export(rows, null_density=null_density)
+    mapping = map_columns(columns)
+    frame = build_frame(columns, data, mapping)
+    records = frame.to_rows()
+    csv_text = to_csv(columns, data)
+    sharded = {"workers": max(2, os.cpu_count() or 1), "shard_rows": 10_000}
+
+    results: Dict[str, Dict[str, float]] = {
+        "build_frame": timeit(lambda: build_frame(columns, data, mapping), repeat),
+        "rows_to_metrics": timeit(lambda: engine._rows_to_metrics(columns, data, mapping), repeat),
+        "analyze.rows": timeit(lambda: engine.analyze({"columns": columns, "rows": data}), repeat),
+        "analyze.csv": timeit(lambda: engine.analyze({"csv": csv_text}), repeat),
+        "analyze.rows.sharded": timeit(
+            lambda: engine.analyze({"columns": columns, "rows": data, "config": sharded}), repeat
+        ),
+    }
+    # The same row count as 90 days of daily rows per ad, windowed before the agents run
+    daily_columns, daily = synth_daily(max(1, rows // 90))
+    results["analyze.daily"] = timeit(lambda: engine.analyze({"columns": daily_columns, "rows": daily}), repeat)
+    parquet = _parquet_bytes(csv_text)
+    if parquet is not None:
+        results["analyze.parquet"] = timeit(lambda: engine.analyze_arrow(parquet), repeat)
+    for agent in engine.agents:
+        results[f"agent.{agent.name}.rules"] = timeit(
+            lambda: [np.flatnonzero(r.mask) for r in agent.rules(frame)], repeat
+        )
+        results[f"agent.{agent.name}.rows"] = timeit(lambda: agent.analyze(records), repeat)
+    return results
+
+
+def bench_http(rows: int, null_density: float, requests: int, concurrency: int) -> Dict[str, Dict[str, float]]:
+    # In-process ASGI round trips; the worker pool follows INSIGHT_WORKERS as in production.
+    # http.analyze runs with the result cache off, so every request is analyzed;
+    # http.analyze.cached repeats one request and is served from the cache.
+    import httpx
+    from insight_agent.result_cache import ResultCache
+    from service import api
+
+    columns, data = synth_export(rows, null_density=null_density)
+    body = {"csv": to_csv(columns, data)}
+
+    async def measure(client: "httpx.AsyncClient") -> Dict[str, float]:
+        latencies: List[float] = []
+        rejected = 0
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one() -> None:
+            nonlocal rejected
+            async with sem:
+                start = time.perf_counter()
+                resp = await client.post("/analyze", json=body)
+                if resp.status_code in (429, 503):
+                    rejected += 1
+                    return
+                resp.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        wall = time.perf_counter() - start
+        if not latencies:
+            raise RuntimeError(f"all {requests} requests were rejected; raise INSIGHT_MAX_QUEUE")
+        latencies.sort()
+        return {
+            "median_s": statistics.median(latencies),
+            "p95_s": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            "min_s": latencies[0],
+            "mean_s": statistics.fmean(latencies),
+            "runs": float(len(latencies)),
+            "rejected": float(rejected),
+            "requests_per_s": len(latencies) / wall,
+        }
+
+    async def run() -> Dict[str, Dict[str, float]]:
+        results: Dict[str, Dict[str, float]] = {}
+        cache = api.results
+        async with api.app.router.lifespan_context(api.app):
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                api.results = ResultCache(max_bytes=0)
+                try:
+                    await client.post("/analyze", json=body)
+                    results["http.analyze"] = await measure(client)
+                finally:
+                    api.results = cache
+                await client.post("/analyze", json=body)
+                results["http.analyze.cached"] = await measure(client)
+        return results
+
+    return asyncio.run(run())
+
+
+def bench_startup(repeat: int) -> Dict[str, Dict[str, float]]:
+    # Cumulative import time of each module in a fresh interpreter, from `python -X importtime`
+    results: Dict[str, Dict[str, float]] = {}
+    for module in STARTUP_MODULES:
+        samples = [_import_time(module) for _ in range(repeat)]
+        results[f"import.{module}"] = {
+            "median_s": statistics.median(samples),
+            "min_s": min(samples),
+            "mean_s": statistics.fmean(samples),
+            "runs": float(repeat),
+        }
+    return results
+
+
+def bench_memory(rows: int) -> Dict[str, Dict[str, float]]:
+    # Peak RSS of one analysis, each in a fresh interpreter so earlier cases and the synthetic
+    # data do not count. One frame holds the whole export, with roll-ups on, so identifier
+    # columns are as large as they get; memory.import is the interpreter plus the engine.
+    columns, data = synth_export(rows)
+    csv_text = to_csv(columns, data)
+    del data
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {"csv": os.path.join(tmp, "export.csv")}
+        with open(paths["csv"], "w", encoding="utf-8") as f:
+            f.write(csv_text)
+        parquet = _parquet_bytes(csv_text)
+        if parquet is not None:
+            paths["parquet"] = os.path.join(tmp, "export.parquet")
+            with open(paths["parquet"], "wb") as f:
+                f.write(parquet)
+        del csv_text, parquet
+
+        config = f"AnalysisConfig(chunk_rows={rows}, rollups=['ad_set', 'campaign', 'account'])"
+        cases = {
+            "memory.import": "pass",
+            "memory.csv": f"engine.analyze_stream({paths['csv']!r}, {config})",
+        }
+        if "parquet" in paths:
+            cases["memory.parquet"] = f"engine.analyze_arrow({paths['parquet']!r}, {config})"
+        for name, call in cases.items():
+            results[name] = _peak_rss(call)
+    return results
+
+
+def _peak_rss(call: str) -> Dict[str, float]:
+    # VmHWM where there is /proc: ru_maxrss survives exec, so it would include the parent
+    code = (
+        "import os, resource, time\n"
+        "from insight_agent.engine import InsightEngine\n"
+        "from insight_agent.models import AnalysisConfig\n"
+        "engine = InsightEngine()\n"
+        "start = time.perf_counter()\n"
+        f"{call}\n"
+        "elapsed = time.perf_counter() - start\n"
+        "peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+        "if os.path.exists('/proc/self/status'):\n"
+        "    with open('/proc/self/status') as f:\n"
+        "        peak = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))\n"
+        "print(elapsed, peak)\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    elapsed, max_rss_kb = out.stdout.split()
+    return {"median_s": float(elapsed), "runs": 1.0, "peak_rss_mb": int(max_rss_kb) / 1024}
+
+
+def _import_time(module: str) -> float:
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True
+    )
+    # Lines are "import time: self [us] | cumulative | name", indented by nesting depth
+    for line in reversed(out.stderr.splitlines()):
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module and not fields[2][1:].startswith(" "):
+            return int(fields[1]) / 1e6
+    raise RuntimeError(f"no importtime entry for {module}")
+
+
+def _parquet_bytes(csv_text: str) -> Optional[bytes]:
+    # Typed columns as a warehouse export would have them; skipped without pyarrow
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pcsv
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None
+    sink = pa.BufferOutputStream()
+    pq.write_table(pcsv.read_csv(pa.py_buffer(csv_text.encode())), sink)
+    return sink.getvalue().to_pybytes()
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="InsightAgent benchmarks")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--null-density", type=float, default=0.02)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--http-rows", type=int, default=5_000)
+    parser.add_argument("--http-requests", type=int, default=50)
+    parser.add_argument("--http-concurrency", type=int, default=8)
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--memory-rows", type=int, default=500_000, help="Export size for the peak RSS cases")
+    parser.add_argument("--skip-memory", action="store_true")
+    parser.add_argument(
+        "--import-budget-ms", type=float, default=1000.0, help="Fail when importing service.api takes longer"
+    )
+    parser.add_argument("--out", default="bench_output.json")
+    args = parser.parse_args(argv)
+
+    results: Dict[str, Dict[str, float]] = {}
+    results.update(bench_startup(args.repeat))
+    results.update(bench_mapper(args.repeat))
+    results.update(bench_engine(args.rows, args.null_density, args.repeat))
+    if not args.skip_http:
+        results.update(bench_http(args.http_rows, args.null_density, args.http_requests, args.http_concurrency))
+    if not args.skip_memory:
+        results.update(bench_memory(args.memory_rows))
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "rows": args.rows,
+            "null_density": args.null_density,
+            "memory_rows": 0 if args.skip_memory else args.memory_rows,
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    for name, r in sorted(results.items()):
+        peak = f"  peak RSS {r['peak_rss_mb']:8.1f} MB" if "peak_rss_mb" in r else ""
+        print(f"{name:<40} median {r['median_s'] * 1000:10.2f} ms{peak}")
+    print(f"wrote {args.out}", file=sys.stderr)
+    api_import_ms = results["import.service.api"]["median_s"] * 1000
+    if api_import_ms > args.import_budget_ms:
+        print(f"import service.api took {api_import_ms:.0f} ms (budget {args.import_budget_ms:.0f} ms)", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
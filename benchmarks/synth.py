@@ -0,0 +1,112 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import date, timedelta
+import csv
+import io
+import random
+
+from insight_agent.column_mapper import CANONICAL_SPECS
+
+_EPOCH = date(2024, 1, 1)
+
+# Columns a typical ad-level export carries, in export order
+EXPORT_KEYS = [
+    "campaign",
+    "ad_set",
+    "ad_name",
+    "ad_id",
+    "spend",
+    "impressions",
+    "clicks",
+    "frequency",
+    "purchases",
+    "purchase_value",
+    "adds_to_cart",
+    "ctr_7d",
+    "ctr_prev7",
+]
+
+
+def synth_export(
+    rows: int,
+    seed: int = 0,
+    null_density: float = 0.02,
+    variant: Optional[int] = None,
+    campaigns: int = 50,
+    ad_sets_per_campaign: int = 8,
+) -> Tuple[List[str], List[List[Any]]]:
+    # Returns (columns, rows) with header names drawn from CANONICAL_SPECS aliases.
+    # `variant` pins the alias choice so repeated calls share one header shape.
+    rng = random.Random(seed)
+    header_rng = random.Random(variant if variant is not None else seed)
+    specs = {s.key: s for s in CANONICAL_SPECS}
+    columns = [header_rng.choice([k] + specs[k].aliases).title() for k in EXPORT_KEYS]
+
+    out: List[List[Any]] = []
+    for i in range(rows):
+        c = rng.randrange(campaigns)
+        s = rng.randrange(ad_sets_per_campaign)
+        impressions = rng.randint(500, 200_000)
+        ctr = rng.lognormvariate(0.0, 0.6)
+        clicks = int(impressions * ctr / 100.0)
+        spend = round(impressions / 1000.0 * rng.uniform(4.0, 25.0), 2)
+        atc = int(clicks * rng.uniform(0.02, 0.2))
+        purchases = int(atc * rng.uniform(0.05, 0.6))
+        ctr_prev7 = round(ctr * rng.uniform(0.8, 1.6), 3)
+        record: Dict[str, Any] = {
+            "campaign": f"Campaign {c:03d}",
+            "ad_set": f"Campaign {c:03d} / Set {s:02d}",
+            "ad_name": f"Ad {i:07d}",
+            "ad_id": str(10_000_000 + i),
+            "spend": f"{spend:,.2f}",
+            "impressions": f"{impressions:,}",
+            "clicks": str(clicks),
+            "frequency": f"{rng.uniform(1.0, 6.0):.2f}",
+            "purchases": str(purchases),
+            "purchase_value": f"{purchases * rng.uniform(15.0, 90.0):.2f}",
+            "adds_to_cart": str(atc),
+            "ctr_7d": f"{ctr:.3f}%",
+            "ctr_prev7": f"{ctr_prev7:.3f}%",
+        }
+        out.append(["" if rng.random() < null_density else record[k] for k in EXPORT_KEYS])
+    return columns, out
+
+
+def to_csv(columns: List[str], rows: List[List[Any]]) -> str:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    writer.writerows(rows)
+    return buf.getvalue()
+
+
+def synth_daily(ads: int, days: int = 90, seed: int = 0) -> Tuple[List[str], List[List[Any]]]:
+    # One row per ad and day, oldest day first, as a daily breakdown export arrives. A
+    # fifth of the ads fatigue: CTR decays and frequency climbs over their last two weeks.
+    rng = random.Random(seed)
+    columns = [
+        "Day", "Campaign Name", "Ad Set Name", "Ad Name", "Ad ID", "Amount Spent", "Impressions", "Link Clicks", "Frequency"
+    ]
+    profiles = [(rng.lognormvariate(0.0, 0.5), rng.randint(200, 20_000), rng.random() < 0.2) for _ in range(ads)]
+    out: List[List[Any]] = []
+    for d in range(days):
+        date = (_EPOCH + timedelta(days=d)).isoformat()
+        late = max(0, d - (days - 14))
+        for a, (ctr, reach, fatigued) in enumerate(profiles):
+            impressions = int(reach * rng.uniform(0.7, 1.3))
+            day_ctr = ctr * (0.93**late if fatigued else rng.uniform(0.9, 1.1))
+            frequency = 1.5 + (0.15 * late if fatigued else rng.uniform(0.0, 1.0))
+            out.append(
+                [
+                    date,
+                    f"Campaign {a % 50:03d}",
+                    f"Campaign {a % 50:03d} / Set {a % 8:02d}",
+                    f"Ad {a:07d}",
+                    str(10_000_000 + a),
+                    f"{impressions / 1000.0 * 9.0:.2f}",
+                    str(impressions),
+                    str(int(impressions * day_ctr / 100.0)),
+                    f"{frequency:.2f}",
+                ]
+            )
+    return columns, out
@@ -1,6 +1,33 @@
-from .engine import InsightEngine, AnalysisConfig
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .engine import InsightEngine
+    from .incremental import AdStateStore
+    from .models import AnalysisConfig
+    from .result_cache import ResultCache
 
 __all__ = [
     "InsightEngine",
     "AnalysisConfig",
+    "AdStateStore",
+    "ResultCache",
 ]
+
+# Resolved on first access, so importing a submodule (e.g. insight_agent.models) does not
+# pull in the engine and numpy
+_EXPORTS = {
+    "InsightEngine": ".engine",
+    "AnalysisConfig": ".models",
+    "AdStateStore": ".incremental",
+    "ResultCache": ".result_cache",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
@@ -1,10 +1,59 @@
 from __future__ import annotations
-from typing import List
-from ..models import RowMetrics, Insight
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+from ..frame import MetricsFrame
+from ..models import RowMetrics, Insight, InsightAction, InsightScope, InsightSeverity
+
+
+class Rule(NamedTuple):
+    # Rows where `mask` holds yield one insight; `build` is only called for rows that are kept
+    mask: np.ndarray
+    action: InsightAction
+    severity: InsightSeverity
+    build: Callable[[int], Insight]
 
 
 class BaseAgent:
     name: str = "base"
+    # Row-local agents run on each input chunk and can evaluate row shards independently
+    # (see shards.evaluate_rules). The others compare rows with each other, so the engine
+    # runs them once, after ingest, over every input row.
+    shardable: bool = True
+    # Numeric columns a non-shardable agent reads (None = all); only these are kept
+    # between chunks until it runs
+    reads: Optional[Tuple[str, ...]] = None
 
     def analyze(self, rows: List[RowMetrics]) -> List[Insight]:
         raise NotImplementedError
+
+    # Vectorized entry point; agents that override it are run on the frame directly
+    def rules(self, frame: MetricsFrame) -> List[Rule]:
+        raise NotImplementedError
+
+    @property
+    def supports_frame(self) -> bool:
+        return type(self).rules is not BaseAgent.rules
+
+    def analyze_frame(self, frame: MetricsFrame) -> List[Insight]:
+        rules = self.rules(frame)
+        hits = [np.flatnonzero(r.mask) for r in rules]
+        if not hits:
+            return []
+        rows = np.concatenate(hits)
+        which = np.repeat(np.arange(len(rules)), [len(h) for h in hits])
+        order = np.argsort(rows, kind="stable")
+        return [rules[which[k]].build(rows[k]) for k in order]
+
+
+def target(frame: MetricsFrame, i: int) -> Tuple[InsightScope, Optional[str], Dict[str, Any]]:
+    # (scope, id suffix, keys) for row i, following the frame's roll-up level
+    ids = frame.ids
+    if frame.scope == "ad":
+        keys = {"ad_id": ids["ad_id"][i], "ad_name": ids["ad_name"][i]}
+        return "ad", keys["ad_id"] or keys["ad_name"], keys
+    if frame.scope == "ad_set":
+        keys = {"campaign": ids["campaign"][i], "ad_set": ids["ad_set"][i]}
+        return "ad_set", f"ad_set:{keys['campaign']}/{keys['ad_set']}", keys
+    if frame.scope == "campaign":
+        return "campaign", f"campaign:{ids['campaign'][i]}", {"campaign": ids["campaign"][i]}
+    return "account", "account", {}
@@ -1,7 +1,8 @@
 from __future__ import annotations
-from typing import List
-from ..models import RowMetrics, Insight
-from .base import BaseAgent
+from typing import Any, Dict, List, Optional
+from ..frame import MetricsFrame
+from ..models import RowMetrics, Insight, InsightScope
+from .base import BaseAgent, Rule, target
 
 
 class ConversionAgent(BaseAgent):
@@ -16,20 +17,40 @@ class ConversionAgent(BaseAgent):
             if r.atc_to_purchase_pct is None:
                 continue
             if r.atc_to_purchase_pct < self.atc_to_purchase_min_pct:
-                insights.append(
-                    Insight(
-                        id=f"conv-drop-{r.ad_id or r.ad_name}",
-                        scope="ad",
-                        keys={"ad_id": r.ad_id, "ad_name": r.ad_name},
-                        action="fix",
-                        title="Low ATC?Purchase conversion",
-                        rationale=f"ATC?Purchase {r.atc_to_purchase_pct:.1f}% below {self.atc_to_purchase_min_pct:.0f}% benchmark.",
-                        recommendations=[
-                            "Audit landing and checkout",
-                            "Improve load speed and trust signals",
-                            "Clarify pricing, shipping, returns",
-                        ],
-                        severity="high",
-                    )
-                )
+                ref = r.ad_id or r.ad_name
+                keys = {"ad_id": r.ad_id, "ad_name": r.ad_name}
+                insights.append(self._low_conversion("ad", ref, keys, r.atc_to_purchase_pct))
         return insights
+
+    def rules(self, frame: MetricsFrame) -> List[Rule]:
+        atc_pct = frame["atc_to_purchase_pct"]
+        return [
+            Rule(
+                atc_pct < self.atc_to_purchase_min_pct,
+                "fix",
+                "high",
+                lambda i: self._low_conversion(*target(frame, i), atc_pct[i]),
+            )
+        ]
+
+    def _low_conversion(
+        self,
+        scope: InsightScope,
+        ref: Optional[str],
+        keys: Dict[str, Any],
+        atc_pct: float,
+    ) -> Insight:
+        return Insight(
+            id=f"conv-drop-{ref}",
+            scope=scope,
+            keys=keys,
+            action="fix",
+            title="Low ATC?Purchase conversion",
+            rationale=f"ATC?Purchase {atc_pct:.1f}% below {self.atc_to_purchase_min_pct:.0f}% benchmark.",
+            recommendations=[
+                "Audit landing and checkout",
+                "Improve load speed and trust signals",
+                "Clarify pricing, shipping, returns",
+            ],
+            severity="high",
+        )
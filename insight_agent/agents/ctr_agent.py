@@ -1,7 +1,8 @@
 from __future__ import annotations
-from typing import List
-from ..models import RowMetrics, Insight
-from .base import BaseAgent
+from typing import Any, Dict, List, Optional
+from ..frame import MetricsFrame
+from ..models import RowMetrics, Insight, InsightScope
+from .base import BaseAgent, Rule, target
 
 
 class CTRAgent(BaseAgent):
@@ -15,39 +16,76 @@ class CTRAgent(BaseAgent):
         for r in rows:
             if r.ctr is None or r.impressions is None:
                 continue
+            ref = r.ad_id or r.ad_name
+            keys = {"ad_id": r.ad_id, "ad_name": r.ad_name}
             if r.ctr >= self.healthy_ctr_pct:
                 # Healthy CTR
                 if r.atc_to_purchase_pct is not None and r.atc_to_purchase_pct < 20.0:
-                    insights.append(
-                        Insight(
-                            id=f"ctr-ok-conv-poor-{r.ad_id or r.ad_name}",
-                            scope="ad",
-                            keys={"ad_id": r.ad_id, "ad_name": r.ad_name},
-                            action="fix",
-                            title="CTR healthy but conversion weak",
-                            rationale=f"CTR {r.ctr:.2f}% is healthy but ATC?Purchase {r.atc_to_purchase_pct or 0:.1f}% is low.",
-                            recommendations=[
-                                "Audit landing page and checkout",
-                                "Test simpler forms and trust signals",
-                            ],
-                            severity="medium",
-                        )
-                    )
+                    insights.append(self._conv_poor("ad", ref, keys, r.ctr, r.atc_to_purchase_pct))
             else:
                 # Weak CTR
-                insights.append(
-                    Insight(
-                        id=f"ctr-weak-{r.ad_id or r.ad_name}",
-                        scope="ad",
-                        keys={"ad_id": r.ad_id, "ad_name": r.ad_name},
-                        action="test",
-                        title="Weak CTR",
-                        rationale=f"CTR {r.ctr:.2f}% is below healthy threshold {self.healthy_ctr_pct:.2f}%.",
-                        recommendations=[
-                            "Test 2?3 new hooks and thumbnails",
-                            "Refresh headline and primary text",
-                        ],
-                        severity="medium",
-                    )
-                )
+                insights.append(self._weak("ad", ref, keys, r.ctr))
         return insights
+
+    def rules(self, frame: MetricsFrame) -> List[Rule]:
+        ctr = frame["ctr"]
+        atc_pct = frame["atc_to_purchase_pct"]
+        scored = frame.valid("ctr") & frame.valid("impressions")
+        healthy = scored & (ctr >= self.healthy_ctr_pct)
+        return [
+            Rule(
+                healthy & (atc_pct < 20.0),
+                "fix",
+                "medium",
+                lambda i: self._conv_poor(*target(frame, i), ctr[i], atc_pct[i]),
+            ),
+            Rule(
+                scored & ~healthy,
+                "test",
+                "medium",
+                lambda i: self._weak(*target(frame, i), ctr[i]),
+            ),
+        ]
+
+    def _conv_poor(
+        self,
+        scope: InsightScope,
+        ref: Optional[str],
+        keys: Dict[str, Any],
+        ctr: float,
+        atc_pct: float,
+    ) -> Insight:
+        return Insight(
+            id=f"ctr-ok-conv-poor-{ref}",
+            scope=scope,
+            keys=keys,
+            action="fix",
+            title="CTR healthy but conversion weak",
+            rationale=f"CTR {ctr:.2f}% is healthy but ATC?Purchase {atc_pct or 0:.1f}% is low.",
+            recommendations=[
+                "Audit landing page and checkout",
+                "Test simpler forms and trust signals",
+            ],
+            severity="medium",
+        )
+
+    def _weak(
+        self,
+        scope: InsightScope,
+        ref: Optional[str],
+        keys: Dict[str, Any],
+        ctr: float,
+    ) -> Insight:
+        return Insight(
+            id=f"ctr-weak-{ref}",
+            scope=scope,
+            keys=keys,
+            action="test",
+            title="Weak CTR",
+            rationale=f"CTR {ctr:.2f}% is below healthy threshold {self.healthy_ctr_pct:.2f}%.",
+            recommendations=[
+                "Test 2?3 new hooks and thumbnails",
+                "Refresh headline and primary text",
+            ],
+            severity="medium",
+        )
@@ -1,38 +1,80 @@
 from __future__ import annotations
-from typing import List
-from ..models import RowMetrics, Insight
-from .base import BaseAgent
+from typing import Any, Dict, List, Optional
+from ..frame import MetricsFrame
+from ..models import RowMetrics, Insight, InsightScope
+from .base import BaseAgent, Rule, target
 
 
 class FatigueAgent(BaseAgent):
     name = "fatigue_agent"
 
-    def __init__(self, frequency_threshold: float = 3.0, ctr_drop_warn_pct: float = 20.0):
+    def __init__(
+        self, frequency_threshold: float = 3.0, ctr_drop_warn_pct: float = 20.0, ctr_decay_warn_pct: float = 3.0
+    ):
         self.frequency_threshold = frequency_threshold
         self.ctr_drop_warn_pct = ctr_drop_warn_pct
+        self.ctr_decay_warn_pct = ctr_decay_warn_pct
 
     def analyze(self, rows: List[RowMetrics]) -> List[Insight]:
         insights: List[Insight] = []
         for r in rows:
-            # Flag creative fatigue
-            if (r.frequency is not None and r.frequency >= self.frequency_threshold) and (
-                r.ctr_drop_vs_prev7 is not None and r.ctr_drop_vs_prev7 >= self.ctr_drop_warn_pct
-            ):
-                insights.append(
-                    Insight(
-                        id=f"fatigue-{r.ad_id or r.ad_name}",
-                        scope="ad",
-                        keys={"ad_id": r.ad_id, "ad_name": r.ad_name},
-                        action="test",
-                        title="Likely creative fatigue",
-                        rationale=(
-                            f"Frequency {r.frequency:.1f} with CTR drop {r.ctr_drop_vs_prev7:.0f}% vs prev7 suggests fatigue."
-                        ),
-                        recommendations=[
-                            "Rotate in fresh creatives",
-                            "Narrow targeting or cap frequency",
-                        ],
-                        severity="medium",
-                    )
-                )
+            # Flag creative fatigue: a CTR drop vs prev7, or (from daily rows) a steady CTR
+            # decay while frequency is still climbing
+            dropping = r.ctr_drop_vs_prev7 is not None and r.ctr_drop_vs_prev7 >= self.ctr_drop_warn_pct
+            decaying = (
+                r.ctr_decay_pct is not None
+                and r.ctr_decay_pct >= self.ctr_decay_warn_pct
+                and r.frequency_trend is not None
+                and r.frequency_trend > 0
+            )
+            if (r.frequency is not None and r.frequency >= self.frequency_threshold) and (dropping or decaying):
+                ref = r.ad_id or r.ad_name
+                keys = {"ad_id": r.ad_id, "ad_name": r.ad_name}
+                insights.append(self._fatigue("ad", ref, keys, r.frequency, r.ctr_drop_vs_prev7, r.ctr_decay_pct))
         return insights
+
+    def rules(self, frame: MetricsFrame) -> List[Rule]:
+        frequency = frame["frequency"]
+        drop = frame["ctr_drop_vs_prev7"]
+        decay = frame["ctr_decay_pct"]
+        decaying = (decay >= self.ctr_decay_warn_pct) & (frame["frequency_trend"] > 0)
+        return [
+            Rule(
+                (frequency >= self.frequency_threshold) & ((drop >= self.ctr_drop_warn_pct) | decaying),
+                "test",
+                "medium",
+                lambda i: self._fatigue(*target(frame, i), frequency[i], _opt(drop[i]), _opt(decay[i])),
+            )
+        ]
+
+    def _fatigue(
+        self,
+        scope: InsightScope,
+        ref: Optional[str],
+        keys: Dict[str, Any],
+        frequency: float,
+        drop: Optional[float],
+        decay: Optional[float] = None,
+    ) -> Insight:
+        signals = []
+        if drop is not None:
+            signals.append(f"CTR drop {drop:.0f}% vs prev7")
+        if decay is not None:
+            signals.append(f"CTR decaying {decay:.1f}%/day")
+        return Insight(
+            id=f"fatigue-{ref}",
+            scope=scope,
+            keys=keys,
+            action="test",
+            title="Likely creative fatigue",
+            rationale=f"Frequency {frequency:.1f} with {' and '.join(signals)} suggests fatigue.",
+            recommendations=[
+                "Rotate in fresh creatives",
+                "Narrow targeting or cap frequency",
+            ],
+            severity="medium",
+        )
+
+
+def _opt(value: float) -> Optional[float]:
+    return None if value != value else value
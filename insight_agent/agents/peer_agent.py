@@ -0,0 +1,208 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from ..frame import FIELDS, MetricsFrame, from_records
+from ..models import RowMetrics, Insight, InsightScope
+from ..rollup import group_codes
+from .base import BaseAgent, Rule, target
+
+# metric -> (label, unit)
+PEER_METRICS: Dict[str, Tuple[str, str]] = {
+    "ctr": ("CTR", "%"),
+    "roas": ("ROAS", ""),
+    "atc_to_purchase_pct": ("ATC-to-purchase", "%"),
+}
+# Narrowest first: an ad is compared with its ad set, else its campaign, else the account
+PEER_LEVELS = ("ad_set", "campaign", "account")
+# Scales a MAD (or mean absolute deviation) to a standard deviation for normal data
+_MAD_SCALE = 1.4826
+_MEAN_AD_SCALE = 1.2533
+
+
+class PeerAgent(BaseAgent):
+    # Flags ads whose CTR, ROAS or ATC-to-purchase rate is a robust outlier among their peers, so
+    # the bar moves with each account's vertical instead of a global threshold. Peers are
+    # the ads in the frame, which the engine makes the whole input (see BaseAgent.shardable);
+    # medians, MADs and percentiles are spend-weighted.
+    name = "peer_agent"
+    # Group statistics need every peer in one frame
+    shardable = False
+    reads = ("spend",) + tuple(PEER_METRICS)
+
+    def __init__(self, z_threshold: float = 3.5, min_peers: int = 10):
+        self.z_threshold = z_threshold
+        self.min_peers = min_peers
+
+    def analyze(self, rows: List[RowMetrics]) -> List[Insight]:
+        frame = from_records([[getattr(r, k) for k in FIELDS] for r in rows])
+        return self.analyze_frame(frame)
+
+    def rules(self, frame: MetricsFrame) -> List[Rule]:
+        if frame.scope != "ad" or len(frame) < self.min_peers:
+            return []
+        spend = frame["spend"]
+        codes = {level: group_codes(frame, level) for level in PEER_LEVELS}
+        rules: List[Rule] = []
+        for metric in PEER_METRICS:
+            z, pct, median, peers, level = self._compare(codes, frame[metric], spend)
+            rules += [
+                Rule(
+                    z <= -self.z_threshold,
+                    "test",
+                    "medium",
+                    self._builder(frame, metric, "below", z, pct, median, peers, level),
+                ),
+                Rule(
+                    z >= self.z_threshold,
+                    "keep",
+                    "low",
+                    self._builder(frame, metric, "above", z, pct, median, peers, level),
+                ),
+            ]
+        return rules
+
+    def _compare(
+        self, codes: Dict[str, np.ndarray], value: np.ndarray, spend: np.ndarray
+    ) -> Tuple[np.ndarray, ...]:
+        # Per row, against the narrowest level with enough peers: robust z, percentile,
+        # peer median, peer count and the level's index in PEER_LEVELS (-1 = not compared)
+        n = len(value)
+        out = [np.full(n, np.nan), np.full(n, np.nan), np.full(n, np.nan), np.zeros(n), np.full(n, -1)]
+        for j, level in enumerate(PEER_LEVELS):
+            stats = peer_stats(codes[level], value, spend)
+            take = (out[4] < 0) & (stats[3] >= self.min_peers)
+            for column, computed in zip(out, stats + (np.full(n, j),)):
+                column[take] = computed[take]
+        return tuple(out)
+
+    def _builder(
+        self,
+        frame: MetricsFrame,
+        metric: str,
+        direction: str,
+        z: np.ndarray,
+        pct: np.ndarray,
+        median: np.ndarray,
+        peers: np.ndarray,
+        level: np.ndarray,
+    ) -> Callable[[int], Insight]:
+        def build(i: int) -> Insight:
+            group = PEER_LEVELS[int(level[i])]
+            if group == "account":
+                where = "the account"
+            else:
+                where = f"{group.replace('_', ' ')} {frame.ids[group][i]}"
+            return self._outlier(
+                *target(frame, i),
+                metric,
+                direction,
+                frame[metric][i],
+                median[i],
+                z[i],
+                pct[i],
+                int(peers[i]),
+                where,
+            )
+
+        return build
+
+    def _outlier(
+        self,
+        scope: InsightScope,
+        ref: Optional[str],
+        keys: Dict[str, Any],
+        metric: str,
+        direction: str,
+        value: float,
+        median: float,
+        z: float,
+        pct: float,
+        peers: int,
+        where: str,
+    ) -> Insight:
+        label, unit = PEER_METRICS[metric]
+        below = direction == "below"
+        return Insight(
+            id=f"peer-{metric}-{'low' if below else 'high'}-{ref}",
+            scope=scope,
+            keys=keys,
+            action="test" if below else "keep",
+            title=f"{label} far {direction} peers",
+            rationale=(
+                f"{label} {value:.2f}{unit} vs peer median {median:.2f}{unit} across {peers} ads in {where} "
+                f"(robust z {z:+.1f}, spend-weighted percentile {pct:.0f})."
+            ),
+            recommendations=(
+                [
+                    f"Compare creative and audience with the top {label} ads in {where}",
+                    "Shift budget to stronger peers while testing a fix",
+                ]
+                if below
+                else [
+                    "Scale budget gradually while it holds",
+                    "Reuse its creative angle across peer ads",
+                ]
+            ),
+            severity="medium" if below else "low",
+        )
+
+
+def peer_stats(codes: np.ndarray, value: np.ndarray, weight: np.ndarray) -> Tuple[np.ndarray, ...]:
+    # Per row: (robust z, weighted percentile, group median, group size) within its group,
+    # NaN/0 for rows without a value, a positive weight or a group. One sort by
+    # (group, value) serves every group at once.
+    n = len(value)
+    z, pct, median, size = np.full(n, np.nan), np.full(n, np.nan), np.full(n, np.nan), np.zeros(n)
+    rows = np.flatnonzero((codes >= 0) & ~np.isnan(value) & (weight > 0))
+    if not len(rows):
+        return z, pct, median, size
+    rows = rows[_group_order(codes[rows], value[rows])]
+    group, x, w = codes[rows], value[rows], weight[rows]
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    counts = np.diff(np.r_[starts, len(rows)])
+    member = np.repeat(np.arange(len(starts)), counts)
+    total = np.add.reduceat(w, starts)
+
+    # Tied values share the midpoint of their block of weight
+    first = np.flatnonzero(np.r_[True, (x[1:] != x[:-1]) | (group[1:] != group[:-1])])
+    tie = np.repeat(np.arange(len(first)), np.diff(np.r_[first, len(rows)]))
+    below = (_cumulative(w, starts, member) - w)[first][tie]
+    tied = np.add.reduceat(w, first)[tie]
+    center = _weighted_median(x, w, starts, counts, member, total)
+    deviation = np.abs(x - center[member])
+    # Group blocks stay in place when re-sorting by deviation inside each group
+    order = _group_order(member, deviation)
+    mad = _weighted_median(deviation[order], w[order], starts, counts, member, total)
+    mean_ad = np.add.reduceat(w * deviation, starts) / total
+    # Iglewicz-Hoaglin: the mean absolute deviation stands in when over half the weight ties
+    scale = np.where(mad > 0, _MAD_SCALE * mad, _MEAN_AD_SCALE * mean_ad)[member]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z[rows] = np.where(scale > 0, (x - center[member]) / scale, np.nan)
+    pct[rows] = (below + 0.5 * tied) / total[member] * 100.0
+    median[rows] = center[member]
+    size[rows] = counts[member]
+    return z, pct, median, size
+
+
+def _group_order(codes: np.ndarray, key: np.ndarray) -> np.ndarray:
+    # Order by group, then key. Only the group pass must be stable, and a stable sort of
+    # 16-bit codes is a radix sort, several times faster than lexsort.
+    order = np.argsort(key)
+    grouped = codes[order]
+    if grouped.max() < 1 << 16:
+        grouped = grouped.astype(np.uint16)
+    return order[np.argsort(grouped, kind="stable")]
+
+
+def _cumulative(w: np.ndarray, starts: np.ndarray, member: np.ndarray) -> np.ndarray:
+    # Running weight within each group, inclusive
+    cum = np.cumsum(w)
+    return cum - (cum[starts] - w[starts])[member]
+
+
+def _weighted_median(
+    x: np.ndarray, w: np.ndarray, starts: np.ndarray, counts: np.ndarray, member: np.ndarray, total: np.ndarray
+) -> np.ndarray:
+    # x sorted within each group: the first value whose running weight reaches half the group's
+    short = (_cumulative(w, starts, member) < 0.5 * total[member]).astype(np.int64)
+    return x[starts + np.minimum(np.add.reduceat(short, starts), counts - 1)]
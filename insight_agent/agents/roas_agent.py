@@ -1,7 +1,8 @@
 from __future__ import annotations
-from typing import List
-from ..models import RowMetrics, Insight
-from .base import BaseAgent
+from typing import Any, Dict, List, Optional
+from ..frame import MetricsFrame
+from ..models import RowMetrics, Insight, InsightScope
+from .base import BaseAgent, Rule, target
 
 
 class ROASAgent(BaseAgent):
@@ -12,52 +13,91 @@ class ROASAgent(BaseAgent):
         for r in rows:
             if r.roas is None:
                 continue
+            ref = r.ad_id or r.ad_name
+            keys = {"ad_id": r.ad_id, "ad_name": r.ad_name}
             if 1.0 <= r.roas < 2.0:
-                insights.append(
-                    Insight(
-                        id=f"roas-1-2-{r.ad_id or r.ad_name}",
-                        scope="ad",
-                        keys={"ad_id": r.ad_id, "ad_name": r.ad_name},
-                        action="test",
-                        title="ROAS between 1?2",
-                        rationale=f"ROAS is {r.roas:.2f} (needs improvement).",
-                        recommendations=[
-                            "Test 2?3 new hooks/thumbnails",
-                            "Rotate a fresh ad variant",
-                            "Cap frequency to reduce fatigue",
-                        ],
-                        severity="medium",
-                    )
-                )
+                insights.append(self._mid("ad", ref, keys, r.roas))
             elif r.roas < 1.0:
-                insights.append(
-                    Insight(
-                        id=f"roas-sub1-{r.ad_id or r.ad_name}",
-                        scope="ad",
-                        keys={"ad_id": r.ad_id, "ad_name": r.ad_name},
-                        action="pause",
-                        title="ROAS < 1",
-                        rationale=f"ROAS {r.roas:.2f} is unprofitable.",
-                        recommendations=[
-                            "Pause or cut spend",
-                            "Rebuild creatives and landing match",
-                        ],
-                        severity="high",
-                    )
-                )
+                insights.append(self._unprofitable("ad", ref, keys, r.roas))
             else:
-                insights.append(
-                    Insight(
-                        id=f"roas-strong-{r.ad_id or r.ad_name}",
-                        scope="ad",
-                        keys={"ad_id": r.ad_id, "ad_name": r.ad_name},
-                        action="keep",
-                        title="ROAS healthy",
-                        rationale=f"ROAS {r.roas:.2f} is strong.",
-                        recommendations=[
-                            "Maintain budget; consider incremental scale",
-                        ],
-                        severity="low",
-                    )
-                )
+                insights.append(self._strong("ad", ref, keys, r.roas))
         return insights
+
+    def rules(self, frame: MetricsFrame) -> List[Rule]:
+        roas = frame["roas"]
+        mid = (roas >= 1.0) & (roas < 2.0)
+        unprofitable = roas < 1.0
+        strong = frame.valid("roas") & ~mid & ~unprofitable
+        return [
+            Rule(mid, "test", "medium", lambda i: self._mid(*target(frame, i), roas[i])),
+            Rule(
+                unprofitable,
+                "pause",
+                "high",
+                lambda i: self._unprofitable(*target(frame, i), roas[i]),
+            ),
+            Rule(strong, "keep", "low", lambda i: self._strong(*target(frame, i), roas[i])),
+        ]
+
+    def _mid(
+        self,
+        scope: InsightScope,
+        ref: Optional[str],
+        keys: Dict[str, Any],
+        roas: float,
+    ) -> Insight:
+        return Insight(
+            id=f"roas-1-2-{ref}",
+            scope=scope,
+            keys=keys,
+            action="test",
+            title="ROAS between 1?2",
+            rationale=f"ROAS is {roas:.2f} (needs improvement).",
+            recommendations=[
+                "Test 2?3 new hooks/thumbnails",
+                "Rotate a fresh ad variant",
+                "Cap frequency to reduce fatigue",
+            ],
+            severity="medium",
+        )
+
+    def _unprofitable(
+        self,
+        scope: InsightScope,
+        ref: Optional[str],
+        keys: Dict[str, Any],
+        roas: float,
+    ) -> Insight:
+        return Insight(
+            id=f"roas-sub1-{ref}",
+            scope=scope,
+            keys=keys,
+            action="pause",
+            title="ROAS < 1",
+            rationale=f"ROAS {roas:.2f} is unprofitable.",
+            recommendations=[
+                "Pause or cut spend",
+                "Rebuild creatives and landing match",
+            ],
+            severity="high",
+        )
+
+    def _strong(
+        self,
+        scope: InsightScope,
+        ref: Optional[str],
+        keys: Dict[str, Any],
+        roas: float,
+    ) -> Insight:
+        return Insight(
+            id=f"roas-strong-{ref}",
+            scope=scope,
+            keys=keys,
+            action="keep",
+            title="ROAS healthy",
+            rationale=f"ROAS {roas:.2f} is strong.",
+            recommendations=[
+                "Maintain budget; consider incremental scale",
+            ],
+            severity="low",
+        )
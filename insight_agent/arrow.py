@@ -0,0 +1,182 @@
+from __future__ import annotations
+from typing import IO, Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+import os
+
+import numpy as np
+
+try:
+    # optional at runtime (pip install insight-agent[arrow])
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except Exception:  # pragma: no cover
+    pa = pc = ipc = pq = None  # type: ignore
+
+from .frame import DATE_KEY, FIELDS, ID_KEYS, IdColumn, MetricsFrame, assemble_frame, encode_ids
+from .models import ColumnMapping, Insight
+
+ArrowSource = Union[str, "os.PathLike[str]", bytes, IO[bytes], "pa.Table", "pa.RecordBatchReader"]
+
+
+def require_arrow() -> None:
+    if pa is None:
+        raise RuntimeError("Parquet/Arrow support needs pyarrow (pip install insight-agent[arrow])")
+
+
+class ArrowReader:
+    # Parquet file, Arrow IPC file or stream, or an in-memory Table/RecordBatchReader.
+    # Paths are memory-mapped and only the requested columns are ever decoded.
+    def __init__(self, source: ArrowSource) -> None:
+        require_arrow()
+        self._table: Optional["pa.Table"] = None
+        self._parquet: Optional["pq.ParquetFile"] = None
+        self._ipc_file: Optional["ipc.RecordBatchFileReader"] = None
+        self._stream: Optional["pa.RecordBatchReader"] = None
+
+        if isinstance(source, pa.Table):
+            self._table = source
+        elif isinstance(source, pa.RecordBatchReader):
+            self._stream = source
+        else:
+            handle, magic = _open_handle(source)
+            if magic[:4] == b"PAR1":
+                self._parquet = pq.ParquetFile(handle)
+            elif magic == b"ARROW1":
+                self._ipc_file = ipc.open_file(handle)
+            else:
+                self._stream = ipc.open_stream(handle)
+
+    @property
+    def names(self) -> List[str]:
+        if self._parquet is not None:
+            return list(self._parquet.schema_arrow.names)
+        return list(self._source_schema().names)
+
+    def batches(self, columns: Sequence[str], batch_rows: int) -> Iterator["pa.RecordBatch"]:
+        columns = list(columns)
+        if self._parquet is not None:
+            yield from self._parquet.iter_batches(batch_size=batch_rows, columns=columns)
+            return
+        if self._table is not None:
+            yield from self._table.select(columns).to_batches(max_chunksize=batch_rows)
+            return
+        for batch in self._source_batches():
+            batch = batch.select(columns)
+            # Slices are zero-copy views
+            for start in range(0, batch.num_rows, batch_rows):
+                yield batch.slice(start, batch_rows)
+
+    def _source_schema(self) -> "pa.Schema":
+        if self._table is not None:
+            return self._table.schema
+        if self._ipc_file is not None:
+            return self._ipc_file.schema
+        assert self._stream is not None
+        return self._stream.schema
+
+    def _source_batches(self) -> Iterator["pa.RecordBatch"]:
+        if self._ipc_file is not None:
+            for i in range(self._ipc_file.num_record_batches):
+                yield self._ipc_file.get_batch(i)
+        elif self._stream is not None:
+            yield from self._stream
+
+
+def frame_from_batch(batch: "pa.RecordBatch", mapping: ColumnMapping) -> MetricsFrame:
+    names = batch.schema.names
+    raw: Dict[str, Any] = {}
+    for key in FIELDS + (DATE_KEY,):
+        name = mapping.resolved.get(key)
+        if name in names:
+            col = batch.column(names.index(name))
+            if key == DATE_KEY:
+                raw[key] = _date_values(col)
+            elif key in ID_KEYS:
+                raw[key] = _id_values(col)
+            else:
+                raw[key] = _column_values(col, text=False)
+    return assemble_frame(raw, batch.num_rows)
+
+
+def insights_table(insights: List[Insight]) -> "pa.Table":
+    # One row per insight with the id keys flattened into columns for joins
+    require_arrow()
+    columns: Dict[str, List[Any]] = {
+        "id": [i.id for i in insights],
+        "scope": [i.scope for i in insights],
+        "action": [i.action for i in insights],
+        "severity": [i.severity for i in insights],
+        "title": [i.title for i in insights],
+        "rationale": [i.rationale for i in insights],
+        "recommendations": [i.recommendations for i in insights],
+    }
+    for key in ("campaign", "ad_set", "ad_name", "ad_id"):
+        columns[key] = [i.keys.get(key) for i in insights]
+    schema = pa.schema(
+        [(name, pa.list_(pa.string()) if name == "recommendations" else pa.string()) for name in columns]
+    )
+    return pa.table(columns, schema=schema)
+
+
+def write_ipc_stream(table: "pa.Table") -> bytes:
+    sink = pa.BufferOutputStream()
+    with ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _column_values(col: "pa.Array", text: bool) -> np.ndarray:
+    kind = col.type
+    if pa.types.is_dictionary(kind):
+        col, kind = col.dictionary_decode(), kind.value_type
+    numeric = pa.types.is_integer(kind) or pa.types.is_floating(kind) or pa.types.is_decimal(kind)
+    if numeric and not text:
+        # Typed numbers: float64 buffers (zero-copy when already float64), nulls as NaN
+        return col.cast(pa.float64()).to_numpy(zero_copy_only=False)
+    if not _is_text(kind):
+        col = col.cast(pa.string())
+    # Identifiers (even integer ones) and numbers exported as text are parsed like CSV cells
+    return col.to_numpy(zero_copy_only=False)
+
+
+def _id_values(col: "pa.Array") -> IdColumn:
+    # Dictionary-encoded by Arrow, so only the distinct values become Python strings
+    if not pa.types.is_dictionary(col.type):
+        if not _is_text(col.type):
+            col = col.cast(pa.string())
+        col = col.dictionary_encode()
+    dictionary = col.dictionary
+    if not _is_text(dictionary.type):
+        dictionary = dictionary.cast(pa.string())
+    codes = col.indices.cast(pa.int64()).fill_null(-1).to_numpy(zero_copy_only=False)
+    return encode_ids(codes, dictionary.to_pylist())
+
+
+def _is_text(kind: "pa.DataType") -> bool:
+    return pa.types.is_string(kind) or pa.types.is_large_string(kind)
+
+
+def _date_values(col: "pa.Array") -> Any:
+    # Date and timestamp columns become days since the epoch; text dates are parsed like CSV
+    kind = col.type
+    if pa.types.is_timestamp(kind) or pa.types.is_date(kind):
+        if pa.types.is_timestamp(kind) and kind.tz:
+            # The calendar day in the column's own time zone, as a text date would give it
+            col = pc.local_timestamp(col)
+        # date32 drops the time of day at any timestamp unit
+        days = col.cast(pa.date32()).cast(pa.int32()).cast(pa.float64())
+        return days.to_numpy(zero_copy_only=False)
+    return _column_values(col, text=True)
+
+
+def _open_handle(source: Union[str, "os.PathLike[str]", bytes, IO[bytes]]) -> Tuple[Any, bytes]:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        handle: Any = pa.BufferReader(pa.py_buffer(source))
+    elif isinstance(source, (str, os.PathLike)):
+        handle = pa.memory_map(os.fspath(source), "r")
+    else:
+        handle = source
+    magic = handle.read(6)
+    handle.seek(0)
+    return handle, bytes(magic)
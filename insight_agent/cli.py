@@ -0,0 +1,151 @@
+from __future__ import annotations
+from typing import Iterator, List, Optional, Set, Tuple
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import argparse
+import json
+import mmap
+import os
+import sys
+import time
+
+from .engine import InsightEngine
+from .models import AnalysisConfig, AnalyzeResponse
+
+CSV_SUFFIXES = (".csv",)
+ARROW_SUFFIXES = (".parquet", ".pq", ".arrow", ".arrows", ".feather", ".ipc")
+_MMAP_CHUNK = 1 << 20
+
+_engine: Optional[InsightEngine] = None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="insight-agent", description="InsightAgent command line")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch = commands.add_parser("batch", help="Analyze many export files into a JSON Lines file")
+    batch.add_argument("inputs", nargs="+", help="Files or directories (searched recursively)")
+    batch.add_argument("-o", "--out", default="insights.jsonl", help="Output JSON Lines file (default insights.jsonl)")
+    batch.add_argument(
+        "-w", "--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (0 = in-process)"
+    )
+    batch.add_argument("-c", "--config", help="AnalysisConfig JSON file applied to every input")
+    batch.add_argument("--restart", action="store_true", help="Ignore and overwrite existing output")
+
+    args = parser.parse_args(argv)
+    config = None
+    if args.config:
+        with open(args.config) as f:
+            config = AnalysisConfig.model_validate_json(f.read())
+    return run_batch(args.inputs, args.out, args.workers, config, restart=args.restart)
+
+
+def run_batch(
+    inputs: List[str], out: str, workers: int, config: Optional[AnalysisConfig] = None, restart: bool = False
+) -> int:
+    # The output doubles as the checkpoint: files it records as analyzed are skipped, so an
+    # interrupted run resumes where it stopped and failed files are tried again.
+    files = sorted(set(discover(inputs)))
+    done = set() if restart else _completed(out)
+    todo = [f for f in files if f not in done]
+    print(f"{len(files)} files, {len(files) - len(todo)} already done", file=sys.stderr)
+
+    rows = failed = 0
+    start = time.perf_counter()
+    with open(out, "w" if restart else "a", encoding="utf-8") as sink, _executor(workers) as pool:
+        futures = [pool.submit(analyze_file, path, config) for path in todo]
+        for n, future in enumerate(as_completed(futures), 1):
+            _path, line, file_rows, ok = future.result()
+            # One complete line per file, flushed so a crash loses at most the files in flight
+            sink.write(line + "\n")
+            sink.flush()
+            rows += file_rows
+            failed += not ok
+            if n % 100 == 0:
+                _report(n, rows, time.perf_counter() - start)
+
+    _report(len(todo), rows, time.perf_counter() - start)
+    if failed:
+        print(f"{failed} file(s) failed; see the error field in {out}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def discover(inputs: List[str]) -> Iterator[str]:
+    suffixes = CSV_SUFFIXES + ARROW_SUFFIXES
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in names:
+                    if name.lower().endswith(suffixes):
+                        yield os.path.abspath(os.path.join(root, name))
+        else:
+            yield os.path.abspath(path)
+
+
+def analyze_file(path: str, config: Optional[AnalysisConfig]) -> Tuple[str, str, int, bool]:
+    # Runs in a worker process; returns (path, JSON line, rows, ok)
+    global _engine
+    if _engine is None:
+        _engine = InsightEngine()
+    try:
+        if path.lower().endswith(ARROW_SUFFIXES):
+            result = _engine.analyze_arrow(path, config)
+        else:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    raise ValueError("CSV stream is empty")
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                    result = _engine.analyze_stream(_slices(view), config)
+        response = AnalyzeResponse(ok=True, result=result)
+    except Exception as e:
+        response = AnalyzeResponse(ok=False, error=str(e))
+    rows = int(response.result.totals.get("rows", 0)) if response.result else 0
+    line = json.dumps({"file": path, **response.model_dump(mode="json")}, separators=(",", ":"))
+    return path, line, rows, response.ok
+
+
+def _slices(view: "mmap.mmap") -> Iterator[bytes]:
+    # Pages are faulted in as the CSV reader advances instead of reading the whole file
+    for start in range(0, len(view), _MMAP_CHUNK):
+        yield view[start : start + _MMAP_CHUNK]
+
+
+def _completed(out: str) -> Set[str]:
+    # Files with a successful line. Failed lines, and a partial trailing line left by an
+    # interrupted run, are dropped from the output so those files are retried.
+    if not os.path.exists(out):
+        return set()
+    with open(out, "rb") as f:
+        data = f.read()
+    done: Set[str] = set()
+    kept: List[bytes] = []
+    for line in data[: data.rfind(b"\n") + 1].splitlines():
+        try:
+            record = json.loads(line)
+            path, ok = record.get("file"), record.get("ok")
+        except (ValueError, AttributeError):
+            continue
+        if isinstance(path, str) and ok is True:
+            done.add(path)
+            kept.append(line)
+    checkpoint = b"".join(line + b"\n" for line in kept)
+    if checkpoint != data:
+        # Replaced whole so a crash here leaves either the old or the new file
+        tmp = out + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(checkpoint)
+        os.replace(tmp, out)
+    return done
+
+
+def _executor(workers: int) -> Executor:
+    if workers <= 0:
+        return ThreadPoolExecutor(max_workers=1)
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def _report(files: int, rows: int, elapsed: float) -> None:
+    elapsed = max(elapsed, 1e-9)
+    print(
+        f"{files} files, {rows} rows in {elapsed:.1f}s ({files / elapsed:.1f} files/s, {rows / elapsed:,.0f} rows/s)",
+        file=sys.stderr,
+    )
@@ -0,0 +1,117 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple, Union
+import heapq
+import numpy as np
+from .frame import MetricsFrame
+from .models import Insight
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .agents.base import Rule
+
+SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2}
+
+# (severity rank, spend impact, -row, -agent position, -sequence)
+_Key = Tuple[int, float, int, int, int]
+# A built insight, or (builder, row) until the candidate survives its frame
+_Entry = Union[Insight, Tuple[Callable[[int], Insight], int]]
+
+
+class InsightCollector:
+    # Bounded top-K shared by all agents, ranked by severity then by the spend at stake.
+    # Insights are only built for candidates still in the top K once their frame is done
+    # (see settle), so candidates evicted by a later rule are never built.
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._heap: List[Tuple[_Key, _Entry]] = []
+        self._sources: Dict[str, int] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._seq = 0
+        self._unsettled = False
+        # Sequence numbers up to here have been handed out by fresh()
+        self._streamed = 0
+
+    def offer(self, source: str, rule: "Rule", frame: MetricsFrame, row_offset: int = 0) -> None:
+        idx = np.flatnonzero(rule.mask)
+        self._count(source, rule.action, len(idx))
+        if not len(idx) or self.limit <= 0:
+            return
+        rank = SEVERITY_RANK[rule.severity]
+        impact = np.nan_to_num(frame["spend"][idx], nan=0.0)
+
+        if len(self._heap) >= self.limit:
+            floor_rank, floor_impact = self._heap[0][0][:2]
+            if rank < floor_rank:
+                return
+            if rank == floor_rank:
+                keep = impact >= floor_impact
+                idx, impact = idx[keep], impact[keep]
+        if len(idx) > self.limit:
+            # Highest impact first, earlier rows win ties
+            top = np.lexsort((idx, -impact))[: self.limit]
+            idx, impact = idx[top], impact[top]
+
+        position = self._position(source)
+        for i, weight in zip(idx.tolist(), impact.tolist()):
+            self._push((rank, weight, -(row_offset + i), -position, -self._next()), (rule.build, i))
+        self._unsettled = True
+
+    def add(self, source: str, insights: List[Insight], row_offset: int = 0) -> None:
+        # Pre-built insights from row-based agents carry no spend, so they rank on severity alone
+        position = self._position(source)
+        for n, insight in enumerate(insights):
+            self._count(source, insight.action, 1)
+            if self.limit > 0:
+                key = (SEVERITY_RANK[insight.severity], 0.0, -(row_offset + n), -position, -self._next())
+                self._push(key, insight)
+
+    def emitted(self, source: str) -> int:
+        return sum(self._counts.get(source, {}).values())
+
+    @property
+    def action_counts(self) -> Dict[str, int]:
+        merged: Dict[str, int] = {}
+        for counts in self._counts.values():
+            for action, n in counts.items():
+                merged[action] = merged.get(action, 0) + n
+        return {action: n for action, n in merged.items() if n}
+
+    def settle(self) -> None:
+        # Builds the pending survivors; called before their frame is released. Keys are
+        # unchanged, so the heap stays ordered.
+        if not self._unsettled:
+            return
+        heap = self._heap
+        for n, (key, entry) in enumerate(heap):
+            if type(entry) is tuple:
+                build, i = entry
+                heap[n] = (key, build(i))
+        self._unsettled = False
+
+    def fresh(self) -> List[Insight]:
+        # Survivors pushed since the last call, best first. A later frame can still evict
+        # them from the final results.
+        self.settle()
+        new = [entry for entry in self._heap if -entry[0][-1] > self._streamed]
+        self._streamed = self._seq
+        return [insight for _, insight in sorted(new, key=lambda e: e[0], reverse=True)]  # type: ignore[misc]
+
+    def results(self) -> List[Insight]:
+        self.settle()
+        return [insight for _, insight in sorted(self._heap, key=lambda e: e[0], reverse=True)]  # type: ignore[misc]
+
+    def _push(self, key: _Key, entry: _Entry) -> None:
+        if len(self._heap) < self.limit:
+            heapq.heappush(self._heap, (key, entry))
+        elif key > self._heap[0][0]:
+            heapq.heapreplace(self._heap, (key, entry))
+
+    def _count(self, source: str, action: str, n: int) -> None:
+        counts = self._counts.setdefault(source, {})
+        counts[action] = counts.get(action, 0) + n
+
+    def _position(self, source: str) -> int:
+        return self._sources.setdefault(source, len(self._sources))
+
+    def _next(self) -> int:
+        self._seq += 1
+        return self._seq
@@ -1,7 +1,10 @@
 from __future__ import annotations
 import re
+from collections import Counter
+from functools import lru_cache
 from typing import Dict, List, Tuple
 from difflib import get_close_matches
+from .lru import LRUCache
 from .models import ColumnSpec, ColumnMapping
 
 CANONICAL_SPECS: List[ColumnSpec] = [
@@ -9,6 +12,7 @@ CANONICAL_SPECS: List[ColumnSpec] = [
     ColumnSpec(key="ad_set", aliases=["ad set", "ad set name", "adset", "adset name"], required=False),
     ColumnSpec(key="ad_name", aliases=["ad name", "ad"], required=False),
     ColumnSpec(key="ad_id", aliases=["ad id", "adid", "id"], required=False),
+    ColumnSpec(key="date", aliases=["day", "date start", "reporting starts", "report date"], required=False),
 
     ColumnSpec(key="spend", aliases=["spend", "cost", "amount_spent"], required=True),
     ColumnSpec(key="impressions", aliases=["impressions", "impr"], required=True),
@@ -28,6 +32,7 @@ CANONICAL_SPECS: List[ColumnSpec] = [
 ]
 
 
+@lru_cache(maxsize=4096)
 def _normalize(s: str) -> str:
     s = s.strip().lower()
     s = re.sub(r"[\s_\-]+", " ", s)
@@ -37,40 +42,97 @@ def _normalize(s: str) -> str:
     return s
 
 
+# Inverted alias index: normalized alias -> canonical key
 auto_vocab: Dict[str, str] = {}
 for spec in CANONICAL_SPECS:
     for alias in [spec.key] + spec.aliases:
         auto_vocab[_normalize(alias)] = spec.key
 
+FUZZY_CUTOFF = 0.86
+
+
+def _bigrams(s: str) -> Counter:
+    return Counter(s[i : i + 2] for i in range(len(s) - 1))
+
+
+_spec_aliases: Dict[str, List[Tuple[str, Counter]]] = {
+    spec.key: [(a, _bigrams(a)) for a in (_normalize(x) for x in [spec.key] + spec.aliases)]
+    for spec in CANONICAL_SPECS
+}
+
+
+# Resolved mappings keyed by the normalized header tuple
+mapping_cache: LRUCache[Tuple[str, ...], Tuple[Dict[str, str], List[str]]] = LRUCache(maxsize=256)
+
 
 def map_columns(input_columns: List[str]) -> ColumnMapping:
     normalized_to_input: Dict[str, str] = {_normalize(c): c for c in input_columns}
 
+    key = tuple(normalized_to_input)
+    entry = mapping_cache.get(key)
+    if entry is None:
+        entry = _resolve(key)
+        mapping_cache.put(key, entry)
+    resolved_norm, missing = entry
+
+    resolved = {canonical: normalized_to_input[norm] for canonical, norm in resolved_norm.items()}
+    return ColumnMapping(resolved=resolved, missing=list(missing))
+
+
+def _resolve(candidates: Tuple[str, ...]) -> Tuple[Dict[str, str], List[str]]:
+    # Returns canonical key -> normalized column, plus missing required keys
+    exact: Dict[str, str] = {}
+    for norm in candidates:
+        canonical = auto_vocab.get(norm)
+        if canonical is not None:
+            exact.setdefault(canonical, norm)
+
+    index: Dict[str, List[Tuple[int, int]]] = {}
+    for pos, norm in enumerate(candidates):
+        for gram, n in _bigrams(norm).items():
+            index.setdefault(gram, []).append((pos, n))
+
     resolved: Dict[str, str] = {}
     missing: List[str] = []
-
     for spec in CANONICAL_SPECS:
         # Exact/alias matching first
-        matches: List[Tuple[str, str]] = []
-        for norm, original in normalized_to_input.items():
-            if norm in auto_vocab and auto_vocab[norm] == spec.key:
-                matches.append((norm, original))
-        if matches:
-            resolved[spec.key] = matches[0][1]
+        if spec.key in exact:
+            resolved[spec.key] = exact[spec.key]
             continue
 
-        # Fuzzy matching next
-        candidates = list(normalized_to_input.keys())
-        possible_aliases = [_normalize(x) for x in ([spec.key] + spec.aliases)]
+        # Fuzzy matching next, only against columns that pass the bigram prefilter
         suggestion = None
-        for alias in possible_aliases:
-            close = get_close_matches(alias, candidates, n=1, cutoff=0.86)
+        for alias, grams in _spec_aliases[spec.key]:
+            shortlist = _shortlist(alias, grams, candidates, index)
+            close = get_close_matches(alias, shortlist, n=1, cutoff=FUZZY_CUTOFF) if shortlist else []
             if close:
                 suggestion = close[0]
                 break
         if suggestion:
-            resolved[spec.key] = normalized_to_input[suggestion]
+            resolved[spec.key] = suggestion
         elif spec.required:
             missing.append(spec.key)
 
-    return ColumnMapping(resolved=resolved, missing=missing)
+    return resolved, missing
+
+
+def _shortlist(
+    alias: str, grams: Counter, candidates: Tuple[str, ...], index: Dict[str, List[Tuple[int, int]]]
+) -> List[str]:
+    # Lossless for ratio >= cutoff: M matched chars in k blocks share at least M - k bigrams, and
+    # k - 1 <= (la - M) + (lb - M), so shared >= (1.5 * cutoff - 1) * (la + lb) - 1.
+    shared: Dict[int, int] = {}
+    for gram, n in grams.items():
+        for pos, m in index.get(gram, ()):
+            shared[pos] = shared.get(pos, 0) + min(n, m)
+
+    la = len(alias)
+    out: List[str] = []
+    for pos, cand in enumerate(candidates):
+        lb = len(cand)
+        if 2.0 * min(la, lb) < FUZZY_CUTOFF * (la + lb):
+            continue
+        if shared.get(pos, 0) < (1.5 * FUZZY_CUTOFF - 1.0) * (la + lb) - 1.0:
+            continue
+        out.append(cand)
+    return out
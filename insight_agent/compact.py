@@ -0,0 +1,52 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Tuple
+
+from .models import CompactInsights, Insight
+
+KEY_FIELDS = ("campaign", "ad_set", "ad_name", "ad_id")
+# Keys each scope's insights carry (see agents.base.target)
+SCOPE_KEYS = {"ad": ("ad_id", "ad_name"), "ad_set": ("campaign", "ad_set"), "campaign": ("campaign",), "account": ()}
+COMPACT_FIELDS = ("id", "scope", "action", "severity", "title", "rationale", "recommendations") + KEY_FIELDS
+
+
+def compact_insights(insights: List[Insight]) -> CompactInsights:
+    # Agents reuse a handful of static recommendation lists, so each distinct list is
+    # interned once and rows carry its id
+    templates: Dict[Tuple[str, ...], str] = {}
+    rows: List[List[Any]] = []
+    for i in insights:
+        lines = tuple(i.recommendations)
+        template = templates.get(lines)
+        if template is None:
+            template = templates[lines] = f"r{len(templates)}"
+        keys = i.keys
+        rows.append(
+            [i.id, i.scope, i.action, i.severity, i.title, i.rationale, template]
+            + [keys.get(k) for k in KEY_FIELDS]
+        )
+    return CompactInsights.model_construct(
+        fields=list(COMPACT_FIELDS),
+        recommendations={template: list(lines) for lines, template in templates.items()},
+        rows=rows,
+    )
+
+
+def expand_insights(compact: CompactInsights) -> List[Insight]:
+    index = {name: n for n, name in enumerate(compact.fields)}
+    insights: List[Insight] = []
+    for row in compact.rows:
+        scope = row[index["scope"]]
+        keys = {k: row[index[k]] for k in SCOPE_KEYS.get(scope, KEY_FIELDS)}
+        insights.append(
+            Insight(
+                id=row[index["id"]],
+                scope=scope,
+                keys=keys,
+                action=row[index["action"]],
+                title=row[index["title"]],
+                rationale=row[index["rationale"]],
+                recommendations=compact.recommendations.get(row[index["recommendations"]], []),
+                severity=row[index["severity"]],
+            )
+        )
+    return insights
@@ -1,29 +1,48 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from functools import lru_cache
 import csv
 import io
 
-try:
-    # optional at runtime
-    from langgraph.graph import Graph
-except Exception:  # pragma: no cover
-    Graph = None  # type: ignore
+import numpy as np
 
 from .models import (
     AnalysisConfig,
     AnalysisResult,
+    DeltaResult,
     ColumnMapping,
     RowMetrics,
-    Insight,
     AnalyzeRequest,
 )
+from .agents.base import BaseAgent
+from .collector import InsightCollector
 from .column_mapper import map_columns
+from .compact import compact_insights
+from .frame import DATE_KEY, MetricsFrame, build_frame, concat_frames
+from .incremental import AdStateStore, apply_delta
+from .instrument import StageRecorder
+from .rollup import RollupAccumulator
+from .shards import ShardRules, evaluate_rules
+from .sources import StreamSource, iter_chunks, open_text_stream
+from .timeseries import DailyWindows
 from .agents.ctr_agent import CTRAgent
 from .agents.roas_agent import ROASAgent
 from .agents.conversion_agent import ConversionAgent
 from .agents.fatigue_agent import FatigueAgent
-from .llm import summarize_insights
+from .agents.peer_agent import PeerAgent
+from .llm import basic_summary, summarize_insights
+from .lru import LRUCache
 
+if TYPE_CHECKING:  # pragma: no cover
+    from .arrow import ArrowSource
+
+# progress(rows_processed, stage) where stage is "parse", an agent name or "summarize"
+ProgressCallback = Callable[[int, str], None]
+# events(kind, data) while an analysis runs: ("mapping", ColumnMapping) once the header is mapped,
+# then ("insights", (agent name, insights)) each time an agent adds to the current top K
+EventCallback = Callable[[str, Any], None]
+# Yields the input as MetricsFrames, recording its own parse/convert stages
+FrameSource = Callable[[ColumnMapping, StageRecorder], Iterator[MetricsFrame]]
 
 CANONICAL_KEYS = {
     "campaign",
@@ -46,142 +65,357 @@ CANONICAL_KEYS = {
 }
 
 
+# AnalysisConfig fields that shape the agents; everything else is per-call state
+AGENT_FIELDS = (
+    "ctr_healthy_pct",
+    "atc_to_purchase_min_pct",
+    "frequency_fatigue_threshold",
+    "ctr_drop_warn_pct",
+    "ctr_decay_warn_pct",
+    "peer_outliers",
+    "peer_z_threshold",
+    "peer_min_peers",
+)
+
+
+# Agents compile_pipeline builds; any other agent in InsightEngine.agents was added by the caller
+BUILTIN_AGENTS = (CTRAgent, ROASAgent, ConversionAgent, FatigueAgent, PeerAgent)
+
+
+def _no_progress(rows: int, stage: str) -> None:
+    pass
+
+
+class Pipeline(NamedTuple):
+    agents: List[BaseAgent]
+    graph: Any
+
+
+def pipeline_key(cfg: AnalysisConfig) -> Tuple[Any, ...]:
+    return tuple(getattr(cfg, f) for f in AGENT_FIELDS)
+
+
+def compile_pipeline(cfg: AnalysisConfig) -> Pipeline:
+    agents: List[BaseAgent] = [
+        CTRAgent(healthy_ctr_pct=cfg.ctr_healthy_pct),
+        ROASAgent(),
+        ConversionAgent(atc_to_purchase_min_pct=cfg.atc_to_purchase_min_pct),
+        FatigueAgent(
+            frequency_threshold=cfg.frequency_fatigue_threshold,
+            ctr_drop_warn_pct=cfg.ctr_drop_warn_pct,
+            ctr_decay_warn_pct=cfg.ctr_decay_warn_pct,
+        ),
+    ]
+    if cfg.peer_outliers:
+        agents.append(PeerAgent(z_threshold=cfg.peer_z_threshold, min_peers=cfg.peer_min_peers))
+
+    graph = None
+    Graph = _graph_class()
+    if Graph is not None:
+        try:
+            g = Graph()
+            for a in agents:
+                g.add_node(a.name, a.analyze)
+            # simple linear flow
+            for i in range(len(agents) - 1):
+                g.add_edge(agents[i].name, agents[i + 1].name)
+            graph = g
+        except Exception:
+            graph = None
+    return Pipeline(agents, graph)
+
+
+@lru_cache(maxsize=None)
+def _graph_class() -> Any:
+    # optional at runtime, and only imported once a pipeline is compiled
+    try:
+        from langgraph.graph import Graph
+    except Exception:  # pragma: no cover
+        return None
+    return Graph
+
+
 class InsightEngine:
-    def __init__(self, config: Optional[AnalysisConfig] = None) -> None:
+    def __init__(self, config: Optional[AnalysisConfig] = None, pipeline_cache_size: int = 64) -> None:
         self.config = config or AnalysisConfig()
-        self.agents = [
-            CTRAgent(healthy_ctr_pct=self.config.ctr_healthy_pct),
-            ROASAgent(),
-            ConversionAgent(atc_to_purchase_min_pct=self.config.atc_to_purchase_min_pct),
-            FatigueAgent(
-                frequency_threshold=self.config.frequency_fatigue_threshold,
-                ctr_drop_warn_pct=self.config.ctr_drop_warn_pct,
-            ),
-        ]
-
-        self.graph = None
-        if Graph is not None:
-            try:
-                g = Graph()
-                for a in self.agents:
-                    g.add_node(a.name, a.analyze)
-                # simple linear flow
-                for i in range(len(self.agents) - 1):
-                    g.add_edge(self.agents[i].name, self.agents[i + 1].name)
-                self.graph = g
-            except Exception:
-                self.graph = None
+        self.agents, self.graph = compile_pipeline(self.config)
+        # Request configs with other thresholds get their own agents, compiled once per
+        # distinct threshold set and shared by every later request that uses it
+        self.pipelines: LRUCache[Tuple[Any, ...], Pipeline] = LRUCache(maxsize=pipeline_cache_size)
+
+    def pipeline(self, cfg: Optional[AnalysisConfig] = None) -> Pipeline:
+        cfg = cfg or self.config
+        key = pipeline_key(cfg)
+        if key == pipeline_key(self.config):
+            # self.agents may carry custom agents appended by the caller
+            return Pipeline(self.agents, self.graph)
+        compiled = self.pipelines.get(key)
+        if compiled is None:
+            compiled = compile_pipeline(cfg)
+            self.pipelines.put(key, compiled)
+        # Custom agents run after the built-ins whatever the thresholds; read on each call so
+        # agents appended after a pipeline was cached are included too
+        custom = [a for a in self.agents if type(a) not in BUILTIN_AGENTS]
+        if custom:
+            return Pipeline(compiled.agents + custom, compiled.graph)
+        return compiled
 
     # Public API
-    def analyze(self, payload: Dict[str, Any] | AnalyzeRequest) -> AnalysisResult:
+    def analyze(
+        self,
+        payload: Dict[str, Any] | AnalyzeRequest,
+        progress: Optional[ProgressCallback] = None,
+        recorder: Optional[StageRecorder] = None,
+        events: Optional[EventCallback] = None,
+    ) -> AnalysisResult:
         req = payload if isinstance(payload, AnalyzeRequest) else AnalyzeRequest(**payload)
         cfg = req.config or self.config
 
         columns, rows = self._parse_input(req)
-        mapping = map_columns(columns)
-        records = self._rows_to_metrics(rows, mapping)
-
-        insights: List[Insight] = []
-        if self.graph is not None:
-            # Exec each node sequentially; collect
-            current_rows = records
-            for agent in self.agents:
-                agent_insights = agent.analyze(current_rows)
-                insights.extend(agent_insights)
-        else:
-            for agent in self.agents:
-                insights.extend(agent.analyze(records))
-
-        if cfg.llm_enabled:
-            summary = summarize_insights(insights, model=cfg.openai_model, temperature=cfg.temperature)
-        else:
-            summary = summarize_insights(insights, model=cfg.openai_model, temperature=0.0)
-
-        return AnalysisResult(column_mapping=mapping, insights=insights[: cfg.max_insights], summary=summary)
+        return self._analyze_rows(columns, rows, cfg, progress, recorder, events)
+
+    def analyze_stream(
+        self,
+        source: StreamSource,
+        config: Optional[AnalysisConfig] = None,
+        progress: Optional[ProgressCallback] = None,
+        recorder: Optional[StageRecorder] = None,
+        events: Optional[EventCallback] = None,
+    ) -> AnalysisResult:
+        # Header is mapped once; rows flow through the agents cfg.chunk_rows at a time
+        cfg = config or self.config
+        with open_text_stream(source) as lines:
+            reader = csv.reader(lines)
+            header = next(reader, None)
+            if header is None:
+                raise ValueError("CSV stream is empty")
+            return self._analyze_rows(header, reader, cfg, progress, recorder, events)
+
+    def analyze_arrow(
+        self,
+        source: ArrowSource,
+        config: Optional[AnalysisConfig] = None,
+        progress: Optional[ProgressCallback] = None,
+        recorder: Optional[StageRecorder] = None,
+        events: Optional[EventCallback] = None,
+    ) -> AnalysisResult:
+        # Parquet or Arrow IPC: columns are mapped from the schema and only mapped columns
+        # are decoded; typed numeric columns reach the agents without per-cell conversion
+        from .arrow import ArrowReader, frame_from_batch
+
+        cfg = config or self.config
+        reader = ArrowReader(source)
+        names = reader.names
+
+        def frames(mapping: ColumnMapping, recorder: StageRecorder) -> Iterator[MetricsFrame]:
+            wanted = set(mapping.resolved.values())
+            batches = reader.batches([n for n in names if n in wanted], cfg.chunk_rows)
+            for batch in recorder.timed_chunks("parse", batches):
+                with recorder.stage("convert", rows=batch.num_rows):
+                    frame = frame_from_batch(batch, mapping)
+                yield frame
+
+        return self._analyze(names, frames, cfg, progress, recorder, events)
+
+    def analyze_delta(self, payload: Dict[str, Any] | AnalyzeRequest, store: AdStateStore) -> DeltaResult:
+        # Rows replace the stored state of their ads; only those ads and their roll-up
+        # groups are re-evaluated, and the result lists what changed since the last upload
+        req = payload if isinstance(payload, AnalyzeRequest) else AnalyzeRequest(**payload)
+        cfg = req.config or self.config
+        columns, rows = self._parse_input(req)
+        return apply_delta(self.pipeline(cfg).agents, columns, rows, cfg, store)
 
     # Helpers
-    def _parse_input(self, req: AnalyzeRequest) -> tuple[list[str], list[list[Any]]]:
+    def _analyze_rows(
+        self,
+        columns: List[str],
+        rows: Iterable[List[Any]],
+        cfg: AnalysisConfig,
+        progress: Optional[ProgressCallback] = None,
+        recorder: Optional[StageRecorder] = None,
+        events: Optional[EventCallback] = None,
+    ) -> AnalysisResult:
+        def frames(mapping: ColumnMapping, recorder: StageRecorder) -> Iterator[MetricsFrame]:
+            for chunk in recorder.timed_chunks("parse", iter_chunks(rows, cfg.chunk_rows)):
+                with recorder.stage("convert", rows=len(chunk)):
+                    frame = build_frame(columns, chunk, mapping)
+                yield frame
+
+        return self._analyze(columns, frames, cfg, progress, recorder, events)
+
+    def _analyze(
+        self,
+        columns: List[str],
+        frames: FrameSource,
+        cfg: AnalysisConfig,
+        progress: Optional[ProgressCallback] = None,
+        recorder: Optional[StageRecorder] = None,
+        events: Optional[EventCallback] = None,
+    ) -> AnalysisResult:
+        # Timings are returned when the config asks for them or the caller supplied a recorder
+        report_timings = cfg.timings or recorder is not None
+        recorder = recorder or StageRecorder(trace_memory=cfg.trace_memory)
+        progress = progress or _no_progress
+        recorder.start()
+        try:
+            with recorder.stage("map"):
+                mapping = map_columns(columns)
+            if events is not None:
+                events("mapping", mapping)
+            collector = InsightCollector(cfg.max_insights)
+            rollups = RollupAccumulator(cfg.rollups)
+            totals: Dict[str, float] = {"rows": 0.0}
+
+            # Daily exports are windowed into one row per ad before any agent runs. A date
+            # column alone does not make one (aggregated exports carry "Reporting starts"),
+            # so frames are held until some ad turns up on a second day, and analyzed as
+            # they are if none does.
+            daily = DailyWindows() if DATE_KEY in mapping.resolved else None
+            # (frame, row offset, rows without an ad identity, which are never windowed)
+            pending: List[Tuple[MetricsFrame, int, np.ndarray]] = []
+            # Rows whose date is blank or unreadable; they count in the totals but not in any window
+            undated = 0
+
+            # Agents that compare rows with each other run once every row is in (see
+            # BaseAgent.shardable); until then only the columns they read are kept
+            agents = self.pipeline(cfg).agents
+            chunked = [a for a in agents if a.shardable]
+            whole = [a for a in agents if not a.shardable]
+            reads: Optional[List[str]] = None
+            if not any(a.reads is None for a in whole):
+                # Spend ranks every insight
+                reads = sorted({"spend"}.union(*(a.reads or () for a in whole)))
+            held: List[MetricsFrame] = []
+
+            def consume(frame: MetricsFrame, row_offset: int) -> None:
+                self._run_agents(frame, collector, row_offset, progress, recorder, cfg, events, chunked)
+                if whole:
+                    held.append(frame.select(reads))
+                if rollups.levels:
+                    with recorder.stage("rollup", rows=len(frame)):
+                        rollups.add(frame)
+
+            for frame in frames(mapping, recorder):
+                row_offset = int(totals["rows"])
+                progress(row_offset, "parse")
+                if daily is None:
+                    consume(frame, row_offset)
+                else:
+                    with recorder.stage("window", rows=len(frame)):
+                        pending.append((frame, row_offset, daily.add(frame)))
+                    undated += len(frame) - int(frame.valid(DATE_KEY).sum())
+                    if daily.several_days:
+                        for held_frame, offset, loose in pending:
+                            if len(loose):
+                                consume(held_frame.take(loose), offset)
+                        pending.clear()
+                totals["rows"] += len(frame)
+                for key, value in frame.totals().items():
+                    totals[key] = totals.get(key, 0.0) + value
+            if daily is not None and daily.several_days:
+                totals["undated_rows"] = float(undated)
+                with recorder.stage("window"):
+                    frame = daily.frame()
+                consume(frame, 0)
+            for frame, offset, _ in pending:
+                consume(frame, offset)
+            pending.clear()
+            if held:
+                frame = concat_frames(held)
+                held.clear()
+                self._run_agents(frame, collector, 0, progress, recorder, cfg, events, whole)
+
+            # Roll-up frames rank after every input row on ties
+            for frame in rollups.frames():
+                self._run_agents(frame, collector, int(totals["rows"]), progress, recorder, cfg, events)
+
+            progress(int(totals["rows"]), "summarize")
+            with recorder.stage("summarize") as stats:
+                insights = collector.results()
+                if cfg.llm_enabled:
+                    summary = summarize_insights(
+                        insights,
+                        model=cfg.openai_model,
+                        temperature=cfg.temperature,
+                        action_counts=collector.action_counts,
+                        timeout=cfg.llm_timeout_s,
+                    )
+                else:
+                    # openai is never imported unless the request asks for the LLM
+                    summary = basic_summary(insights, collector.action_counts)
+                stats.insights += len(insights)
+        finally:
+            recorder.stop()
+
+        return AnalysisResult(
+            column_mapping=mapping,
+            insights=[] if cfg.compact else insights,
+            compact=compact_insights(insights) if cfg.compact else None,
+            summary=summary,
+            totals=totals,
+            timings=recorder.results() if report_timings else None,
+        )
+
+    def _run_agents(
+        self,
+        frame: MetricsFrame,
+        collector: InsightCollector,
+        row_offset: int,
+        progress: ProgressCallback = _no_progress,
+        recorder: Optional[StageRecorder] = None,
+        cfg: Optional[AnalysisConfig] = None,
+        events: Optional[EventCallback] = None,
+        agents: Optional[List[BaseAgent]] = None,
+    ) -> None:
+        cfg = cfg or self.config
+        recorder = recorder or StageRecorder()
+        agents = self.pipeline(cfg).agents if agents is None else agents
+        records: Optional[List[RowMetrics]] = None
+        sharded: Dict[str, ShardRules] = {}
+        if cfg.workers > 1 and len(frame) > cfg.shard_rows:
+            # Frames within one shard stay serial, where the pool would only add overhead
+            with recorder.stage("rules", rows=len(frame)):
+                frame_agents = [a for a in agents if a.supports_frame and a.shardable]
+                sharded = evaluate_rules(frame_agents, frame, cfg.shard_rows, cfg.workers)
+        for agent in agents:
+            if frame.scope != "ad" and not agent.supports_frame:
+                # Row-based agents only know ad rows
+                continue
+            progress(row_offset, agent.name)
+            with recorder.stage(agent.name, rows=len(frame)) as stats:
+                before = collector.emitted(agent.name)
+                if agent.supports_frame:
+                    parts = sharded.get(agent.name) or [(0, frame, agent.rules(frame))]
+                    for start, shard, rules in parts:
+                        for rule in rules:
+                            collector.offer(agent.name, rule, shard, row_offset + start)
+                else:
+                    # Custom row-based agents share one materialization
+                    if records is None:
+                        records = frame.to_rows()
+                    collector.add(agent.name, agent.analyze(records), row_offset)
+                stats.insights += collector.emitted(agent.name) - before
+            if events is not None:
+                # Streamed per agent, so survivors are built now rather than once per frame
+                with recorder.stage("build"):
+                    fresh = collector.fresh()
+                if fresh:
+                    events("insights", (agent.name, fresh))
+        with recorder.stage("build"):
+            collector.settle()
+
+    def _parse_input(self, req: AnalyzeRequest) -> Tuple[List[str], Iterable[List[Any]]]:
         if req.csv:
-            f = io.StringIO(req.csv)
-            reader = csv.reader(f)
-            rows = list(reader)
-            if not rows:
+            reader = csv.reader(io.StringIO(req.csv))
+            header = next(reader, None)
+            if header is None:
                 raise ValueError("CSV provided but empty")
-            return rows[0], rows[1:]
+            return header, reader
         if req.columns is not None and req.rows is not None:
             return req.columns, req.rows
         raise ValueError("Provide either csv or columns+rows")
 
-    def _rows_to_metrics(self, rows: List[List[Any]], mapping: ColumnMapping) -> List[RowMetrics]:
-        # Build reverse lookup input_col -> canonical
-        input_to_canonical: Dict[str, str] = {v: k for k, v in mapping.resolved.items()}
-
-        metrics_rows: List[RowMetrics] = []
-        # map input columns to indices
-        headers = list(mapping.resolved.values())
-        idx = {col: i for i, col in enumerate(headers)}
-
-        for raw in rows:
-            values_by_key: Dict[str, Any] = {}
-            for canonical, input_name in mapping.resolved.items():
-                i = idx.get(input_name)
-                if i is None or i >= len(raw):
-                    continue
-                values_by_key[canonical] = raw[i]
-
-            # Parse numeric fields robustly
-            def num(x: Any) -> Optional[float]:
-                if x is None:
-                    return None
-                if isinstance(x, (int, float)):
-                    return float(x)
-                try:
-                    s = str(x).replace(",", "").replace("%", "").strip()
-                    if s == "":
-                        return None
-                    return float(s)
-                except Exception:
-                    return None
-
-            rm = RowMetrics(
-                campaign=self._str(values_by_key.get("campaign")),
-                ad_set=self._str(values_by_key.get("ad_set")),
-                ad_name=self._str(values_by_key.get("ad_name")),
-                ad_id=self._str(values_by_key.get("ad_id")),
-                spend=num(values_by_key.get("spend")),
-                impressions=int(num(values_by_key.get("impressions") or 0) or 0) if values_by_key.get("impressions") is not None else None,
-                clicks=int(num(values_by_key.get("clicks") or 0) or 0) if values_by_key.get("clicks") is not None else None,
-                ctr=num(values_by_key.get("ctr")),
-                frequency=num(values_by_key.get("frequency")),
-                roas=num(values_by_key.get("roas")),
-                purchases=int(num(values_by_key.get("purchases") or 0) or 0) if values_by_key.get("purchases") is not None else None,
-                purchase_value=num(values_by_key.get("purchase_value")),
-                adds_to_cart=int(num(values_by_key.get("adds_to_cart") or 0) or 0) if values_by_key.get("adds_to_cart") is not None else None,
-                atc_to_purchase_pct=num(values_by_key.get("atc_to_purchase_pct")),
-                ctr_7d=num(values_by_key.get("ctr_7d")),
-                ctr_prev7=num(values_by_key.get("ctr_prev7")),
-                ctr_drop_vs_prev7=num(values_by_key.get("ctr_drop_vs_prev7")),
-            )
-
-            # Derive metrics if missing
-            if rm.ctr is None and rm.clicks is not None and rm.impressions:
-                rm.ctr = (rm.clicks / max(rm.impressions, 1)) * 100.0
-            if rm.roas is None and rm.purchase_value is not None and rm.spend:
-                if rm.spend > 0:
-                    rm.roas = rm.purchase_value / rm.spend
-            if rm.atc_to_purchase_pct is None and rm.purchases is not None and rm.adds_to_cart:
-                if rm.adds_to_cart > 0:
-                    rm.atc_to_purchase_pct = (rm.purchases / rm.adds_to_cart) * 100.0
-            if rm.ctr_drop_vs_prev7 is None and rm.ctr_7d is not None and rm.ctr_prev7 is not None and rm.ctr_prev7 > 0:
-                drop = ((rm.ctr_prev7 - rm.ctr_7d) / rm.ctr_prev7) * 100.0
-                rm.ctr_drop_vs_prev7 = max(0.0, drop)
-
-            metrics_rows.append(rm)
-
-        return metrics_rows
-
-    def _str(self, v: Any) -> Optional[str]:
-        if v is None:
-            return None
-        s = str(v).strip()
-        return s if s else None
+    def _rows_to_metrics(
+        self, columns: List[str], rows: List[List[Any]], mapping: ColumnMapping
+    ) -> List[RowMetrics]:
+        return build_frame(columns, rows, mapping).to_rows()
@@ -0,0 +1,328 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .models import ColumnMapping, RowMetrics
+
+ID_KEYS = ("campaign", "ad_set", "ad_name", "ad_id")
+INT_KEYS = ("impressions", "clicks", "purchases", "adds_to_cart")
+FLOAT_KEYS = (
+    "spend",
+    "ctr",
+    "frequency",
+    "roas",
+    "purchase_value",
+    "atc_to_purchase_pct",
+    "ctr_7d",
+    "ctr_prev7",
+    "ctr_drop_vs_prev7",
+    # Only derived from daily rows (see timeseries), never read from an export
+    "frequency_trend",
+    "ctr_decay_pct",
+)
+NUMERIC_KEYS = INT_KEYS + FLOAT_KEYS
+FIELDS = ID_KEYS + NUMERIC_KEYS
+# Day of each input row as days since 1970-01-01 (NaN = unknown); only present in a frame's
+# values when the export has a date column
+DATE_KEY = "date"
+TOTAL_KEYS = ("spend", "impressions", "clicks", "purchases", "purchase_value", "adds_to_cart")
+# A time followed by a zone: Z, +hh, +hh:mm / -hhmm (optionally after UTC or GMT), or a name
+# such as UTC or PST
+_UTC_OFFSET = (
+    r"^(.*\d:\d\d(?::\d\d)?(?:\.\d+)?(?:\s*[AaPp][Mm])?)\s*"
+    r"(?:Z|(?:UTC|GMT)?\s*[+-]\d\d?(?::?\d\d)?|(?![AP]M$)[A-Z]{2,5})$"
+)
+
+
+class IdColumn:
+    """Dictionary-encoded identifiers: int32 codes into a table of the distinct values,
+    -1 for a missing id. Slices share the table; strings are only looked up for the rows
+    that end up in a result."""
+
+    __slots__ = ("codes", "table")
+
+    def __init__(self, codes: np.ndarray, table: np.ndarray) -> None:
+        self.codes = codes
+        self.table = table
+
+    @classmethod
+    def missing(cls, n: int) -> "IdColumn":
+        return cls(np.full(n, -1, dtype=np.int32), np.empty(0, dtype=object))
+
+    @classmethod
+    def encode(cls, values: Sequence[Any]) -> "IdColumn":
+        # From values that are already clean (strings or None)
+        import pandas as pd
+
+        codes, table = pd.factorize(np.asarray(values, dtype=object))
+        return cls(codes.astype(np.int32), np.asarray(table, dtype=object))
+
+    @classmethod
+    def concat(cls, columns: Sequence["IdColumn"]) -> "IdColumn":
+        # One table for all the columns; each column's codes are remapped into it
+        import pandas as pd
+
+        merged, table = pd.factorize(np.concatenate([c.table for c in columns]))
+        parts, offset = [], 0
+        for column in columns:
+            remap = np.append(merged[offset : offset + len(column.table)], -1).astype(np.int32)
+            parts.append(remap[column.codes])
+            offset += len(column.table)
+        return cls(np.concatenate(parts), np.asarray(table, dtype=object))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, idx: Any) -> Union[Optional[str], "IdColumn"]:
+        if isinstance(idx, (int, np.integer)):
+            code = self.codes[idx]
+            return None if code < 0 else self.table[code]
+        return IdColumn(self.codes[idx], self.table)
+
+    def decode(self) -> np.ndarray:
+        # Code -1 picks the trailing None
+        return np.append(self.table, None)[self.codes]
+
+    def tolist(self) -> List[Optional[str]]:
+        return self.decode().tolist()
+
+
+class MetricsFrame:
+    """Columnar view of ad metrics: dictionary-encoded identifiers (IdColumn), float64
+    arrays (NaN = null) for every numeric key, including the integer counters."""
+
+    __slots__ = ("ids", "values", "length", "scope")
+
+    def __init__(
+        self, ids: Dict[str, IdColumn], values: Dict[str, np.ndarray], length: int, scope: str = "ad"
+    ) -> None:
+        self.ids = ids
+        self.values = values
+        self.length = length
+        # "ad" for input rows; roll-up frames hold one row per ad_set, campaign or the account
+        self.scope = scope
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        if key in self.values:
+            return self.values[key]
+        # Identifiers as an object array; hot paths use ids[key].codes instead
+        return self.ids[key].decode()
+
+    def valid(self, key: str) -> np.ndarray:
+        return ~np.isnan(self.values[key])
+
+    def window(self, start: int, stop: int) -> "MetricsFrame":
+        # Row range as views, no copy
+        ids = {k: v[start:stop] for k, v in self.ids.items()}
+        values = {k: v[start:stop] for k, v in self.values.items()}
+        return MetricsFrame(ids, values, max(0, min(stop, self.length) - start), self.scope)
+
+    def take(self, idx: np.ndarray) -> "MetricsFrame":
+        ids = {k: v[idx] for k, v in self.ids.items()}
+        values = {k: v[idx] for k, v in self.values.items()}
+        return MetricsFrame(ids, values, len(idx), self.scope)
+
+    def select(self, keys: Optional[Sequence[str]]) -> "MetricsFrame":
+        # Every identifier and only these numeric columns (None = all), no copy
+        values = self.values if keys is None else {k: self.values[k] for k in keys}
+        return MetricsFrame(self.ids, dict(values), self.length, self.scope)
+
+    def totals(self) -> Dict[str, float]:
+        return {k: float(np.nansum(self.values[k])) for k in TOTAL_KEYS}
+
+    def to_rows(self) -> List[RowMetrics]:
+        ids = {k: self.ids[k].tolist() for k in ID_KEYS}
+        floats = {k: [None if v != v else v for v in self.values[k].tolist()] for k in FLOAT_KEYS}
+        ints = {k: [None if v != v else int(v) for v in self.values[k].tolist()] for k in INT_KEYS}
+        columns = {**ids, **floats, **ints}
+        return [
+            RowMetrics.model_construct(**{k: col[i] for k, col in columns.items()})
+            for i in range(self.length)
+        ]
+
+
+def concat_frames(frames: Sequence[MetricsFrame]) -> MetricsFrame:
+    # Rows of every frame in order; columns are those of the first frame
+    if len(frames) == 1:
+        return frames[0]
+    first = frames[0]
+    ids = {k: IdColumn.concat([f.ids[k] for f in frames]) for k in first.ids}
+    values = {k: np.concatenate([f.values[k] for f in frames]) for k in first.values}
+    return MetricsFrame(ids, values, sum(len(f) for f in frames), first.scope)
+
+
+def to_records(frame: MetricsFrame) -> List[List[Any]]:
+    # One plain list per row in FIELDS order, None for nulls (JSON-safe)
+    columns = [frame.ids[k].tolist() for k in ID_KEYS]
+    columns += [[None if v != v else v for v in frame.values[k].tolist()] for k in NUMERIC_KEYS]
+    return [list(row) for row in zip(*columns)]
+
+
+def from_records(records: Sequence[Sequence[Any]]) -> MetricsFrame:
+    n = len(records)
+    by_field = _transpose(records, len(FIELDS))
+    ids = {k: IdColumn.encode(by_field[j]) for j, k in enumerate(ID_KEYS)}
+    values = {
+        k: np.asarray(by_field[len(ID_KEYS) + j], dtype=np.float64) for j, k in enumerate(NUMERIC_KEYS)
+    }
+    return MetricsFrame(ids, values, n)
+
+
+def build_frame(columns: Sequence[str], rows: Sequence[Sequence[Any]], mapping: ColumnMapping) -> MetricsFrame:
+    position = {name: i for i, name in enumerate(columns)}
+    by_position = _transpose(rows, len(columns))
+
+    def column(key: str) -> Optional[Sequence[Any]]:
+        i = position.get(mapping.resolved.get(key, ""))
+        return None if i is None else by_position[i]
+
+    return assemble_frame({key: column(key) for key in FIELDS + (DATE_KEY,)}, len(rows))
+
+
+def assemble_frame(raw: Dict[str, Any], n: int) -> MetricsFrame:
+    # raw maps each canonical key to its column (None when unmapped). Numeric columns that
+    # are already float64 arrays (typed sources such as Arrow) are used as is, NaN = null;
+    # identifier columns may arrive already encoded; anything else is parsed as text.
+    ids = {key: _encode_strings(raw.get(key), n) for key in ID_KEYS}
+    values: Dict[str, np.ndarray] = {}
+    for key in NUMERIC_KEYS:
+        col = raw.get(key)
+        if isinstance(col, np.ndarray) and col.dtype == np.float64:
+            # A null counter is a blank cell, which counts as zero as it does in text input
+            values[key] = np.trunc(np.nan_to_num(col, nan=0.0)) if key in INT_KEYS else col
+        else:
+            values[key] = _parse_numeric(col, n, as_int=key in INT_KEYS)
+    dates = raw.get(DATE_KEY)
+    if dates is not None:
+        is_days = isinstance(dates, np.ndarray) and dates.dtype == np.float64
+        values[DATE_KEY] = dates if is_days else _parse_dates(dates, n)
+
+    _derive(values)
+    return MetricsFrame(ids, values, n)
+
+
+def _transpose(rows: Sequence[Sequence[Any]], width: int) -> List[Sequence[Any]]:
+    if not rows:
+        return [()] * width
+    if min(map(len, rows)) < width:
+        # Short rows are padded with None (missing cells)
+        rows = [r if len(r) >= width else list(r) + [None] * (width - len(r)) for r in rows]
+    return list(zip(*rows))[:width]
+
+
+def encode_ids(codes: np.ndarray, uniques: Sequence[Any]) -> IdColumn:
+    # Raw identifiers as codes (-1 = null) into their distinct values. Each distinct value
+    # is stripped once; values that clean to the same string, or to nothing, share a code.
+    cleaned = [(str(u).strip() if u is not None else "") or None for u in uniques]
+    if all(c is u for c, u in zip(cleaned, uniques)):
+        # Nothing needed cleaning (strip returns the same object), so the values stay distinct
+        return IdColumn(np.asarray(codes, dtype=np.int32), np.asarray(cleaned, dtype=object))
+    import pandas as pd
+
+    remap, table = pd.factorize(np.asarray(cleaned, dtype=object))
+    remap = np.append(remap, -1).astype(np.int32)
+    return IdColumn(remap[codes], np.asarray(table, dtype=object))
+
+
+def _encode_strings(raw: Any, n: int) -> IdColumn:
+    if isinstance(raw, IdColumn):
+        return raw
+    if raw is None or n == 0:
+        return IdColumn.missing(n)
+    import pandas as pd
+
+    codes, uniques = pd.factorize(np.asarray(raw, dtype=object))
+    uniques = uniques.tolist()
+    if not all(isinstance(u, str) for u in uniques):
+        # Typed ids (JSON rows) hash alike when equal (1, 1.0, True) but read differently,
+        # so factorize their text instead
+        text = [None if v is None or v != v else str(v) for v in raw]
+        codes, uniques = pd.factorize(np.asarray(text, dtype=object))
+        uniques = uniques.tolist()
+    return encode_ids(codes, uniques)
+
+
+def _parse_numeric(raw: Optional[Sequence[Any]], n: int, as_int: bool) -> np.ndarray:
+    if raw is None or n == 0:
+        return np.full(n, np.nan)
+    text = np.asarray(raw, dtype=str)
+    text = np.char.strip(np.char.replace(np.char.replace(text, ",", ""), "%", ""))
+    text = np.where(text == "", "nan", text)
+    try:
+        out = text.astype(np.float64)
+    except ValueError:
+        # Some cells are not numbers (or are None); coerce those to NaN
+        import pandas as pd
+
+        out = pd.to_numeric(text.astype(object), errors="coerce").astype(np.float64)
+    if as_int:
+        # Counters present in the row but unparseable count as zero
+        present = np.asarray(raw, dtype=object) != None
+        out = np.where(present, np.trunc(np.nan_to_num(out, nan=0.0)), np.nan)
+    return out
+
+
+def _parse_dates(raw: Sequence[Any], n: int) -> np.ndarray:
+    import pandas as pd
+
+    if n == 0:
+        return np.full(n, np.nan)
+    # A daily export repeats each date across every ad, so each distinct value is parsed once
+    codes, uniques = pd.factorize(np.asarray(raw, dtype=object))
+    text = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    # The calendar day as written: a trailing zone is dropped rather than applied
+    text = text.str.replace(_UTC_OFFSET, r"\1", regex=True)
+    parsed = _to_datetime(text, "ISO8601")
+    retry = parsed.isna() & (text != "")
+    if retry.any():
+        # Exports may mix formats (2024-01-02, 01/02/2024, Jan 2, 2024); these are read one
+        # by one, month first when ambiguous
+        parsed[retry] = _to_datetime(text[retry], "mixed")
+    # Straight to days in the parsed unit; a detour through nanoseconds wraps past 2262
+    days = parsed.to_numpy().astype("datetime64[D]")
+    out = np.where(np.isnat(days), np.nan, days.astype(np.int64).astype(np.float64))
+    return np.append(out, np.nan)[codes]
+
+
+def _to_datetime(text: Any, format: str) -> Any:
+    # Naive datetimes from a Series of strings, NaT where unreadable. A zone left in place
+    # is applied (to UTC) rather than failing the column.
+    import pandas as pd
+
+    try:
+        parsed = pd.to_datetime(text, format=format, errors="coerce", utc=True)
+    except (ValueError, TypeError, OverflowError):
+        parsed = pd.Series([_one_datetime(pd, v, format) for v in text], index=text.index)
+        parsed = pd.to_datetime(parsed, utc=True)
+    return parsed.dt.tz_localize(None)
+
+
+def _one_datetime(pd: Any, value: str, format: str) -> Any:
+    try:
+        return pd.to_datetime(value, format=format, utc=True)
+    except (ValueError, TypeError, OverflowError):
+        return pd.NaT
+
+
+def _derive(v: Dict[str, np.ndarray]) -> None:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        impressions = v["impressions"]
+        fill = np.isnan(v["ctr"]) & ~np.isnan(v["clicks"]) & ~np.isnan(impressions) & (impressions != 0)
+        v["ctr"] = np.where(fill, v["clicks"] / np.maximum(impressions, 1) * 100.0, v["ctr"])
+
+        spend = v["spend"]
+        fill = np.isnan(v["roas"]) & ~np.isnan(v["purchase_value"]) & (spend > 0)
+        v["roas"] = np.where(fill, v["purchase_value"] / spend, v["roas"])
+
+        atc = v["adds_to_cart"]
+        fill = np.isnan(v["atc_to_purchase_pct"]) & ~np.isnan(v["purchases"]) & (atc > 0)
+        v["atc_to_purchase_pct"] = np.where(fill, v["purchases"] / atc * 100.0, v["atc_to_purchase_pct"])
+
+        prev = v["ctr_prev7"]
+        fill = np.isnan(v["ctr_drop_vs_prev7"]) & ~np.isnan(v["ctr_7d"]) & (prev > 0)
+        drop = np.maximum(0.0, (prev - v["ctr_7d"]) / prev * 100.0)
+        v["ctr_drop_vs_prev7"] = np.where(fill, drop, v["ctr_drop_vs_prev7"])
@@ -0,0 +1,169 @@
+from __future__ import annotations
+from typing import Any, ContextManager, Dict, Iterable, List, Sequence, Tuple
+import json
+import sqlite3
+
+import numpy as np
+
+from .agents.base import BaseAgent
+from .column_mapper import map_columns
+from .frame import MetricsFrame, build_frame, from_records, to_records
+from .models import AnalysisConfig, DeltaResult, Insight
+from .rollup import ROLLUP_LEVELS, STATS_WIDTH, Group, RollupAccumulator, group_keys
+from .sqlite_store import create, transaction
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS ads (key TEXT PRIMARY KEY, record TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS rollups (level TEXT, grp TEXT, stats BLOB NOT NULL, PRIMARY KEY (level, grp))",
+    "CREATE TABLE IF NOT EXISTS insights (id TEXT PRIMARY KEY, owner TEXT NOT NULL, body TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS insights_owner ON insights (owner)",
+)
+# SQLite caps bound parameters per statement
+_BATCH = 500
+
+
+class AdStateStore:
+    # Local SQLite state for incremental analysis: the latest metrics per ad (keyed on
+    # ad_id, else ad_name), roll-up partial sums per group and the insights last emitted
+    # for each owner (an ad or a roll-up group). A delta reads and saves its state inside
+    # one transaction(), so concurrent deltas apply one after the other.
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def open(self) -> None:
+        create(self.path, _SCHEMA)
+
+    def transaction(self) -> ContextManager[sqlite3.Connection]:
+        return transaction(self.path)
+
+    def ads(self, db: sqlite3.Connection, keys: Sequence[str]) -> Dict[str, List[Any]]:
+        rows = _select_in(db, "SELECT key, record FROM ads WHERE key IN ({})", keys)
+        return {key: json.loads(record) for key, record in rows}
+
+    def rollups(self, db: sqlite3.Connection, level: str, groups: Iterable[Group]) -> Tuple[List[Group], np.ndarray]:
+        sql = "SELECT grp, stats FROM rollups WHERE level = ? AND grp IN ({})"
+        rows = _select_in(db, sql, [_group_key(g) for g in groups], level)
+        stats = np.frombuffer(b"".join(blob for _, blob in rows), dtype=np.float64).reshape(-1, STATS_WIDTH)
+        return [tuple(json.loads(grp)) for grp, _ in rows], stats
+
+    def insights(self, db: sqlite3.Connection, owners: Sequence[str]) -> Dict[str, Insight]:
+        rows = _select_in(db, "SELECT body FROM insights WHERE owner IN ({})", owners)
+        insights = [Insight.model_validate_json(body) for (body,) in rows]
+        return {i.id: i for i in insights}
+
+    def save(
+        self,
+        db: sqlite3.Connection,
+        ads: Dict[str, List[Any]],
+        rollups: RollupAccumulator,
+        owners: Sequence[str],
+        insights: List[Insight],
+    ) -> None:
+        db.executemany(
+            "INSERT OR REPLACE INTO ads (key, record) VALUES (?, ?)",
+            [(key, json.dumps(record)) for key, record in ads.items()],
+        )
+        for level in rollups.levels:
+            live, empty = [], []
+            for group, stats in rollups.groups(level, touched_only=True):
+                if stats[0] > 0.5:
+                    live.append((level, _group_key(group), stats.tobytes()))
+                else:
+                    empty.append((level, _group_key(group)))
+            db.executemany("INSERT OR REPLACE INTO rollups (level, grp, stats) VALUES (?, ?, ?)", live)
+            db.executemany("DELETE FROM rollups WHERE level = ? AND grp = ?", empty)
+        db.executemany("DELETE FROM insights WHERE owner = ?", [(o,) for o in owners])
+        db.executemany(
+            "INSERT OR REPLACE INTO insights (id, owner, body) VALUES (?, ?, ?)",
+            [(i.id, _owner(i), i.model_dump_json()) for i in insights],
+        )
+
+
+def apply_delta(
+    agents: Sequence[BaseAgent],
+    columns: List[str],
+    rows: Iterable[List[Any]],
+    cfg: AnalysisConfig,
+    store: AdStateStore,
+) -> DeltaResult:
+    # Work is proportional to the ads in the delta (and the roll-up groups they touch),
+    # not to everything the store has seen.
+    mapping = map_columns(columns)
+    frame = build_frame(columns, list(rows), mapping)
+
+    # A later row for the same ad replaces an earlier one; rows with no ad identity are ignored
+    latest: Dict[str, int] = {}
+    for i, (ad_id, ad_name) in enumerate(zip(frame.ids["ad_id"].tolist(), frame.ids["ad_name"].tolist())):
+        key = ad_id or ad_name
+        if key is not None:
+            latest[key] = i
+    frame = frame.take(np.fromiter(latest.values(), dtype=np.int64, count=len(latest)))
+    keys = list(latest)
+
+    # Agents that compare an ad with the others (BaseAgent.shardable) would only see the
+    # delta's ads here, so they are left out
+    agents = [a for a in agents if a.shardable]
+    # Read, evaluate and save in one transaction: a concurrent delta cannot slip in
+    # between and have its roll-up sums overwritten, and a failure leaves the state intact
+    with store.transaction() as db:
+        previous = from_records(list(store.ads(db, keys).values()))
+        rollups = RollupAccumulator(ROLLUP_LEVELS)
+        for level in ROLLUP_LEVELS:
+            groups = set(group_keys(previous, level) + group_keys(frame, level))
+            rollups.load(level, *store.rollups(db, level, groups))
+        rollups.add(previous, sign=-1.0)
+        rollups.add(frame)
+
+        owners = [f"ad:{key}" for key in keys]
+        current = _evaluate(agents, frame)
+        for level_frame in rollups.frames(touched_only=True):
+            if level_frame.scope in cfg.rollups:
+                current += _evaluate(agents, level_frame)
+        for level in cfg.rollups:
+            # Includes groups whose last ad moved away, so their insights resolve
+            owners += [_group_owner(level, g) for g in rollups.touched[level]]
+
+        before = store.insights(db, owners)
+        store.save(db, dict(zip(keys, to_records(frame))), rollups, owners, current)
+    after = {i.id: i for i in current}
+    return DeltaResult(
+        column_mapping=mapping,
+        ads_updated=len(keys),
+        added=[i for k, i in after.items() if k not in before],
+        changed=[i for k, i in after.items() if k in before and before[k] != i],
+        resolved=[i for k, i in before.items() if k not in after],
+    )
+
+
+def _evaluate(agents: Sequence[BaseAgent], frame: MetricsFrame) -> List[Insight]:
+    insights: List[Insight] = []
+    for agent in agents:
+        if agent.supports_frame:
+            insights += agent.analyze_frame(frame)
+        elif frame.scope == "ad":
+            insights += agent.analyze(frame.to_rows())
+    return insights
+
+
+def _owner(insight: Insight) -> str:
+    if insight.scope == "ad":
+        return f"ad:{insight.keys.get('ad_id') or insight.keys.get('ad_name')}"
+    return _group_owner(insight.scope, tuple(insight.keys.values()))
+
+
+def _group_owner(level: str, group: Group) -> str:
+    return f"{level}:{_group_key(group)}"
+
+
+def _group_key(group: Group) -> str:
+    return json.dumps(list(group))
+
+
+def _select_in(db: sqlite3.Connection, sql: str, values: Sequence[str], *params: str) -> List[Tuple[Any, ...]]:
+    rows: List[Tuple[Any, ...]] = []
+    values = list(values)
+    for start in range(0, len(values), _BATCH):
+        batch = values[start : start + _BATCH]
+        query = sql.format(", ".join("?" * len(batch)))
+        rows += db.execute(query, (*params, *batch)).fetchall()
+    return rows
@@ -0,0 +1,82 @@
+from __future__ import annotations
+from typing import Dict, Iterable, Iterator, List, Optional, Sized, TypeVar
+from contextlib import contextmanager
+import time
+import tracemalloc
+
+from .models import StageTiming
+
+C = TypeVar("C", bound=Sized)
+
+
+class StageStats:
+    __slots__ = ("wall_s", "calls", "rows", "insights", "peak_bytes")
+
+    def __init__(self) -> None:
+        self.wall_s = 0.0
+        self.calls = 0
+        self.rows = 0
+        self.insights = 0
+        self.peak_bytes: Optional[int] = None
+
+
+class StageRecorder:
+    # Accumulates per-stage wall time, rows and insights across chunks. With trace_memory
+    # the peak traced allocation of each stage is recorded too (tracemalloc is slow).
+    def __init__(self, trace_memory: bool = False) -> None:
+        self.trace_memory = trace_memory
+        self._stages: Dict[str, StageStats] = {}
+        self._owns_tracing = False
+
+    def start(self) -> None:
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracing = True
+
+    def stop(self) -> None:
+        if self._owns_tracing:
+            tracemalloc.stop()
+            self._owns_tracing = False
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0) -> Iterator[StageStats]:
+        stats = self._stages.setdefault(name, StageStats())
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.wall_s += time.perf_counter() - start
+            stats.calls += 1
+            stats.rows += rows
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1] - base
+                stats.peak_bytes = max(stats.peak_bytes or 0, peak)
+
+    def timed_chunks(self, name: str, chunks: Iterable[C]) -> Iterator[C]:
+        # Charges the time spent producing each chunk (CSV reading, Arrow batch decoding) to `name`
+        it = iter(chunks)
+        while True:
+            with self.stage(name) as stats:
+                chunk = next(it, None)
+                if chunk is not None:
+                    stats.rows += len(chunk)
+            if chunk is None:
+                return
+            yield chunk
+
+    def results(self) -> List[StageTiming]:
+        return [
+            StageTiming(
+                stage=name,
+                wall_ms=s.wall_s * 1000.0,
+                calls=s.calls,
+                rows=s.rows,
+                insights=s.insights,
+                peak_alloc_kb=None if s.peak_bytes is None else s.peak_bytes / 1024.0,
+            )
+            for name, s in self._stages.items()
+        ]
@@ -1,36 +1,123 @@
 from __future__ import annotations
-from typing import List
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from functools import lru_cache
+import hashlib
+import json
 import os
 
-try:
+from .lru import LRUCache
+from .models import Insight
+
+if TYPE_CHECKING:  # pragma: no cover
     from openai import OpenAI
-except Exception:  # pragma: no cover
-    OpenAI = None  # type: ignore
 
-from .models import Insight
+DEFAULT_TIMEOUT_S = 10.0
+
+
+# Content-addressed: keyed by a hash of model, temperature and the prompt's bullet lines
+summary_cache: LRUCache[str, str] = LRUCache(
+    maxsize=int(os.getenv("INSIGHT_LLM_CACHE_SIZE", "512")),
+    ttl_seconds=float(os.getenv("INSIGHT_LLM_CACHE_TTL", "3600")),
+)
+
+_client: Optional["OpenAI"] = None
+
 
+def get_client() -> "OpenAI":
+    # One client per process so HTTP connections are pooled across analyses;
+    # OPENAI_BASE_URL points it at a stub server in tests.
+    global _client
+    if _client is None:
+        _client = _openai().OpenAI(max_retries=0)
+    return _client
 
-def summarize_insights(insights: List[Insight], model: str = "gpt-4o-mini", temperature: float = 0.2) -> str:
-    if not insights:
+
+def summarize_insights(
+    insights: List[Insight],
+    model: str = "gpt-4o-mini",
+    temperature: float = 0.2,
+    action_counts: Optional[Dict[str, int]] = None,
+    timeout: float = DEFAULT_TIMEOUT_S,
+) -> str:
+    action_counts = _count_actions(insights, action_counts)
+    if not _llm_available() or (not insights and not action_counts):
+        return basic_summary(insights, action_counts)
+
+    bullet_lines = _bullet_lines(insights)
+    key = _cache_key(model, temperature, bullet_lines)
+    cached = summary_cache.get(key)
+    if cached is not None:
+        return cached
+    try:
+        resp = get_client().chat.completions.create(
+            model=model,
+            temperature=temperature,
+            messages=[{"role": "user", "content": _prompt(bullet_lines)}],
+            timeout=timeout,
+        )
+    except Exception:
+        # Timeouts and API errors degrade to the deterministic summary
+        return _fallback(action_counts)
+    return _remember(key, resp.choices[0].message.content)
+
+
+def basic_summary(insights: List[Insight], action_counts: Optional[Dict[str, int]] = None) -> str:
+    # Deterministic summary, used when the LLM is disabled, unavailable or fails
+    action_counts = _count_actions(insights, action_counts)
+    if not insights and not action_counts:
         return "No significant insights."
+    return _fallback(action_counts)
+
+
+def _llm_available() -> bool:
+    # The key is checked first so openai is never imported when it could not be used
+    return os.getenv("OPENAI_API_KEY") is not None and _openai() is not None
+
 
-    if OpenAI is None or os.getenv("OPENAI_API_KEY") is None:
-        # Deterministic fallback
-        actions = {}
-        for i in insights:
-            actions[i.action] = actions.get(i.action, 0) + 1
-        parts = [f"{len(insights)} insights."] + [f"{k}: {v}" for k, v in actions.items()]
-        return " ".join(parts)
-
-    client = OpenAI()
-    bullet_lines = [f"- [{i.action.upper()}] {i.title}: {i.rationale}" for i in insights[:50]]
-    prompt = (
-        "Summarize these marketing insights into 2-3 concise sentences, focusing on actions and risk.\n" 
+@lru_cache(maxsize=None)
+def _openai() -> Any:
+    # Imported on first use: the SDK alone costs most of a cold start
+    try:
+        import openai
+    except Exception:  # pragma: no cover
+        return None
+    return openai
+
+
+def _count_actions(insights: List[Insight], action_counts: Optional[Dict[str, int]]) -> Dict[str, int]:
+    # action_counts covers insights that were counted but not retained (bounded collection)
+    if action_counts is not None:
+        return action_counts
+    counts: Dict[str, int] = {}
+    for i in insights:
+        counts[i.action] = counts.get(i.action, 0) + 1
+    return counts
+
+
+def _fallback(action_counts: Dict[str, int]) -> str:
+    # Deterministic fallback
+    parts = [f"{sum(action_counts.values())} insights."] + [f"{k}: {v}" for k, v in action_counts.items()]
+    return " ".join(parts)
+
+
+def _bullet_lines(insights: List[Insight]) -> List[str]:
+    return [f"- [{i.action.upper()}] {i.title}: {i.rationale}" for i in insights[:50]]
+
+
+def _prompt(bullet_lines: List[str]) -> str:
+    return (
+        "Summarize these marketing insights into 2-3 concise sentences, focusing on actions and risk.\n"
         + "\n".join(bullet_lines)
     )
-    resp = client.chat.completions.create(
-        model=model,
-        temperature=temperature,
-        messages=[{"role": "user", "content": prompt}],
-    )
-    return resp.choices[0].message.content or "Summary unavailable"
+
+
+def _cache_key(model: str, temperature: float, bullet_lines: List[str]) -> str:
+    payload = json.dumps([model, temperature, bullet_lines], separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _remember(key: str, content: Optional[str]) -> str:
+    if not content:
+        return "Summary unavailable"
+    summary_cache.put(key, content)
+    return content
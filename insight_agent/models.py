@@ -3,6 +3,9 @@ from typing import Dict, List, Optional, Literal, Any
 from pydantic import BaseModel, Field, ConfigDict
 
 InsightAction = Literal["pause", "fix", "test", "keep"]
+InsightSeverity = Literal["low", "medium", "high"]
+InsightScope = Literal["ad", "ad_set", "campaign", "account"]
+RollupLevel = Literal["ad_set", "campaign", "account"]
 
 
 class ColumnSpec(BaseModel):
@@ -44,25 +47,62 @@ class RowMetrics(BaseModel):
     ctr_7d: Optional[float] = None
     ctr_prev7: Optional[float] = None
     ctr_drop_vs_prev7: Optional[float] = None
+    frequency_trend: Optional[float] = Field(None, description="Frequency last 7 days minus the 7 before")
+    ctr_decay_pct: Optional[float] = Field(None, description="CTR lost per day over the last 14 days, % of its mean")
 
 
 class Insight(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str
-    scope: Literal["ad", "ad_set", "campaign", "account"]
+    scope: InsightScope
     keys: Dict[str, Any] = Field(default_factory=dict)
     action: InsightAction
     title: str
     rationale: str
     recommendations: List[str] = Field(default_factory=list)
-    severity: Literal["low", "medium", "high"] = "medium"
+    severity: InsightSeverity = "medium"
+
+
+class StageTiming(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    stage: str = Field(..., description="parse, map, convert, an agent name or summarize")
+    wall_ms: float
+    calls: int = 1
+    rows: int = 0
+    insights: int = 0
+    peak_alloc_kb: Optional[float] = Field(None, description="Peak traced allocation (trace_memory only)")
+
+
+class CompactInsights(BaseModel):
+    # One positional row per insight (see `fields`); recommendation lists are sent once
+    # in `recommendations` and referenced from each row by id
+    model_config = ConfigDict(extra="ignore")
+    fields: List[str]
+    recommendations: Dict[str, List[str]] = Field(default_factory=dict)
+    rows: List[List[Any]] = Field(default_factory=list)
 
 
 class AnalysisResult(BaseModel):
     model_config = ConfigDict(extra="ignore")
     column_mapping: ColumnMapping
     insights: List[Insight]
+    compact: Optional[CompactInsights] = Field(None, description="Set instead of `insights` when config.compact")
     summary: Optional[str] = None
+    totals: Dict[str, float] = Field(
+        default_factory=dict,
+        description="Running sums over all processed rows (rows, spend, impressions, ...); daily exports "
+        "also report undated_rows, rows left out of the fatigue windows",
+    )
+    timings: Optional[List[StageTiming]] = None
+
+
+class DeltaResult(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    column_mapping: ColumnMapping
+    ads_updated: int = 0
+    added: List[Insight] = Field(default_factory=list)
+    changed: List[Insight] = Field(default_factory=list)
+    resolved: List[Insight] = Field(default_factory=list, description="Insights that no longer apply")
 
 
 class AnalysisConfig(BaseModel):
@@ -70,12 +110,35 @@ class AnalysisConfig(BaseModel):
     llm_enabled: bool = False
     openai_model: str = "gpt-4o-mini"
     temperature: float = 0.2
+    llm_timeout_s: float = Field(10.0, gt=0, description="Summary falls back to the deterministic text past this")
     max_insights: int = 100
+    chunk_rows: int = Field(50_000, gt=0, description="Rows per chunk fed through the agents")
+    timings: bool = Field(False, description="Return per-stage timings with the result")
+    trace_memory: bool = Field(False, description="Also record peak allocations per stage (slow)")
+    workers: int = Field(
+        1,
+        ge=1,
+        le=64,
+        description="Threads evaluating agent rules over row shards (1 = serial); at most INSIGHT_SHARD_THREADS",
+    )
+    shard_rows: int = Field(25_000, ge=1_000, description="Rows per shard; chunks no larger than this run serially")
+    compact: bool = Field(False, description="Return insights as CompactInsights rows")
+    rollups: List[RollupLevel] = Field(
+        default_factory=list,
+        description="Also aggregate rows to these levels and run the agents on each (ad_set, campaign, account)",
+    )
     # thresholds
     ctr_healthy_pct: float = 1.0
     atc_to_purchase_min_pct: float = 20.0
     frequency_fatigue_threshold: float = 3.0
     ctr_drop_warn_pct: float = 20.0
+    ctr_decay_warn_pct: float = Field(3.0, description="Daily rows only: CTR decay (%/day) that counts as fatigue")
+    peer_outliers: bool = Field(
+        False,
+        description="Also flag ads that are outliers against their ad set/campaign/account (not run on deltas)",
+    )
+    peer_z_threshold: float = Field(3.5, gt=0, description="Robust z-score (median/MAD) that makes an ad an outlier")
+    peer_min_peers: int = Field(10, ge=3, description="Fewest ads a peer group needs before ads are compared in it")
 
 
 class AnalyzeRequest(BaseModel):
@@ -92,3 +155,41 @@ class AnalyzeResponse(BaseModel):
     ok: bool
     result: Optional[AnalysisResult] = None
     error: Optional[str] = None
+
+
+class BatchItem(AnalyzeRequest):
+    id: Optional[str] = Field(None, description="Caller's reference for the item, e.g. an account id")
+
+
+class AnalyzeBatchRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    items: List[BatchItem]
+    config: Optional[AnalysisConfig] = Field(None, description="Used for items without their own config")
+
+
+class BatchItemResult(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: Optional[str] = None
+    ok: bool
+    result: Optional[AnalysisResult] = None
+    error: Optional[str] = None
+
+
+class BatchStats(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    items: int = 0
+    failed: int = 0
+    cached: int = Field(0, description="Items answered from the result cache")
+    header_shapes: int = Field(0, description="Distinct headers; each is mapped once per worker")
+    rows: int = Field(0, description="Rows analyzed (cached items excluded)")
+    elapsed_s: float = 0.0
+    items_per_s: float = 0.0
+    rows_per_s: float = 0.0
+
+
+class AnalyzeBatchResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    ok: bool
+    results: List[BatchItemResult] = Field(default_factory=list, description="In request order")
+    stats: Optional[BatchStats] = None
+    error: Optional[str] = None
@@ -0,0 +1,172 @@
+from __future__ import annotations
+from typing import ContextManager, Dict, Optional, Tuple
+from collections import OrderedDict
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from pydantic_core import to_json
+
+from .models import AnalysisConfig, AnalyzeRequest
+from .sqlite_store import connect, create, transaction
+
+# Bumped whenever the same input and config would produce a different result
+RESULT_FORMAT = "1"
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, body BLOB NOT NULL, size INTEGER NOT NULL, "
+    "expires REAL NOT NULL, used REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS results_used ON results (used)",
+)
+
+
+def request_key(req: AnalyzeRequest, default: Optional[AnalysisConfig] = None) -> str:
+    # Content address of an analysis: the input as the engine reads it (the CSV text, else
+    # columns + rows) and the effective config
+    digest = hashlib.sha256(RESULT_FORMAT.encode())
+    cfg = req.config or default or AnalysisConfig()
+    digest.update(cfg.model_dump_json().encode())
+    if req.csv:
+        digest.update(b"csv\0" + req.csv.encode("utf-8"))
+    else:
+        digest.update(b"rows\0" + to_json([req.columns or [], req.rows or []], fallback=str))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    # Serialized results by request_key: an in-memory LRU bounded by total bytes, backed by
+    # an optional SQLite tier (`directory`) that survives restarts and is shared by every
+    # process pointing at it. Entries expire ttl_seconds after they were stored.
+    def __init__(
+        self,
+        max_bytes: int = 64 << 20,
+        ttl_seconds: float = 600.0,
+        directory: Optional[str] = None,
+        max_disk_bytes: int = 1 << 30,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_bytes = max_disk_bytes
+        self.path = os.path.join(directory, "results.sqlite3") if directory else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ResultCache":
+        # INSIGHT_RESULT_CACHE_MB=0 turns the memory tier off; the disk tier is opt-in
+        return cls(
+            max_bytes=int(float(os.getenv("INSIGHT_RESULT_CACHE_MB", "64")) * (1 << 20)),
+            ttl_seconds=float(os.getenv("INSIGHT_RESULT_CACHE_TTL", "600")),
+            directory=os.getenv("INSIGHT_RESULT_CACHE_DIR") or None,
+            max_disk_bytes=int(float(os.getenv("INSIGHT_RESULT_CACHE_DISK_MB", "1024")) * (1 << 20)),
+        )
+
+    def open(self) -> None:
+        if self.path is None:
+            return
+        create(self.path, _SCHEMA)
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        body = self._disk_get(key, now) if self.path else None
+        with self._lock:
+            if body is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        return body
+
+    def put(self, key: str, body: bytes) -> None:
+        expires = time.time() + self.ttl_seconds
+        self._remember(key, expires, body)
+        if self.path:
+            self._disk_put(key, expires, body)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.disk_hits = self.misses = 0
+        if self.path:
+            with self._connect() as db:
+                db.execute("DELETE FROM results")
+
+    def info(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _remember(self, key: str, expires: float, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (expires, body)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def _disk_get(self, key: str, now: float) -> Optional[bytes]:
+        with self._connect() as db:
+            row = db.execute("SELECT body, expires FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                db.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            db.execute("UPDATE results SET used = ? WHERE key = ?", (now, key))
+        body = bytes(row[0])
+        # Promoted so repeat hits stay in memory
+        self._remember(key, row[1], body)
+        return body
+
+    def _disk_put(self, key: str, expires: float, body: bytes) -> None:
+        now = time.time()
+        assert self.path is not None
+        with transaction(self.path) as db:
+            db.execute(
+                "INSERT OR REPLACE INTO results (key, body, size, expires, used) VALUES (?, ?, ?, ?, ?)",
+                (key, body, len(body), expires, now),
+            )
+            db.execute("DELETE FROM results WHERE expires < ?", (now,))
+            # Least recently used entries go first once the tier is over its size bound
+            excess = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0] - self.max_disk_bytes
+            if excess > 0:
+                stale = []
+                for stale_key, size in db.execute("SELECT key, size FROM results ORDER BY used"):
+                    stale.append((stale_key,))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                db.executemany("DELETE FROM results WHERE key = ?", stale)
+
+    def _connect(self) -> ContextManager[sqlite3.Connection]:
+        assert self.path is not None
+        return connect(self.path)
@@ -0,0 +1,169 @@
+from __future__ import annotations
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .frame import ID_KEYS, NUMERIC_KEYS, IdColumn, MetricsFrame
+
+ROLLUP_LEVELS = ("ad_set", "campaign", "account")
+# Group keys per level; rows without the level's own (last) key are left out of it
+LEVEL_KEYS: Dict[str, Tuple[str, ...]] = {
+    "ad_set": ("campaign", "ad_set"),
+    "campaign": ("campaign",),
+    "account": (),
+}
+
+SUM_KEYS = ("spend", "impressions", "clicks", "purchases", "purchase_value", "adds_to_cart")
+# metric -> (weight, exact numerator, scale): roas is sum(purchase_value) / sum(spend) and
+# atc% is sum(purchases) / sum(adds_to_cart) wherever those are known; the rest are weighted means.
+WEIGHTED: Dict[str, Tuple[str, Optional[str], float]] = {
+    "ctr": ("spend", None, 1.0),
+    "roas": ("spend", "purchase_value", 1.0),
+    "atc_to_purchase_pct": ("adds_to_cart", "purchases", 100.0),
+    "frequency": ("impressions", None, 1.0),
+    "ctr_7d": ("spend", None, 1.0),
+    "ctr_prev7": ("spend", None, 1.0),
+    "ctr_drop_vs_prev7": ("spend", None, 1.0),
+}
+# Per group: row count, (sum, count) for each SUM_KEY, then (weighted sum, weight, sum, count)
+# per WEIGHTED key. Every column is additive, so partial sums can be merged or subtracted.
+STATS_WIDTH = 1 + 2 * len(SUM_KEYS) + 4 * len(WEIGHTED)
+
+Group = Tuple[Optional[str], ...]
+
+
+class RollupAccumulator:
+    # Single-pass grouped aggregation: each chunk is reduced to per-group sums with
+    # hash-based groupby, and only those partial sums are kept between chunks.
+    def __init__(self, levels: Sequence[str]) -> None:
+        self.levels = [level for level in ROLLUP_LEVELS if level in levels]
+        self._index: Dict[str, Dict[Group, int]] = {level: {} for level in self.levels}
+        self._stats: Dict[str, np.ndarray] = {level: np.zeros((0, STATS_WIDTH)) for level in self.levels}
+        self.touched: Dict[str, Set[Group]] = {level: set() for level in self.levels}
+
+    def add(self, frame: MetricsFrame, sign: float = 1.0) -> None:
+        # sign=-1 retracts rows added earlier (incremental updates replace an ad's old row)
+        if not self.levels or not len(frame):
+            return
+        parts = contributions(frame)
+        for level in self.levels:
+            codes, groups = _group(frame, LEVEL_KEYS[level])
+            keep = codes >= 0
+            sums = np.stack(
+                [np.bincount(codes[keep], weights=p[keep], minlength=len(groups)) for p in parts], axis=1
+            )
+            self._merge(level, groups, sign * sums)
+            self.touched[level].update(groups)
+
+    def load(self, level: str, groups: Sequence[Group], stats: np.ndarray) -> None:
+        # Seeds previously persisted partial sums without marking them touched
+        self._merge(level, groups, stats)
+
+    def groups(self, level: str, touched_only: bool = False) -> Iterator[Tuple[Group, np.ndarray]]:
+        stats = self._stats[level]
+        for group, slot in self._index[level].items():
+            if not touched_only or group in self.touched[level]:
+                yield group, stats[slot]
+
+    def frames(self, touched_only: bool = False) -> List[MetricsFrame]:
+        frames = []
+        for level in self.levels:
+            live = [(g, s) for g, s in self.groups(level, touched_only) if s[0] > 0.5]
+            if live:
+                frames.append(_frame(level, [g for g, _ in live], np.stack([s for _, s in live])))
+        return frames
+
+    def _merge(self, level: str, groups: Sequence[Group], sums: np.ndarray) -> None:
+        index = self._index[level]
+        slots = [index.setdefault(g, len(index)) for g in groups]
+        stats = self._stats[level]
+        if len(index) > len(stats):
+            stats = np.vstack([stats, np.zeros((len(index) - len(stats), STATS_WIDTH))])
+        stats[slots] += sums
+        self._stats[level] = stats
+
+
+def group_keys(frame: MetricsFrame, level: str) -> List[Group]:
+    return _group(frame, LEVEL_KEYS[level])[1]
+
+
+def group_codes(frame: MetricsFrame, level: str) -> np.ndarray:
+    # Group index per row at `level`, -1 for rows outside every group
+    return _group(frame, LEVEL_KEYS[level])[0]
+
+
+def _frame(level: str, groups: List[Group], stats: np.ndarray) -> MetricsFrame:
+    keys = LEVEL_KEYS[level]
+    n = len(groups)
+    ids = {k: IdColumn.missing(n) for k in ID_KEYS}
+    for j, key in enumerate(keys):
+        ids[key] = IdColumn.encode([g[j] for g in groups])
+    return MetricsFrame(ids, stats_values(stats), n, scope=level)
+
+
+def stats_values(stats: np.ndarray) -> Dict[str, np.ndarray]:
+    # Metric columns for rows of merged partial sums (see contributions)
+    n = len(stats)
+    stats = stats[:, 1:].T
+    values: Dict[str, np.ndarray] = {k: np.full(n, np.nan) for k in NUMERIC_KEYS}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for j, key in enumerate(SUM_KEYS):
+            total, count = stats[2 * j], stats[2 * j + 1]
+            values[key] = np.where(count > 0.5, total, np.nan)
+        base = 2 * len(SUM_KEYS)
+        for j, key in enumerate(WEIGHTED):
+            wsum, weight, total, count = stats[base + 4 * j : base + 4 * j + 4]
+            # Fall back to the plain mean for groups with no usable weight; the epsilon
+            # absorbs rounding left behind when retracted rows cancel a weight out
+            mean = np.where(count > 0.5, total / count, np.nan)
+            values[key] = np.where(weight > 1e-9, wsum / weight, mean)
+
+        clicks, impressions = values["clicks"], values["impressions"]
+        fill = np.isnan(values["ctr"]) & (impressions > 0)
+        values["ctr"] = np.where(fill, clicks / impressions * 100.0, values["ctr"])
+        # The drop is recomputed from the aggregated windows rather than averaged
+        now, prev = values["ctr_7d"], values["ctr_prev7"]
+        drop = np.maximum(0.0, (prev - now) / prev * 100.0)
+        values["ctr_drop_vs_prev7"] = np.where(
+            ~np.isnan(now) & (prev > 0), drop, values["ctr_drop_vs_prev7"]
+        )
+    return values
+
+
+def contributions(frame: MetricsFrame) -> List[np.ndarray]:
+    # Per row, the STATS_WIDTH additive columns; summing them per group gives its stats
+    parts: List[np.ndarray] = [np.ones(len(frame))]
+    for key in SUM_KEYS:
+        present = frame.valid(key)
+        parts += [np.where(present, frame[key], 0.0), present.astype(np.float64)]
+    for key, (weight_key, exact_key, scale) in WEIGHTED.items():
+        value = frame[key]
+        present = ~np.isnan(value)
+        weight = np.where(present & (frame[weight_key] > 0), frame[weight_key], 0.0)
+        weighted = np.where(weight > 0, value * weight, 0.0)
+        if exact_key is not None:
+            exact = frame[exact_key]
+            weighted = np.where((weight > 0) & ~np.isnan(exact), exact * scale, weighted)
+        parts += [weighted, weight, np.where(present, value, 0.0), present.astype(np.float64)]
+    return parts
+
+
+def _group(frame: MetricsFrame, keys: Tuple[str, ...]) -> Tuple[np.ndarray, List[Group]]:
+    # Group code per row (-1 = excluded) and the key tuple for each code
+    import pandas as pd
+
+    codes = np.zeros(len(frame), dtype=np.int64)
+    groups: List[Group] = [()]
+    for key in keys:
+        column = frame.ids[key]
+        # Identifiers are already codes; missing ids (-1) become a group of their own (0)
+        key_codes = column.codes.astype(np.int64) + 1
+        width = len(column.table) + 1
+        codes, combined = pd.factorize(codes * width + key_codes)
+        labels = [None] + column.table.tolist()
+        groups = [groups[c // width] + (labels[c % width],) for c in combined.tolist()]
+    if keys:
+        kept = np.asarray([g[-1] is not None for g in groups], dtype=bool)
+        codes = np.where(kept, np.cumsum(kept) - 1, -1)[codes]
+        groups = [g for g, k in zip(groups, kept.tolist()) if k]
+    return codes, groups
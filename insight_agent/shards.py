@@ -0,0 +1,57 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+
+from .agents.base import BaseAgent, Rule
+from .frame import MetricsFrame
+
+# (first row of the shard, shard frame, the agent's rules evaluated on that shard)
+ShardRules = List[Tuple[int, MetricsFrame, List[Rule]]]
+
+# Threads in the process-wide shard pool. A request's `workers` only bounds how many of
+# them it occupies, so requests cannot grow the pool.
+SHARD_THREADS = max(1, int(os.getenv("INSIGHT_SHARD_THREADS", str(os.cpu_count() or 1))))
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def evaluate_rules(
+    agents: Sequence[BaseAgent], frame: MetricsFrame, shard_rows: int, workers: int
+) -> Dict[str, ShardRules]:
+    # Agents are row-local, so each (agent, row range) pair is independent. Masks are
+    # NumPy work that releases the GIL, which makes threads enough; results come back
+    # in shard order so the collector sees the same sequence as a serial run.
+    starts = range(0, len(frame), shard_rows)
+    workers = min(workers, SHARD_THREADS)
+    if workers <= 1 or len(starts) <= 1:
+        return {a.name: [(0, frame, a.rules(frame))] for a in agents}
+
+    shards = [(start, frame.window(start, start + shard_rows)) for start in starts]
+    tasks = [(a, start, shard) for a in agents for start, shard in shards]
+    # At most `workers` tasks per call, each working through its share in order
+    parts = [tasks[i::workers] for i in range(workers)]
+    futures = [_executor().submit(_run, part) for part in parts]
+    results: List[List[Rule]] = [[] for _ in tasks]
+    for i, future in enumerate(futures):
+        results[i::workers] = future.result()
+
+    out: Dict[str, ShardRules] = {a.name: [] for a in agents}
+    for (agent, start, shard), rules in zip(tasks, results):
+        out[agent.name].append((start, shard, rules))
+    return out
+
+
+def _run(tasks: List[Tuple[BaseAgent, int, MetricsFrame]]) -> List[List[Rule]]:
+    return [agent.rules(shard) for agent, _, shard in tasks]
+
+
+def _executor() -> ThreadPoolExecutor:
+    # Created on first use and kept for the life of the process
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=SHARD_THREADS, thread_name_prefix="insight-shard")
+        return _pool
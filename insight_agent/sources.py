@@ -0,0 +1,61 @@
+from __future__ import annotations
+from typing import IO, Any, Iterable, Iterator, List, Union
+from contextlib import contextmanager
+import codecs
+import io
+import itertools
+import os
+import re
+
+# Kept here rather than in .arrow so callers can match them without importing pyarrow
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+ARROW_FILE_MEDIA_TYPE = "application/vnd.apache.arrow.file"
+
+StreamSource = Union[str, "os.PathLike[str]", IO[str], IO[bytes], Iterable[bytes]]
+
+# Splits after "\n", "\r\n" or a lone "\r" only, the line ends csv.reader knows; str.splitlines
+# would also break inside ad names on "\x0c", "\x1c", "\u2028" and the like
+_LINE_END = re.compile(r"(?<=\n)|(?<=\r)(?!\n)")
+
+
+@contextmanager
+def open_text_stream(source: StreamSource, encoding: str = "utf-8-sig") -> Iterator[Iterable[str]]:
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "r", encoding=encoding, newline="") as f:
+            yield f
+    elif isinstance(source, io.TextIOBase):
+        yield source
+    elif hasattr(source, "read"):
+        probe = source.read(0)
+        if isinstance(probe, str):
+            yield source  # type: ignore[misc]
+        else:
+            yield io.TextIOWrapper(source, encoding=encoding, newline="")  # type: ignore[arg-type]
+    else:
+        yield _decode_lines(source, encoding)  # type: ignore[arg-type]
+
+
+def _decode_lines(chunks: Iterable[bytes], encoding: str) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = _LINE_END.split(pending)
+        # Hold back the trailing fragment, and a final "\r" that may precede "\n"
+        pending = lines.pop()
+        if not pending and lines and lines[-1].endswith("\r"):
+            pending = lines.pop()
+        yield from lines
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def iter_chunks(rows: Iterable[List[Any]], size: int) -> Iterator[List[List[Any]]]:
+    it = iter(rows)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
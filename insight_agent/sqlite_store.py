@@ -0,0 +1,41 @@
+from __future__ import annotations
+from typing import Iterator, Sequence
+from contextlib import contextmanager
+import os
+import sqlite3
+
+
+def create(path: str, schema: Sequence[str]) -> None:
+    # Creates the file (and its directory) and any missing tables. WAL lets readers in
+    # other processes run alongside the single writer.
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with connect(path) as db:
+        db.execute("PRAGMA journal_mode=WAL")
+        for statement in schema:
+            db.execute(statement)
+
+
+@contextmanager
+def connect(path: str) -> Iterator[sqlite3.Connection]:
+    # One short-lived connection per operation, so stores can be shared across threads and
+    # processes. Autocommit: callers that need a transaction use transaction() below.
+    db = sqlite3.connect(path, timeout=30.0, isolation_level=None)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@contextmanager
+def transaction(path: str) -> Iterator[sqlite3.Connection]:
+    # BEGIN IMMEDIATE takes the write lock before the first read, so a read-modify-write
+    # cannot interleave with another writer (which waits up to the connect timeout). Rolled
+    # back if the body raises.
+    with connect(path) as db:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
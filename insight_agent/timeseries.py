@@ -0,0 +1,189 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from .frame import DATE_KEY, ID_KEYS, IdColumn, MetricsFrame
+from .rollup import STATS_WIDTH, contributions, stats_values
+
+WINDOW_DAYS = 7
+# The recent window plus the one it is compared with
+SPAN = 2 * WINDOW_DAYS
+# Days with impressions needed before a CTR decay slope is reported
+MIN_SLOPE_DAYS = 7
+
+
+class DailyWindows:
+    # Collapses daily per-ad rows into one row per ad. An ad is its ad_id, else its ad_name
+    # within its campaign and ad set. Totals and weighted means cover the whole export, as
+    # the roll-ups compute them. The fatigue metrics compare the export's last 7 days with
+    # the 7 before, so between chunks only rows inside the last 14 days seen so far are kept.
+    def __init__(self) -> None:
+        self.last_day = -np.inf
+        # Whether some ad has rows on more than one day, i.e. the export is a daily breakdown
+        # rather than one row per ad with a report date
+        self.several_days = False
+        self._first_day = np.zeros(0)
+        self._keys: List[Any] = []
+        # Known keys as a sorted string array with each one's ad index, for vectorized lookup
+        self._sorted = np.asarray([], dtype=str)
+        self._sorted_slots = np.zeros(0, dtype=np.int64)
+        self._ids: Dict[str, List[Any]] = {k: [] for k in ID_KEYS}
+        # Transposed (STATS_WIDTH x ads) so each stat accumulates contiguously
+        self._stats = np.zeros((STATS_WIDTH, 0))
+        # Per chunk: (ad, day, impressions, clicks, frequency) of rows inside the span
+        self._recent: List[Tuple[np.ndarray, ...]] = []
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, frame: MetricsFrame) -> np.ndarray:
+        # Returns the rows left out: those with neither an ad_id nor an ad_name
+        ad = self._codes(frame)
+        keep = ad >= 0
+        n = len(self._keys)
+        if self._stats.shape[1] < n:
+            grown = np.zeros((STATS_WIDTH, max(n, 2 * self._stats.shape[1])))
+            grown[:, : self._stats.shape[1]] = self._stats
+            self._stats = grown
+            blank = np.full(grown.shape[1] - len(self._first_day), np.nan)
+            self._first_day = np.append(self._first_day, blank)
+        for stats, part in zip(self._stats, contributions(frame)):
+            stats[:n] += np.bincount(ad[keep], weights=part[keep], minlength=n)
+
+        day = frame[DATE_KEY]
+        dated = keep & ~np.isnan(day)
+        if not dated.any():
+            return np.flatnonzero(~keep)
+        if not self.several_days:
+            # Each ad's first day; any row on another day settles it
+            first = self._first_day
+            unseen = np.isnan(first[ad[dated]])
+            first[ad[dated][unseen]] = day[dated][unseen]
+            self.several_days = bool((first[ad[dated]] != day[dated]).any())
+        self.last_day = max(self.last_day, float(day[dated].max()))
+        cutoff = self.last_day - (SPAN - 1)
+        rows = dated & (day >= cutoff)
+        impressions, clicks, ctr = frame["impressions"], frame["clicks"], frame["ctr"]
+        # Exports with a CTR column but no clicks still give a click count per day
+        clicks = np.where(np.isnan(clicks), ctr * impressions / 100.0, clicks)
+        self._recent.append(
+            (ad[rows], day[rows], impressions[rows], clicks[rows], frame["frequency"][rows])
+        )
+        self._recent = [_since(part, cutoff) for part in self._recent]
+        return np.flatnonzero(~keep)
+
+    def frame(self) -> MetricsFrame:
+        n = len(self._keys)
+        ids = {k: IdColumn.encode(v) for k, v in self._ids.items()}
+        values = stats_values(self._stats[:, :n].T)
+        if self._recent and n:
+            windowed = self._windows(n)
+            for key, computed in windowed.items():
+                values[key] = np.where(np.isnan(computed), values[key], computed)
+        return MetricsFrame(ids, values, n)
+
+    def _windows(self, n: int) -> Dict[str, np.ndarray]:
+        ad, day, impressions, clicks, frequency = (np.concatenate(c) for c in zip(*self._recent))
+        # One cell per ad and day, column 0 being the export's last day; duplicate rows for a
+        # day (e.g. per placement) add up
+        cell = ad * SPAN + (self.last_day - day).astype(np.int64)
+        seen = impressions > 0
+        ctr_ok = seen & ~np.isnan(clicks)
+        freq_ok = seen & ~np.isnan(frequency)
+
+        def cells(weights: np.ndarray, mask: np.ndarray) -> np.ndarray:
+            return np.bincount(cell[mask], weights=weights[mask], minlength=n * SPAN).reshape(n, SPAN)
+
+        shown = cells(impressions, ctr_ok)
+        clicked = cells(clicks, ctr_ok)
+        freq_weight = cells(impressions, freq_ok)
+        freq_sum = cells(frequency * impressions, freq_ok)
+
+        recent, prior = slice(0, WINDOW_DAYS), slice(WINDOW_DAYS, SPAN)
+        with np.errstate(divide="ignore", invalid="ignore"):
+
+            def ratio(num: np.ndarray, den: np.ndarray, window: slice, scale: float = 1.0) -> np.ndarray:
+                total = den[:, window].sum(axis=1)
+                return np.where(total > 0, num[:, window].sum(axis=1) / total * scale, np.nan)
+
+            ctr_7d = ratio(clicked, shown, recent, 100.0)
+            ctr_prev7 = ratio(clicked, shown, prior, 100.0)
+            drop = np.where(
+                ~np.isnan(ctr_7d) & (ctr_prev7 > 0), np.maximum(0.0, (ctr_prev7 - ctr_7d) / ctr_prev7 * 100.0), np.nan
+            )
+            freq_7d = ratio(freq_sum, freq_weight, recent)
+            freq_prev7 = ratio(freq_sum, freq_weight, prior)
+
+            # Least-squares slope of daily CTR over the span, in CTR points per day, as a
+            # share of the ad's mean daily CTR
+            observed = shown > 0
+            daily = np.where(observed, clicked / shown * 100.0, 0.0)
+            t = np.where(observed, np.arange(SPAN - 1, -1, -1, dtype=np.float64), 0.0)
+            k = observed.sum(axis=1)
+            sx, sy = t.sum(axis=1), daily.sum(axis=1)
+            sxx, sxy = (t * t).sum(axis=1), (t * daily).sum(axis=1)
+            slope = (k * sxy - sx * sy) / (k * sxx - sx * sx)
+            mean = sy / k
+            decay = np.where((k >= MIN_SLOPE_DAYS) & (mean > 0), -slope / mean * 100.0, np.nan)
+
+        return {
+            "ctr_7d": ctr_7d,
+            "ctr_prev7": ctr_prev7,
+            "ctr_drop_vs_prev7": drop,
+            "frequency": freq_7d,
+            "frequency_trend": freq_7d - freq_prev7,
+            "ctr_decay_pct": decay,
+        }
+
+    def _codes(self, frame: MetricsFrame) -> np.ndarray:
+        # Stable ad index per row, -1 for rows with neither an ad_id nor an ad_name
+        import pandas as pd
+
+        ids = frame.ids
+        key = np.full(len(frame), -1, dtype=np.int64)
+        by_id = ids["ad_id"].codes >= 0
+        key[by_id], used = pd.factorize(ids["ad_id"].codes[by_id])
+        names: List[str] = ids["ad_id"].table[used].tolist()
+        # Ad names repeat across campaigns and ad sets, so without an id the three together
+        # name an ad
+        by_name = np.flatnonzero(~by_id & (ids["ad_name"].codes >= 0))
+        if len(by_name):
+            combo = np.zeros(len(by_name), dtype=np.int64)
+            for k in ("campaign", "ad_set", "ad_name"):
+                column = ids[k]
+                combo, _ = pd.factorize(combo * (len(column.table) + 1) + column.codes[by_name] + 1)
+            _, first = np.unique(combo, return_index=True)
+            rows = by_name[first]
+            key[by_name] = len(names) + combo
+            parts = zip(*(ids[k][rows].tolist() for k in ("campaign", "ad_set", "ad_name")))
+            # Unit separators keep these apart from any ad_id
+            names += ["\x1f".join(p or "" for p in part) for part in parts]
+        names_array = np.asarray(names, dtype=str)
+
+        slots = np.full(len(names) + 1, -1, dtype=np.int64)
+        if len(self._sorted):
+            pos = np.minimum(np.searchsorted(self._sorted, names_array), len(self._sorted) - 1)
+            slots[:-1] = np.where(self._sorted[pos] == names_array, self._sorted_slots[pos], -1)
+        new = np.flatnonzero(slots[:-1] < 0)
+        if len(new):
+            # First row of each new ad supplies its identifiers
+            _, first = np.unique(key, return_index=True)
+            first = first[-len(names) :]
+            slots[new] = np.arange(len(self._keys), len(self._keys) + len(new))
+            self._keys += names_array[new].tolist()
+            for k in ID_KEYS:
+                self._ids[k] += ids[k][first[new]].tolist()
+            known = np.concatenate([self._sorted, names_array[new]])
+            order = np.argsort(known, kind="stable")
+            self._sorted = known[order]
+            self._sorted_slots = np.concatenate([self._sorted_slots, slots[new]])[order]
+        return slots[key]
+
+
+def _since(part: Tuple[np.ndarray, ...], cutoff: float) -> Tuple[np.ndarray, ...]:
+    day = part[1]
+    if not len(day) or day.min() >= cutoff:
+        return part
+    keep = day >= cutoff
+    return tuple(a[keep] for a in part)
@@ -1,22 +1,407 @@
 from __future__ import annotations
-from fastapi import FastAPI, Body
-from fastapi.responses import JSONResponse
-from insight_agent.engine import InsightEngine
-from insight_agent.models import AnalyzeRequest, AnalyzeResponse
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+import asyncio
+import json
+import time
+from fastapi import FastAPI, Body, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from insight_agent.sources import ARROW_STREAM_MEDIA_TYPE
+from insight_agent.models import (
+    AnalysisConfig,
+    AnalyzeBatchRequest,
+    AnalyzeBatchResponse,
+    AnalyzeRequest,
+    AnalyzeResponse,
+    BatchItem,
+    BatchStats,
+)
+from insight_agent.result_cache import ResultCache, request_key
+from service import metrics
+from service.jobs import JobStatus, JobStore, run_job
+from service.workers import (
+    EventChannel,
+    PoolSaturated,
+    PoolUnavailable,
+    StreamEvents,
+    WorkerPool,
+    run_analysis_batch,
+    run_analysis_events,
+    run_analysis_json,
+    run_arrow_analysis,
+)
 
-app = FastAPI(title="InsightAgent API", version="0.1.0")
-engine = InsightEngine()
+pool = WorkerPool.from_env()
+jobs = JobStore.from_env()
+results = ResultCache.from_env()
+_job_tasks: Set["asyncio.Task[None]"] = set()
+# /jobs accepts an AnalyzeRequest as JSON or a raw CSV export
+JOB_MEDIA_TYPES = ("application/json", "text/csv", "application/octet-stream")
+_UPLOAD_WRITE_BYTES = 1 << 20
+_stream_tasks: Set["asyncio.Task[Any]"] = set()
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    jobs.open()
+    results.open()
+    pool.start()
+    try:
+        yield
+    finally:
+        pool.shutdown()
+
+
+app = FastAPI(title="InsightAgent API", version="0.1.0", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+    # Timed to the last body byte, so streamed routes (/analyze/stream) record their full duration
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    body: Optional[AsyncIterator[bytes]] = getattr(response, "body_iterator", None)
+    if body is None:
+        metrics.http_latency.observe(time.perf_counter() - start, route=route)
+        return response
+
+    async def timed() -> AsyncIterator[bytes]:
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            metrics.http_latency.observe(time.perf_counter() - start, route=route)
+
+    response.body_iterator = timed()  # type: ignore[attr-defined]
+    return response
 
 
 @app.post("/analyze", response_model=AnalyzeResponse)
-async def analyze(payload: AnalyzeRequest = Body(...)) -> AnalyzeResponse:  # type: ignore
+async def analyze(request: Request, payload: AnalyzeRequest = Body(...)) -> Response:  # type: ignore
+    # Identical input and config share an ETag; a matching If-None-Match gets a 304 and a
+    # cached result is returned without touching the pool. Requests for timings always run.
+    # Hashing the input and the disk tier run off the event loop.
+    loop = asyncio.get_running_loop()
+    key = await loop.run_in_executor(None, request_key, payload) if _cacheable(payload) else None
+    headers = {"ETag": f'"{key}"'} if key else None
+    if key:
+        tags = _etags(request.headers.get("if-none-match"))
+        cached = None if key in tags else await loop.run_in_executor(None, results.get, key)
+        # "*" only matches a result that exists
+        if key in tags or ("*" in tags and cached is not None):
+            metrics.result_cache.inc(outcome="not_modified")
+            return Response(status_code=304, headers=headers)
+        metrics.result_cache.inc(outcome="miss" if cached is None else "hit")
+        if cached is not None:
+            return Response(content=cached, media_type="application/json", headers=headers)
     try:
-        result = engine.analyze(payload)
-        return AnalyzeResponse(ok=True, result=result)
+        body, stages = await pool.run(run_analysis_json, payload)
+    except PoolSaturated as e:
+        return _rejected(429, str(e))
+    except PoolUnavailable as e:
+        return _rejected(503, str(e))
     except Exception as e:  # pragma: no cover
-        return AnalyzeResponse(ok=False, error=str(e))
+        return _json(AnalyzeResponse(ok=False, error=str(e)))
+    metrics.observe_stages(stages)
+    content = body.encode("utf-8")
+    if key:
+        await loop.run_in_executor(None, results.put, key, content)
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+@app.post("/analyze/batch", response_model=AnalyzeBatchResponse)
+async def analyze_batch(payload: AnalyzeBatchRequest = Body(...)) -> Response:  # type: ignore
+    # Items are sorted by header shape and cut into one slice per worker, so a shape's column
+    # mapping is resolved once per worker and engines are shared. Each item gets its own
+    # result or error; results already in the cache (see /analyze) are reused.
+    if pool.saturated:
+        return _json(AnalyzeBatchResponse(ok=False, error="Analysis queue is full"), 429, {"Retry-After": "1"})
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    items = payload.items
+    bodies: List[str] = [""] * len(items)
+    stats = BatchStats(items=len(items))
+    for item in items:
+        item.config = item.config or payload.config
+    keys, cached = await loop.run_in_executor(None, _cached_results, items)
+    todo: List[int] = []
+    for i, body in enumerate(cached):
+        if keys[i]:
+            metrics.result_cache.inc(outcome="miss" if body is None else "hit")
+        if body is None:
+            todo.append(i)
+        else:
+            bodies[i] = body.decode("utf-8")
+            stats.cached += 1
+
+    shapes = {i: _header_shape(items[i]) for i in todo}
+    stats.header_shapes = len(set(shapes.values()))
+    todo.sort(key=shapes.__getitem__)
+    size = max(1, -(-len(todo) // max(pool.workers, 1)))
+    slices = [todo[n : n + size] for n in range(0, len(todo), size)]
+    outcomes = await asyncio.gather(
+        *(pool.run(run_analysis_batch, [(i, items[i]) for i in part]) for part in slices), return_exceptions=True
+    )
+    fresh: List[Tuple[str, bytes]] = []
+    for part, outcome in zip(slices, outcomes):
+        if isinstance(outcome, BaseException):
+            for i in part:
+                bodies[i] = AnalyzeResponse(ok=False, error=str(outcome)).model_dump_json()
+            stats.failed += len(part)
+            continue
+        for i, body, rows, ok, stages in outcome:
+            bodies[i] = body
+            stats.rows += rows
+            if not ok:
+                stats.failed += 1
+                continue
+            metrics.observe_stages(stages)
+            key = keys[i]
+            if key:
+                fresh.append((key, body.encode("utf-8")))
+    if fresh:
+        await loop.run_in_executor(None, _store_results, fresh)
+
+    stats.elapsed_s = time.perf_counter() - start
+    stats.items_per_s = len(items) / max(stats.elapsed_s, 1e-9)
+    stats.rows_per_s = stats.rows / max(stats.elapsed_s, 1e-9)
+    # Item bodies are already serialized AnalyzeResponses; each becomes a BatchItemResult by
+    # prepending its id
+    entries = ",".join(f'{{"id":{json.dumps(item.id)},{body[1:]}' for item, body in zip(items, bodies))
+    content = f'{{"ok":true,"results":[{entries}],"stats":{stats.model_dump_json()},"error":null}}'
+    return Response(content=content, media_type="application/json")
+
+
+@app.post("/analyze/stream")
+async def analyze_stream(request: Request, payload: AnalyzeRequest = Body(...)) -> Response:
+    # NDJSON ({"event", "data"} per line) by default, Server-Sent Events for
+    # Accept: text/event-stream. Events: mapping, insights (per agent, as they enter the top
+    # K), then summary with the final ranking, or error.
+    sse = "text/event-stream" in request.headers.get("accept", "")
+    channel, events = pool.open_stream()
+    task = asyncio.create_task(pool.run(run_analysis_events, payload, channel))
+    _stream_tasks.add(task)
+    task.add_done_callback(_stream_tasks.discard)
+    # A job that failed or was cancelled before its worker ended the stream still has to end it
+    task.add_done_callback(lambda t: _end_failed_stream(t, channel))
+
+    first = await events.get()
+    if first is None:
+        if task.cancelled():
+            return _rejected(503, "Analysis was cancelled")
+        try:
+            await task
+        except PoolSaturated as e:
+            return _rejected(429, str(e))
+        except PoolUnavailable as e:
+            return _rejected(503, str(e))
+        except Exception as e:  # pragma: no cover
+            return _json(AnalyzeResponse(ok=False, error=str(e)))
+    media_type = "text/event-stream" if sse else "application/x-ndjson"
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(_events(first, events, task, sse), media_type=media_type, headers=headers)
+
+
+@app.post("/analyze/arrow", response_model=AnalyzeResponse)
+async def analyze_arrow(request: Request, config: Optional[str] = None) -> Response:
+    # Body is a Parquet file or an Arrow IPC file/stream; `config` is AnalysisConfig JSON.
+    # Accept: application/vnd.apache.arrow.stream returns the insights as an Arrow table.
+    try:
+        cfg = AnalysisConfig.model_validate_json(config) if config else None
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False)) from e
+    as_arrow = ARROW_STREAM_MEDIA_TYPE in request.headers.get("accept", "")
+    try:
+        body, stages = await pool.run(run_arrow_analysis, await request.body(), cfg, as_arrow)
+    except PoolSaturated as e:
+        return _rejected(429, str(e))
+    except PoolUnavailable as e:
+        return _rejected(503, str(e))
+    except Exception as e:
+        return _json(AnalyzeResponse(ok=False, error=str(e)))
+    metrics.observe_stages(stages)
+    return Response(content=body, media_type=ARROW_STREAM_MEDIA_TYPE if as_arrow else "application/json")
+
+
+@app.post("/jobs", response_model=JobStatus, status_code=202)
+async def submit_job(request: Request) -> JobStatus:
+    # JSON bodies are AnalyzeRequest payloads; CSV bodies (text/csv or application/octet-stream)
+    # are streamed to disk. Other media types get a 415, bodies over jobs.max_upload_bytes a 413.
+    if pool.saturated:
+        raise HTTPException(status_code=429, detail="Analysis queue is full", headers={"Retry-After": "1"})
+    media_type = request.headers.get("content-type", "").partition(";")[0].strip().lower()
+    if media_type not in JOB_MEDIA_TYPES:
+        raise HTTPException(status_code=415, detail=f"Expected one of: {', '.join(JOB_MEDIA_TYPES)}")
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > jobs.max_upload_bytes:
+        raise _too_large()
+
+    loop = asyncio.get_running_loop()
+    source: Union[AnalyzeRequest, str]
+    if media_type == "application/json":
+        body = await _read_body(request, jobs.max_upload_bytes)
+        try:
+            source = await loop.run_in_executor(None, AnalyzeRequest.model_validate_json, body)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False)) from e
+        job = await loop.run_in_executor(None, jobs.create)
+    else:
+        job = await loop.run_in_executor(None, jobs.create)
+        source = jobs.upload_path(job.id)
+        try:
+            await _save_upload(request, source, jobs.max_upload_bytes)
+        except BaseException:
+            await loop.run_in_executor(None, jobs.discard, job.id)
+            raise
+
+    task = asyncio.create_task(_run_job(job.id, source))
+    _job_tasks.add(task)
+    task.add_done_callback(_job_tasks.discard)
+    return job
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def job_status(job_id: str) -> JobStatus:
+    job = await asyncio.get_running_loop().run_in_executor(None, jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job
+
+
+@app.get("/jobs/{job_id}/result", response_model=AnalyzeResponse)
+async def job_result(job_id: str) -> Response:
+    job = await job_status(job_id)
+    if job.status not in ("done", "failed"):
+        return _json(job, 409)
+    # Stored already serialized as an AnalyzeResponse
+    result = await asyncio.get_running_loop().run_in_executor(None, jobs.result, job_id)
+    return Response(content=result, media_type="application/json")
 
 
 @app.get("/health")
 async def health() -> JSONResponse:
-    return JSONResponse({"ok": True})
+    return JSONResponse({"ok": True, "pool": pool.stats(), "result_cache": results.info()})
+
+
+@app.get("/metrics")
+async def prometheus_metrics() -> PlainTextResponse:
+    return PlainTextResponse(metrics.render(pool.stats(), results.info()), media_type="text/plain; version=0.0.4")
+
+
+async def _run_job(job_id: str, source: Union[AnalyzeRequest, str]) -> None:
+    try:
+        await pool.run(run_job, jobs, job_id, source)
+    except (PoolSaturated, PoolUnavailable) as e:
+        response = AnalyzeResponse(ok=False, error=str(e))
+        await asyncio.get_running_loop().run_in_executor(None, jobs.finish, job_id, response)
+
+
+async def _read_body(request: Request, limit: int) -> bytes:
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise _too_large()
+    return bytes(body)
+
+
+async def _save_upload(request: Request, path: str, limit: int) -> None:
+    # Received chunks are gathered into larger writes, each done off the event loop
+    loop = asyncio.get_running_loop()
+    f = await loop.run_in_executor(None, open, path, "wb")
+    try:
+        size = 0
+        pending = bytearray()
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > limit:
+                raise _too_large()
+            pending += chunk
+            if len(pending) >= _UPLOAD_WRITE_BYTES:
+                await loop.run_in_executor(None, f.write, bytes(pending))
+                pending.clear()
+        await loop.run_in_executor(None, f.write, bytes(pending))
+    finally:
+        await loop.run_in_executor(None, f.close)
+
+
+async def _events(
+    first: Optional[Tuple[str, str]], events: StreamEvents, task: "asyncio.Task[List[Any]]", sse: bool
+) -> AsyncIterator[bytes]:
+    # Each event is written as soon as the worker hands it over; nothing is buffered here
+    event = first
+    while event is not None:
+        yield _event_bytes(event, sse)
+        event = await events.get()
+    if task.cancelled():
+        yield _event_bytes(("error", json.dumps({"error": "Analysis was cancelled"})), sse)
+        return
+    try:
+        stages = await task
+    except Exception as e:
+        yield _event_bytes(("error", json.dumps({"error": str(e)})), sse)
+        return
+    metrics.observe_stages(stages)
+
+
+def _end_failed_stream(task: "asyncio.Task[Any]", channel: EventChannel) -> None:
+    if task.cancelled() or task.exception() is not None:
+        pool.end_stream(channel)
+
+
+def _cacheable(payload: AnalyzeRequest) -> bool:
+    # Timings describe one run, so those requests are never served from the cache
+    cfg = payload.config
+    return not (cfg and (cfg.timings or cfg.trace_memory))
+
+
+def _cached_results(items: List[BatchItem]) -> Tuple[List[Optional[str]], List[Optional[bytes]]]:
+    # Runs in a thread: hashes each item's input and checks the cache (None key = not cacheable)
+    keys: List[Optional[str]] = []
+    bodies: List[Optional[bytes]] = []
+    for item in items:
+        key = request_key(item) if _cacheable(item) else None
+        keys.append(key)
+        bodies.append(results.get(key) if key else None)
+    return keys, bodies
+
+
+def _store_results(entries: List[Tuple[str, bytes]]) -> None:
+    for key, body in entries:
+        results.put(key, body)
+
+
+def _header_shape(item: BatchItem) -> Tuple[str, ...]:
+    # The engine reads csv before columns+rows
+    if item.csv:
+        return ("csv", item.csv.partition("\n")[0].rstrip("\r"))
+    return ("rows", *(item.columns or []))
+
+
+def _event_bytes(event: Tuple[str, str], sse: bool) -> bytes:
+    kind, data = event
+    if sse:
+        return f"event: {kind}\ndata: {data}\n\n".encode("utf-8")
+    return f'{{"event":"{kind}","data":{data}}}\n'.encode("utf-8")
+
+
+def _etags(header: Optional[str]) -> Set[str]:
+    # Entity tags of an If-None-Match header, unquoted; "*" is kept as is
+    if not header:
+        return set()
+    return {t.strip().removeprefix("W/").strip('"') for t in header.split(",")}
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Upload exceeds {jobs.max_upload_bytes} bytes")
+
+
+def _rejected(status_code: int, error: str) -> Response:
+    return _json(AnalyzeResponse(ok=False, error=error), status_code, headers={"Retry-After": "1"})
+
+
+def _json(model: BaseModel, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    # Serialized straight to JSON by pydantic-core, skipping FastAPI's response_model pass
+    return Response(model.model_dump_json(), status_code=status_code, headers=headers, media_type="application/json")
@@ -0,0 +1,153 @@
+from __future__ import annotations
+from typing import Literal, Optional, Union
+import os
+import tempfile
+import time
+import uuid
+
+from pydantic import BaseModel, ConfigDict
+
+from insight_agent.models import AnalyzeRequest, AnalyzeResponse
+from insight_agent.sqlite_store import connect, create
+from service.workers import worker_engine
+
+JobState = Literal["queued", "running", "done", "failed"]
+
+
+class JobStatus(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    status: JobState
+    rows_processed: int = 0
+    stage: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    rows_processed INTEGER NOT NULL DEFAULT 0,
+    stage TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    result TEXT
+)
+"""
+
+
+class JobStore:
+    # SQLite-backed so worker processes can report progress directly; finished jobs
+    # (and their results) are evicted once they are older than ttl_seconds. Request bodies
+    # larger than max_upload_bytes are refused.
+    def __init__(self, directory: str, ttl_seconds: float = 86400.0, max_upload_bytes: int = 1 << 30) -> None:
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_upload_bytes = max_upload_bytes
+        self.path = os.path.join(directory, "jobs.sqlite3")
+
+    def open(self) -> None:
+        create(self.path, (_SCHEMA,))
+
+    @classmethod
+    def from_env(cls) -> "JobStore":
+        directory = os.getenv("INSIGHT_JOB_DIR", os.path.join(tempfile.gettempdir(), "insight-jobs"))
+        return cls(
+            directory,
+            ttl_seconds=float(os.getenv("INSIGHT_JOB_TTL", "86400")),
+            max_upload_bytes=int(float(os.getenv("INSIGHT_JOB_MAX_MB", "1024")) * (1 << 20)),
+        )
+
+    def create(self) -> JobStatus:
+        self.evict_expired()
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with connect(self.path) as db:
+            db.execute(
+                "INSERT INTO jobs (id, status, created_at, updated_at) VALUES (?, 'queued', ?, ?)",
+                (job_id, now, now),
+            )
+        return JobStatus(id=job_id, status="queued", created_at=now, updated_at=now)
+
+    def discard(self, job_id: str) -> None:
+        # A job whose upload never completed
+        with connect(self.path) as db:
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        _remove(self.upload_path(job_id))
+
+    def upload_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.csv")
+
+    def progress(self, job_id: str, rows_processed: int, stage: str) -> None:
+        with connect(self.path) as db:
+            db.execute(
+                "UPDATE jobs SET status = 'running', rows_processed = ?, stage = ?, updated_at = ? WHERE id = ?",
+                (rows_processed, stage, time.time(), job_id),
+            )
+
+    def finish(self, job_id: str, response: AnalyzeResponse) -> None:
+        status = "done" if response.ok else "failed"
+        with connect(self.path) as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, error = ?, result = ?, stage = NULL, updated_at = ? WHERE id = ?",
+                (status, response.error, response.model_dump_json(), time.time(), job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        with connect(self.path) as db:
+            row = db.execute(
+                "SELECT id, status, rows_processed, stage, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "status", "rows_processed", "stage", "error", "created_at", "updated_at")
+        return JobStatus(**dict(zip(keys, row)))
+
+    def result(self, job_id: str) -> Optional[str]:
+        with connect(self.path) as db:
+            row = db.execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def evict_expired(self) -> int:
+        cutoff = time.time() - self.ttl_seconds
+        with connect(self.path) as db:
+            expired = [
+                r[0]
+                for r in db.execute(
+                    "SELECT id FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (cutoff,)
+                )
+            ]
+            db.executemany("DELETE FROM jobs WHERE id = ?", [(j,) for j in expired])
+        for job_id in expired:
+            _remove(self.upload_path(job_id))
+        return len(expired)
+
+
+def run_job(store: JobStore, job_id: str, source: Union[AnalyzeRequest, str]) -> None:
+    # Runs inside a pool worker; `source` is either a request payload or an uploaded CSV path
+    def progress(rows: int, stage: str) -> None:
+        store.progress(job_id, rows, stage)
+
+    try:
+        engine = worker_engine()
+        if isinstance(source, AnalyzeRequest):
+            result = engine.analyze(source, progress=progress)
+        else:
+            result = engine.analyze_stream(source, progress=progress)
+        store.finish(job_id, AnalyzeResponse(ok=True, result=result))
+    except Exception as e:
+        store.finish(job_id, AnalyzeResponse(ok=False, error=str(e)))
+    finally:
+        if isinstance(source, str):
+            _remove(source)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
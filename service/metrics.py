@@ -0,0 +1,100 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List, Sequence, Tuple
+import bisect
+import threading
+
+from insight_agent.models import StageTiming
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = [(k, list(c), t[0]) for k, (c, t) in self._series.items()]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{_fmt(labels + (('le', le),))} {cumulative}"
+            yield f"{self.name}_sum{_fmt(labels)} {total}"
+            yield f"{self.name}_count{_fmt(labels)} {cumulative}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name = name
+        self.help = help_text
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_fmt(labels)} {value}"
+
+
+def gauge(name: str, help_text: str, value: float) -> Iterable[str]:
+    yield f"# HELP {name} {help_text}"
+    yield f"# TYPE {name} gauge"
+    yield f"{name} {value}"
+
+
+def _fmt(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+http_latency = Histogram("insight_http_request_duration_seconds", "HTTP request latency by route")
+stage_latency = Histogram("insight_stage_duration_seconds", "Analysis stage wall time per request")
+stage_rows = Counter("insight_stage_rows_total", "Rows processed per analysis stage")
+stage_insights = Counter("insight_stage_insights_total", "Insights emitted per analysis stage")
+result_cache = Counter("insight_result_cache_requests_total", "/analyze result cache lookups by outcome")
+
+
+def observe_stages(timings: Iterable[StageTiming]) -> None:
+    for t in timings:
+        stage_latency.observe(t.wall_ms / 1000.0, stage=t.stage)
+        stage_rows.inc(t.rows, stage=t.stage)
+        stage_insights.inc(t.insights, stage=t.stage)
+
+
+def render(pool_stats: Dict[str, int], cache_stats: Dict[str, int]) -> str:
+    lines: List[str] = []
+    for metric in (http_latency, stage_latency, stage_rows, stage_insights, result_cache):
+        lines.extend(metric.render())
+    lines.extend(gauge("insight_pool_queued", "Analyses waiting for a worker", pool_stats["queued"]))
+    lines.extend(gauge("insight_pool_in_flight", "Analyses running on workers", pool_stats["in_flight"]))
+    lines.extend(gauge("insight_pool_workers", "Configured worker count", pool_stats["workers"]))
+    lines.extend(gauge("insight_result_cache_entries", "Results held in memory", cache_stats["entries"]))
+    lines.extend(gauge("insight_result_cache_bytes", "Bytes of results held in memory", cache_stats["bytes"]))
+    return "\n".join(lines) + "\n"
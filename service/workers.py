@@ -0,0 +1,291 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, TypeAlias, TypeVar, Union
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+
+from pydantic_core import to_json
+
+from insight_agent.instrument import StageRecorder
+from insight_agent.models import AnalysisConfig, AnalysisResult, AnalyzeRequest, AnalyzeResponse, StageTiming
+
+if TYPE_CHECKING:  # pragma: no cover
+    from insight_agent.engine import InsightEngine
+
+T = TypeVar("T")
+# (event name, JSON data) pairs from a streaming analysis, ended by None
+StreamEvents: TypeAlias = "asyncio.Queue[Optional[Tuple[str, str]]]"
+
+_engine: Optional[InsightEngine] = None
+
+
+class PoolSaturated(RuntimeError):
+    pass
+
+
+class PoolUnavailable(RuntimeError):
+    pass
+
+
+class EventChannel:
+    # The worker's end of a stream. Events go onto the pool's one event queue tagged with the
+    # stream id; picklable, so it reaches worker processes too.
+    def __init__(self, events: "queue.Queue[Any]", stream: int) -> None:
+        self.events = events
+        self.stream = stream
+
+    def put(self, event: Optional[Tuple[str, str]]) -> None:
+        self.events.put((self.stream, event))
+
+
+def worker_engine() -> InsightEngine:
+    # One engine per worker process (or per API process in thread mode). The engine (and
+    # numpy with it) is imported here, so in process mode the API process never loads it.
+    global _engine
+    if _engine is None:
+        from insight_agent.engine import InsightEngine
+
+        _engine = InsightEngine()
+    return _engine
+
+
+def warm() -> None:
+    worker_engine()
+
+
+def run_analysis(payload: AnalyzeRequest) -> AnalysisResult:
+    # Stage timings always come back so the API can aggregate them into /metrics
+    recorder = StageRecorder(trace_memory=bool(payload.config and payload.config.trace_memory))
+    return worker_engine().analyze(payload, recorder=recorder)
+
+
+def run_analysis_json(payload: AnalyzeRequest) -> Tuple[str, List[StageTiming]]:
+    return render(run_analysis(payload), bool(payload.config and payload.config.timings))
+
+
+def run_analysis_batch(items: List[Tuple[int, AnalyzeRequest]]) -> List[Tuple[int, str, int, bool, List[StageTiming]]]:
+    # One slice of a batch: (index, AnalyzeResponse JSON, rows, ok, stages) per item. A failing
+    # item only fails its own entry. Slices arrive sorted by header, so each header shape is
+    # resolved once here and served from the column mapping cache afterwards.
+    out = []
+    for index, item in items:
+        try:
+            result = run_analysis(item)
+        except Exception as e:
+            out.append((index, AnalyzeResponse(ok=False, error=str(e)).model_dump_json(), 0, False, []))
+            continue
+        rows = int(result.totals.get("rows", 0))
+        body, stages = render(result, bool(item.config and item.config.timings))
+        out.append((index, body, rows, True, stages))
+    return out
+
+
+def run_arrow_analysis(
+    data: bytes, config: Optional[AnalysisConfig], as_arrow: bool = False
+) -> Tuple[Union[str, bytes], List[StageTiming]]:
+    # `data` is a Parquet file or an Arrow IPC file/stream; as_arrow returns the insights
+    # as an Arrow IPC stream instead of an AnalyzeResponse
+    recorder = StageRecorder(trace_memory=bool(config and config.trace_memory))
+    result = worker_engine().analyze_arrow(data, config, recorder=recorder)
+    if as_arrow:
+        from insight_agent.arrow import insights_table, write_ipc_stream
+        from insight_agent.compact import expand_insights
+
+        insights = expand_insights(result.compact) if result.compact else result.insights
+        return write_ipc_stream(insights_table(insights)), result.timings or []
+    return render(result, bool(config and config.timings))
+
+
+def run_analysis_events(payload: AnalyzeRequest, channel: EventChannel) -> List[StageTiming]:
+    # Streams "mapping", then "insights" ({agent, insights}) as each agent adds to the top K,
+    # then "summary" or "error". Streamed insights can still be evicted or reordered by later
+    # chunks and roll-ups, so the summary carries the final ranking as insight ids.
+    def emit(kind: str, data: Any) -> None:
+        if kind == "insights":
+            agent, insights = data
+            data = {"agent": agent, "insights": insights}
+        channel.put((kind, to_json(data).decode()))
+
+    cfg = payload.config
+    recorder = StageRecorder(trace_memory=bool(cfg and cfg.trace_memory))
+    try:
+        result = worker_engine().analyze(payload, recorder=recorder, events=emit)
+    except Exception as e:
+        channel.put(("error", to_json({"error": str(e)}).decode()))
+        channel.put(None)
+        return []
+    stages = result.timings or []
+    if result.compact:
+        from insight_agent.compact import expand_insights
+
+        ranked = expand_insights(result.compact)
+    else:
+        ranked = result.insights
+    summary = {
+        "summary": result.summary,
+        "totals": result.totals,
+        "ranking": [i.id for i in ranked],
+        "timings": stages if cfg and cfg.timings else None,
+    }
+    channel.put(("summary", to_json(summary).decode()))
+    channel.put(None)
+    return stages
+
+
+def render(result: AnalysisResult, timings: bool) -> Tuple[str, List[StageTiming]]:
+    # Serialized in the worker, so only a string crosses the process boundary and the API
+    # returns it without re-validating it against response_model. Stage timings always
+    # come back separately for /metrics.
+    stages = result.timings or []
+    if not timings:
+        result.timings = None
+    return AnalyzeResponse(ok=True, result=result).model_dump_json(), stages
+
+
+class WorkerPool:
+    # Runs CPU-bound analyses off the event loop. At most `workers` jobs run at once and at
+    # most `max_queue` wait for a slot; anything beyond that is rejected with PoolSaturated.
+    def __init__(self, workers: int, max_queue: int) -> None:
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queued = 0
+        self.in_flight = 0
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._manager: Optional[Any] = None
+        # Streams share one event queue, drained by one pump thread into per-stream asyncio queues
+        self._events: Optional["queue.Queue[Any]"] = None
+        self._streams: Dict[int, StreamEvents] = {}
+        self._next_stream = 0
+
+    @classmethod
+    def from_env(cls) -> "WorkerPool":
+        # INSIGHT_WORKERS=0 runs analyses on a single thread inside the API process
+        workers = int(os.getenv("INSIGHT_WORKERS", str(os.cpu_count() or 1)))
+        max_queue = int(os.getenv("INSIGHT_MAX_QUEUE", str(max(workers, 1) * 4)))
+        return cls(workers=workers, max_queue=max_queue)
+
+    def start(self) -> None:
+        self._executor = self._make_executor()
+        self._slots = asyncio.Semaphore(max(self.workers, 1))
+        # Spawns every worker now so engines are built at startup rather than on the first
+        # requests; this does not wait for them
+        for _ in range(max(self.workers, 1)):
+            self._executor.submit(warm)
+
+    def shutdown(self) -> None:
+        if self._events is not None:
+            self._events.put((None, None))
+            self._events = None
+            for stream in list(self._streams):
+                self._deliver(stream, None)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+    def open_stream(self) -> Tuple[EventChannel, StreamEvents]:
+        # Called on the event loop. The worker writes to the channel and the API reads the
+        # asyncio queue; the stream closes itself once the worker (or end_stream) sends None.
+        # The event queue is a plain queue in thread mode, a proxy to a queue in a manager
+        # process (started on first use) in process mode.
+        if self._events is None:
+            if self.workers <= 0:
+                self._events = queue.Queue()
+            else:
+                if self._manager is None:
+                    self._manager = multiprocessing.Manager()
+                self._events = self._manager.Queue()
+            loop = asyncio.get_running_loop()
+            pump = threading.Thread(
+                target=self._pump, args=(self._events, loop), name="insight-events", daemon=True
+            )
+            pump.start()
+        self._next_stream += 1
+        events: StreamEvents = asyncio.Queue()
+        self._streams[self._next_stream] = events
+        return EventChannel(self._events, self._next_stream), events
+
+    def end_stream(self, channel: EventChannel) -> None:
+        # For jobs that failed or were cancelled before the worker could end the stream
+        self._deliver(channel.stream, None)
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        if self._executor is None or self._slots is None:
+            raise PoolUnavailable("Worker pool is not running")
+        if self.saturated:
+            raise PoolSaturated(f"Analysis queue is full ({self.max_queue} waiting)")
+
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+
+        self.in_flight += 1
+        executor = self._executor
+        try:
+            fut = asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        # The slot is held until the worker actually finishes, even if the client goes away
+        fut.add_done_callback(self._release)
+        try:
+            return await asyncio.shield(fut)
+        except BrokenProcessPool as e:
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._make_executor()
+            raise PoolUnavailable("Worker pool crashed; restarted") from e
+
+    @property
+    def saturated(self) -> bool:
+        return self.queued >= self.max_queue
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+        }
+
+    def _make_executor(self) -> Executor:
+        if self.workers <= 0:
+            return ThreadPoolExecutor(max_workers=1, thread_name_prefix="insight-worker", initializer=warm)
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=warm)
+
+    def _pump(self, events: "queue.Queue[Any]", loop: asyncio.AbstractEventLoop) -> None:
+        # A single thread serves every open stream; a (None, None) item stops it
+        while True:
+            try:
+                stream, event = events.get()
+            except (EOFError, OSError):  # the manager process has gone
+                return
+            if stream is None:
+                return
+            try:
+                loop.call_soon_threadsafe(self._deliver, stream, event)
+            except RuntimeError:  # the loop is closed
+                return
+
+    def _deliver(self, stream: int, event: Optional[Tuple[str, str]]) -> None:
+        # Events for a stream that has already ended (e.g. a cancelled job's worker) are dropped
+        events = self._streams.get(stream)
+        if events is None:
+            return
+        events.put_nowait(event)
+        if event is None:
+            del self._streams[stream]
+
+    def _release(self, _: Any) -> None:
+        self.in_flight -= 1
+        if self._slots is not None:
+            self._slots.release()
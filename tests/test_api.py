@@ -0,0 +1,305 @@
+from __future__ import annotations
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pytest
+
+CSV = "Ad Name,Spend,Impressions,Clicks,Revenue\na,10,1000,2,3\nb,20,100,9,50\n"
+
+
+@pytest.fixture
+def client(monkeypatch: pytest.MonkeyPatch, tmp_path: Any) -> Iterator[Tuple[Any, Any]]:
+    # In-process worker threads and a disk tier in a scratch directory
+    monkeypatch.setenv("INSIGHT_WORKERS", "0")
+    monkeypatch.setenv("INSIGHT_JOB_DIR", str(tmp_path / "jobs"))
+    from fastapi.testclient import TestClient
+
+    from insight_agent.result_cache import ResultCache
+    from service import api
+    from service.jobs import JobStore
+
+    monkeypatch.setattr(api, "results", ResultCache(directory=str(tmp_path / "results")))
+    monkeypatch.setattr(api, "jobs", JobStore(str(tmp_path / "jobs"), max_upload_bytes=4096))
+    with TestClient(api.app) as c:
+        yield c, api.results
+
+
+def _analyze(c: Any, headers: Optional[Dict[str, str]] = None, **config: Any) -> Any:
+    return c.post("/analyze", json={"csv": CSV, "config": config or None}, headers=headers)
+
+
+def test_cached_result_and_etag(client: Tuple[Any, Any]) -> None:
+    c, results = client
+    first = _analyze(c)
+    assert first.status_code == 200 and first.json()["ok"]
+    etag = first.headers["etag"]
+
+    again = _analyze(c)
+    assert again.content == first.content and again.headers["etag"] == etag
+    assert results.info()["hits"] == 1
+
+    assert _analyze(c, {"If-None-Match": etag}).status_code == 304
+    assert _analyze(c, {"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert _analyze(c, max_insights=5).headers["etag"] != etag
+
+
+def test_wildcard_only_matches_an_existing_result(client: Tuple[Any, Any]) -> None:
+    c, results = client
+    fresh = _analyze(c, {"If-None-Match": "*"})
+    assert fresh.status_code == 200 and fresh.json()["ok"]
+    assert _analyze(c, {"If-None-Match": "*"}).status_code == 304
+
+    # Evicted from memory, still found on disk
+    results._entries.clear()
+    assert _analyze(c, {"If-None-Match": "*"}).status_code == 304
+    assert results.info()["disk_hits"] == 1
+
+
+def test_timings_are_never_cached(client: Tuple[Any, Any]) -> None:
+    c, _ = client
+    response = _analyze(c, {"If-None-Match": "*"}, timings=True)
+    assert response.status_code == 200 and "etag" not in response.headers
+    assert response.json()["result"]["timings"]
+
+
+def test_batch_reuses_cached_results(client: Tuple[Any, Any]) -> None:
+    c, _ = client
+    _analyze(c)
+    items = [{"id": "cached", "csv": CSV}, {"id": "new", "csv": CSV, "config": {"max_insights": 1}}]
+    response = c.post("/analyze/batch", json={"items": items}).json()
+    assert [r["id"] for r in response["results"]] == ["cached", "new"]
+    assert all(r["ok"] for r in response["results"])
+    assert response["stats"]["cached"] == 1
+
+
+
+def test_batch_items_fail_alone(client: Tuple[Any, Any], monkeypatch: pytest.MonkeyPatch) -> None:
+    c, _ = client
+    from insight_agent.models import AnalyzeBatchResponse
+    from service import api
+
+    items = [
+        {"id": "a", "csv": CSV},
+        {"id": "missing"},
+        {"id": "b", "csv": CSV, "config": {"max_insights": 1}},
+        # Over the csv module's field size limit
+        {"id": "huge-field", "csv": 'Ad Name,Spend\n"' + "x" * 200_000 + '",1\n'},
+        {"id": "c", "columns": ["Ad Name", "Spend"], "rows": [["x", "oops"], ["y"]]},
+    ]
+    response = c.post("/analyze/batch", json={"items": items})
+    assert response.status_code == 200
+    batch = AnalyzeBatchResponse.model_validate_json(response.content)
+    assert batch.ok and [r.id for r in batch.results] == [i["id"] for i in items]
+    assert [r.ok for r in batch.results] == [True, False, True, False, True]
+    assert batch.results[1].error == "Provide either csv or columns+rows"
+    assert "field limit" in (batch.results[3].error or "") and batch.results[3].result is None
+    assert len(batch.results[2].result.insights) == 1
+    assert batch.stats is not None and batch.stats.failed == 2 and batch.stats.rows == 6
+
+    # A slice whose worker fails takes only its own items down; cached ones still come back
+    def broken(_: Any) -> Any:
+        raise RuntimeError("worker died")
+
+    monkeypatch.setattr(api, "run_analysis_batch", broken)
+    items[4]["rows"] = [["z", "1"]]
+    response = c.post("/analyze/batch", json={"items": items})
+    batch = AnalyzeBatchResponse.model_validate_json(response.content)
+    assert [r.ok for r in batch.results] == [True, False, True, False, False]
+    assert [r.error for r in batch.results if not r.ok] == ["worker died"] * 3
+    assert batch.stats is not None and batch.stats.cached == 2 and batch.stats.failed == 3
+
+
+def _finished(c: Any, job_id: str) -> Dict[str, Any]:
+    for _ in range(200):
+        status = c.get(f"/jobs/{job_id}").json()
+        if status["status"] in ("done", "failed"):
+            return status
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+
+def test_full_queue_and_stopped_pool_are_rejected(
+    client: Tuple[Any, Any], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    c, _ = client
+    from service import api
+
+    # One analysis at a time and one waiting; the running one is held until `gate` opens
+    gate = threading.Event()
+    analyze = api.run_analysis_json
+
+    def held(payload: Any) -> Any:
+        gate.wait(10)
+        return analyze(payload)
+
+    monkeypatch.setattr(api, "run_analysis_json", held)
+    monkeypatch.setattr(api.pool, "max_queue", 1)
+    codes: List[int] = []
+    # Timings are never cached, so every request reaches the pool
+    busy = [
+        threading.Thread(target=lambda: codes.append(_analyze(c, timings=True).status_code))
+        for _ in range(2)
+    ]
+    try:
+        for thread, (running, waiting) in zip(busy, [(1, 0), (1, 1)]):
+            thread.start()
+            _until(lambda: (api.pool.in_flight, api.pool.queued) == (running, waiting))
+        assert c.get("/health").json()["pool"]["queued"] == 1
+
+        for response in (
+            _analyze(c, timings=True),
+            c.post("/analyze/stream", json={"csv": CSV}),
+            c.post("/analyze/batch", json={"items": [{"id": "a", "csv": CSV}]}),
+        ):
+            assert response.status_code == 429 and response.headers["retry-after"] == "1"
+            assert not response.json()["ok"]
+    finally:
+        gate.set()
+        for thread in busy:
+            thread.join()
+    assert codes == [200, 200]
+
+    api.pool.shutdown()
+    response = _analyze(c, timings=True)
+    assert response.status_code == 503 and response.headers["retry-after"] == "1"
+    assert response.json()["error"] == "Worker pool is not running"
+
+
+def _until(done: Any, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not done():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_job_lifecycle(client: Tuple[Any, Any]) -> None:
+    c, _ = client
+    from service import api
+
+    submitted = []
+    for content_type in ("text/csv", "application/octet-stream; charset=binary"):
+        job = c.post("/jobs", content=CSV.encode(), headers={"Content-Type": content_type})
+        assert job.status_code == 202 and job.json()["status"] == "queued"
+        submitted.append(job.json()["id"])
+    job = c.post("/jobs", json={"csv": CSV, "config": {"max_insights": 1}})
+    assert job.status_code == 202
+    submitted.append(job.json()["id"])
+
+    for job_id in submitted:
+        assert _finished(c, job_id)["status"] == "done"
+        result = c.get(f"/jobs/{job_id}/result").json()
+        assert result["ok"] and result["result"]["totals"]["rows"] == 2
+        # Uploads are removed once analyzed
+        assert not os.path.exists(api.jobs.upload_path(job_id))
+    assert len(result["result"]["insights"]) == 1
+
+    broken = c.post("/jobs", content=b"", headers={"Content-Type": "text/csv"}).json()
+    assert _finished(c, broken["id"])["error"] == "CSV stream is empty"
+    assert c.get(f"/jobs/{broken['id']}/result").json()["ok"] is False
+    assert c.get("/jobs/unknown").status_code == 404
+    assert c.get("/jobs/unknown/result").status_code == 404
+
+
+def test_job_uploads_are_checked(client: Tuple[Any, Any]) -> None:
+    c, _ = client
+    from service import api
+
+    multipart = c.post("/jobs", files={"file": ("export.csv", CSV)})
+    assert multipart.status_code == 415
+    assert c.post("/jobs", content=CSV.encode()).status_code == 415
+    assert c.post("/jobs", json={"rows": "x"}).status_code == 422
+
+    big = CSV + "c,1,1,1,1\n" * 1000
+    csv = {"Content-Type": "text/csv"}
+    assert c.post("/jobs", content=big.encode(), headers=csv).status_code == 413
+    # Without a Content-Length the limit is enforced while streaming, and nothing is kept
+    chunked = (big[i : i + 512].encode() for i in range(0, len(big), 512))
+    assert c.post("/jobs", content=chunked, headers=csv).status_code == 413
+    assert c.post("/jobs", json={"csv": big}).status_code == 413
+    with sqlite3.connect(api.jobs.path) as db:
+        assert db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 0
+    assert not [n for n in os.listdir(api.jobs.directory) if n.endswith(".csv")]
+
+
+def test_stream_latency_covers_the_whole_body(
+    client: Tuple[Any, Any], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    c, _ = client
+    from service import api, metrics
+
+    events = api._events
+
+    async def slow_events(*args: Any) -> Any:
+        async for chunk in events(*args):
+            yield chunk
+            await asyncio.sleep(0.05)
+
+    monkeypatch.setattr(api, "_events", slow_events)
+    before = _latency(metrics, "/analyze/stream")
+    response = c.post("/analyze/stream", json={"csv": CSV})
+    lines = response.text.splitlines()
+    assert json.loads(lines[-1])["event"] == "summary"
+    count, total = _latency(metrics, "/analyze/stream")
+    assert count == before[0] + 1
+    assert total - before[1] >= 0.05 * len(lines)
+
+
+
+def test_open_streams_share_one_thread() -> None:
+    from service.workers import WorkerPool
+
+    async def run() -> None:
+        pool = WorkerPool(workers=0, max_queue=4)
+        pool.start()
+        threads = threading.active_count()
+        streams = [pool.open_stream() for _ in range(50)]
+        assert threading.active_count() <= threads + 1
+
+        def worker() -> None:
+            for i, (channel, _) in enumerate(streams):
+                channel.put(("n", str(i)))
+                channel.put(None)
+
+        threading.Thread(target=worker).start()
+        for i, (_, events) in enumerate(streams):
+            assert await asyncio.wait_for(events.get(), 5) == ("n", str(i))
+            assert await asyncio.wait_for(events.get(), 5) is None
+        assert not pool._streams
+        pool.shutdown()
+
+    asyncio.run(run())
+
+
+def test_cancelled_stream_ends(client: Tuple[Any, Any], monkeypatch: pytest.MonkeyPatch) -> None:
+    c, _ = client
+    from service import api
+
+    async def cancelled(fn: Any, payload: Any, channel: Any) -> Any:
+        raise asyncio.CancelledError
+
+    async def cancelled_midway(fn: Any, payload: Any, channel: Any) -> Any:
+        channel.put(("mapping", "{}"))
+        await asyncio.sleep(0.1)
+        raise asyncio.CancelledError
+
+    monkeypatch.setattr(api.pool, "run", cancelled)
+    response = c.post("/analyze/stream", json={"csv": CSV})
+    assert response.status_code == 503 and response.json()["error"] == "Analysis was cancelled"
+
+    monkeypatch.setattr(api.pool, "run", cancelled_midway)
+    response = c.post("/analyze/stream", json={"csv": CSV})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["event"] for line in lines] == ["mapping", "error"]
+    assert lines[1]["data"] == {"error": "Analysis was cancelled"}
+    assert not api.pool._streams
+
+
+def _latency(metrics: Any, route: str) -> Tuple[int, float]:
+    counts, total = metrics.http_latency._series.get((("route", route),), ([0], [0.0]))
+    return sum(counts), total[0]
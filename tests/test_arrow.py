@@ -0,0 +1,30 @@
+from __future__ import annotations
+import io
+from pathlib import Path
+
+import pytest
+
+from benchmarks.synth import synth_export, to_csv
+from insight_agent import InsightEngine
+from insight_agent.models import AnalysisConfig
+
+pa = pytest.importorskip("pyarrow")
+
+
+def test_typed_table_matches_csv(tmp_path: Path) -> None:
+    import pyarrow.csv as pcsv
+    import pyarrow.parquet as pq
+
+    columns, rows = synth_export(3000, null_density=0.05)
+    text = to_csv(columns, rows)
+    config = {"max_insights": 10000, "chunk_rows": 700, "rollups": ["campaign"]}
+    engine = InsightEngine()
+    base = engine.analyze({"csv": text, "config": config})
+
+    # Numbers and ids come back typed, with nulls for blank cells
+    typed = pcsv.read_csv(io.BytesIO(text.encode()))
+    pq.write_table(typed, tmp_path / "export.parquet", row_group_size=500)
+    for source in (typed, str(tmp_path / "export.parquet")):
+        result = engine.analyze_arrow(source, AnalysisConfig(**config))
+        assert result.insights == base.insights
+        assert result.totals == pytest.approx(base.totals)
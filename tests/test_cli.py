@@ -0,0 +1,34 @@
+from __future__ import annotations
+import json
+from pathlib import Path
+from typing import Dict, List
+
+from insight_agent.cli import run_batch
+
+CSV = "Ad Name,Spend,Impressions,Clicks,Revenue\na,10,1000,2,3\nb,20,100,9,50\n"
+
+
+def _lines(path: Path) -> List[Dict]:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_resume_skips_done_files_and_retries_failed(tmp_path: Path) -> None:
+    exports = tmp_path / "exports"
+    exports.mkdir()
+    (exports / "good.csv").write_text(CSV)
+    (exports / "broken.csv").write_text("")
+    out = tmp_path / "insights.jsonl"
+
+    assert run_batch([str(exports)], str(out), workers=0) == 1
+    first = {Path(r["file"]).name: r["ok"] for r in _lines(out)}
+    assert first == {"good.csv": True, "broken.csv": False}
+
+    # An interrupted write leaves a partial line behind
+    with open(out, "a") as f:
+        f.write('{"file": "')
+    (exports / "broken.csv").write_text(CSV)
+    assert run_batch([str(exports)], str(out), workers=0) == 0
+
+    records = _lines(out)
+    assert sorted(Path(r["file"]).name for r in records) == ["broken.csv", "good.csv"]
+    assert all(r["ok"] for r in records)
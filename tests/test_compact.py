@@ -0,0 +1,51 @@
+from __future__ import annotations
+import json
+
+from benchmarks.synth import synth_export
+from insight_agent import InsightEngine
+from insight_agent.compact import COMPACT_FIELDS, compact_insights, expand_insights
+from insight_agent.models import AnalyzeResponse, Insight
+from service.workers import render
+
+ROLLUPS = {"rollups": ["ad_set", "campaign", "account"], "max_insights": 400}
+
+
+def test_compact_round_trip() -> None:
+    columns, rows = synth_export(600, seed=8)
+    engine = InsightEngine()
+    full = engine.analyze({"columns": columns, "rows": rows, "config": ROLLUPS})
+    compact = engine.analyze(
+        {"columns": columns, "rows": rows, "config": {**ROLLUPS, "compact": True}}
+    )
+    assert {i.scope for i in full.insights} >= {"ad", "ad_set", "campaign"}
+    assert compact.insights == [] and compact.compact is not None
+    assert compact.compact.fields == list(COMPACT_FIELDS)
+    assert len(compact.compact.rows) == len(full.insights)
+    # Each distinct recommendation list is sent once
+    assert len(compact.compact.recommendations) < 20
+    assert expand_insights(compact.compact) == full.insights
+    assert compact.totals == full.totals and compact.summary == full.summary
+
+    # Through the JSON the workers send back
+    body, _ = render(compact, timings=False)
+    parsed = AnalyzeResponse.model_validate_json(body)
+    assert parsed.result is not None and parsed.result.compact is not None
+    assert expand_insights(parsed.result.compact) == full.insights
+    assert len(body) < len(render(full, timings=False)[0])
+
+
+def test_odd_values_survive() -> None:
+    insights = [
+        Insight(
+            id="ctr-weak-é\"1", scope="ad", keys={"ad_id": None, "ad_name": "A,\nB"},
+            action="test", title="T", rationale="", recommendations=[], severity="low",
+        ),
+        Insight(
+            id="account", scope="account", keys={}, action="keep", title="T", rationale="r",
+            recommendations=["a", "b"], severity="high",
+        ),
+    ]
+    compact = compact_insights(insights)
+    assert expand_insights(compact) == insights
+    again = type(compact).model_validate(json.loads(compact.model_dump_json()))
+    assert expand_insights(again) == insights
@@ -0,0 +1,131 @@
+from __future__ import annotations
+import datetime as dt
+from typing import Any, List
+
+import numpy as np
+import pytest
+
+from insight_agent import InsightEngine
+from insight_agent.column_mapper import map_columns
+from insight_agent.frame import _parse_dates, build_frame
+from insight_agent.timeseries import DailyWindows
+
+COLUMNS = ["Date", "Ad ID", "Ad Name", "Spend", "Impressions", "Clicks", "Frequency"]
+
+
+def _daily_rows(days: List[Any]) -> List[List[Any]]:
+    # Ad 1's CTR decays over the last two weeks; ad 2 stays flat
+    rows = []
+    for d, day in enumerate(days):
+        ctr = 2.0 if d < 6 else 2.0 - 0.1 * (d - 6)
+        rows.append([day, "1", "A", 10, 1000, int(10 * ctr), 1.5 + 0.2 * max(0, d - 6)])
+        rows.append([day, "2", "B", 10, 1000, 20, 1.2])
+    return rows
+
+
+def test_mixed_formats_and_offsets() -> None:
+    raw = ["2024-01-01", "01/02/2024", "2024-01-03", "Jan 4, 2024", "2024-01-04T23:30:00-05:00"]
+    raw += ["", None, "n/a"]
+    days = _parse_dates(raw, len(raw))
+    assert days[:5].tolist() == [19723, 19724, 19725, 19726, 19726]
+    assert np.isnan(days[5:]).all()
+
+
+def test_zones_and_odd_values() -> None:
+    # Zones are dropped (the day as written), whatever their form
+    zoned = ["2024-01-04 23:30 UTC", "2024-01-04T23:30:00+05", "2024-01-04T23:30:00.5Z"]
+    zoned += ["2024-01-04 23:30 GMT+5", "Jan 4, 2024 11:30 PM PST", "01/04/2024 11:30 PM"]
+    assert _parse_dates(zoned + ["2024-01-03"], 7).tolist() == [19726] * 6 + [19725]
+    # Past 2262, where nanoseconds run out
+    assert _parse_dates(["3000-01-01", "2024-01-01"], 2).tolist() == [376200, 19723]
+    odd = _parse_dates(["2024-01-04 23:30:00 +05:00 x", "24:61", "2024-13-45"], 3)
+    assert np.isnan(odd).all()
+
+
+def test_an_odd_date_does_not_fail_the_analysis() -> None:
+    columns = ["Reporting starts"] + COLUMNS[1:]
+    rows = [
+        ["2024-01-04", "1", "A", 10, 1000, 5, 1.2],
+        ["2024-01-04 23:30 UTC", "2", "B", 10, 1000, 20, 1.2],
+        ["2024-01-04T23:30:00+05", "3", "C", 10, 1000, 20, 1.2],
+    ]
+    result = InsightEngine().analyze({"columns": columns, "rows": rows})
+    assert result.totals["rows"] == 3
+    assert "ctr-weak-1" in [i.id for i in result.insights]
+
+
+def test_undated_rows_are_reported() -> None:
+    start = dt.date(2024, 3, 1)
+    iso = [(start + dt.timedelta(days=d)).isoformat() for d in range(20)]
+    us = [(start + dt.timedelta(days=d)).strftime("%m/%d/%Y") for d in range(20)]
+    mixed = [iso[d] if d % 2 else us[d] for d in range(20)]
+    engine = InsightEngine()
+
+    base = engine.analyze({"columns": COLUMNS, "rows": _daily_rows(iso)})
+    rows = _daily_rows(mixed) + [["soon", "2", "B", 5, 500, 10, 1.2]]
+    result = engine.analyze({"columns": COLUMNS, "rows": rows})
+    assert [i.id for i in result.insights] == [i.id for i in base.insights]
+    assert base.totals["undated_rows"] == 0
+    assert result.totals["undated_rows"] == 1
+
+
+@pytest.mark.parametrize("unit, tz", [("ns", None), ("us", "UTC"), ("ms", "America/New_York")])
+def test_arrow_timestamps_with_time_of_day(unit: str, tz: Any) -> None:
+    pa = pytest.importorskip("pyarrow")
+    start = dt.datetime(2024, 3, 1, 12, 30, 15, 250000)
+    stamps = [start + dt.timedelta(days=d) for d in range(20)]
+    rows = _daily_rows(stamps)
+    table = pa.table(
+        {
+            "Date": pa.array([r[0] for r in rows], pa.timestamp(unit)).cast(pa.timestamp(unit, tz)),
+            **{c: [r[i] for r in rows] for i, c in enumerate(COLUMNS) if i},
+        }
+    )
+    engine = InsightEngine()
+    result = engine.analyze_arrow(table)
+    dates = [s.date().isoformat() for s in stamps]
+    text = engine.analyze({"columns": COLUMNS, "rows": _daily_rows(dates)})
+    assert [i.id for i in result.insights] == [i.id for i in text.insights]
+    assert any(i.id.startswith("fatigue") for i in result.insights)
+    assert result.totals["undated_rows"] == 0
+
+
+def test_a_report_date_alone_does_not_window() -> None:
+    # Aggregated exports: one row per ad (or campaign) with the report's start date
+    engine = InsightEngine()
+    columns = ["Reporting starts", "Campaign Name", "Ad Set Name", "Ad Name", "Amount Spent"]
+    columns += ["Impressions", "Link Clicks"]
+    ads = [
+        ["2024-01-01", "C1", "S1", "Hero", 50, 10000, 50],
+        ["2024-01-01", "C2", "S1", "Hero", 60, 10000, 300],
+        ["2024-01-01", "C2", "S2", "Other", 70, 10000, 40],
+    ]
+    campaigns = [["2024-01-01", "C1", 50, 10000, 20], ["2024-01-02", "C1", 50, 10000, 20]]
+    campaigns += [["2024-01-01", "C2", 50, 10000, 300]]
+    by_campaign = ["Day", "Campaign Name", "Amount Spent", "Impressions", "Link Clicks"]
+    for cols, rows in ((columns, ads), (by_campaign, campaigns)):
+        dated = engine.analyze({"columns": cols, "rows": rows, "config": {"chunk_rows": 1}})
+        plain = engine.analyze({"columns": cols[1:], "rows": [r[1:] for r in rows]})
+        assert dated.insights == plain.insights
+        assert len(dated.insights) == 2 and "undated_rows" not in dated.totals
+
+
+def test_daily_ads_without_ids() -> None:
+    # Same-named ads in two campaigns stay apart; rows naming no ad pass through unwindowed
+    days = [(dt.date(2024, 3, 1) + dt.timedelta(days=d)).isoformat() for d in range(20)]
+    columns = ["Date", "Campaign Name", "Ad Name", "Spend", "Impressions", "Clicks", "Frequency"]
+    rows = []
+    for day, (_, _, _, spend, impressions, clicks, frequency) in zip(days, _daily_rows(days)[::2]):
+        rows.append([day, "C1", "Hero", spend, impressions, clicks, frequency])
+        rows.append([day, "C2", "Hero", 10, 1000, 20, 1.2])
+    rows.append([days[0], "C3", "", 10, 10000, 5, 1.2])
+    config = {"chunk_rows": 7}
+    result = InsightEngine().analyze({"columns": columns, "rows": rows, "config": config})
+    ids = [i.id for i in result.insights]
+    assert ids.count("fatigue-Hero") == 1
+    assert "ctr-weak-None" in ids
+    assert result.totals["rows"] == 41 and result.totals["undated_rows"] == 0
+
+    windows = DailyWindows()
+    windows.add(build_frame(columns, rows, map_columns(columns)))
+    assert len(windows) == 2 and windows.several_days
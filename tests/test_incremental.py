@@ -0,0 +1,117 @@
+from __future__ import annotations
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from benchmarks.synth import synth_export
+from insight_agent import InsightEngine
+from insight_agent.column_mapper import map_columns
+from insight_agent.frame import build_frame
+from insight_agent.incremental import AdStateStore
+from insight_agent.rollup import ROLLUP_LEVELS, RollupAccumulator
+
+COLUMNS = [
+    "Campaign Name", "Ad Set Name", "Ad ID", "Ad Name", "Amount Spent", "Impressions", "Link Clicks"
+]
+ROLLUPS = {"rollups": ["ad_set", "campaign", "account"]}
+# Every row has an ad id, spread over few groups so deltas keep rewriting the same roll-ups
+SYNTH = {"null_density": 0.0, "variant": 0, "campaigns": 3, "ad_sets_per_campaign": 2}
+
+
+def _store(tmp_path: Path) -> AdStateStore:
+    store = AdStateStore(str(tmp_path / "state.sqlite3"))
+    store.open()
+    return store
+
+
+def _ids(insights: List[Any]) -> List[str]:
+    return sorted(i.id for i in insights)
+
+
+def _stored_rollups(store: AdStateStore) -> Dict[Tuple[str, str], np.ndarray]:
+    with sqlite3.connect(store.path) as db:
+        rows = db.execute("SELECT level, grp, stats FROM rollups").fetchall()
+    return {(level, grp): np.frombuffer(stats, dtype=np.float64) for level, grp, stats in rows}
+
+
+def _expected_rollups(
+    columns: List[str], rows: List[List[Any]]
+) -> Dict[Tuple[str, str], np.ndarray]:
+    rollups = RollupAccumulator(ROLLUP_LEVELS)
+    rollups.add(build_frame(columns, rows, map_columns(columns)))
+    return {
+        (level, json.dumps(list(group))): stats
+        for level in ROLLUP_LEVELS
+        for group, stats in rollups.groups(level)
+        if stats[0] > 0.5
+    }
+
+
+def _assert_same_rollups(store: AdStateStore, columns: List[str], rows: List[List[Any]]) -> None:
+    stored, expected = _stored_rollups(store), _expected_rollups(columns, rows)
+    assert stored.keys() == expected.keys()
+    for key, stats in expected.items():
+        assert np.allclose(stored[key], stats, equal_nan=True), key
+
+
+def test_added_changed_resolved(tmp_path: Path) -> None:
+    store = _store(tmp_path)
+    engine = InsightEngine()
+
+    def delta(rows: List[List[Any]]) -> Any:
+        return engine.analyze_delta({"columns": COLUMNS, "rows": rows}, store)
+
+    first = delta([["c", "s", "1", "A", 50, 10000, 20], ["c", "s", "2", "B", 50, 10000, 300]])
+    assert first.ads_updated == 2
+    assert _ids(first.added) == ["ctr-weak-1"] and not first.changed and not first.resolved
+
+    # Ad 2 is left out and keeps its state; ad 1 is still weak, with a new rationale
+    second = delta([["c", "s", "1", "A", 50, 10000, 30]])
+    assert second.ads_updated == 1
+    assert not second.added and _ids(second.changed) == ["ctr-weak-1"] and not second.resolved
+
+    third = delta([["c", "s", "1", "A", 50, 10000, 400]])
+    assert not third.added and not third.changed and _ids(third.resolved) == ["ctr-weak-1"]
+    assert not delta([["c", "s", "1", "A", 50, 10000, 400]]).resolved
+
+
+def test_sequential_deltas_match_a_full_rollup(tmp_path: Path) -> None:
+    store = _store(tmp_path)
+    engine = InsightEngine()
+    columns, rows = synth_export(400, seed=0, **SYNTH)
+    # The same ads with new metrics and, mostly, a new campaign and ad set
+    _, updates = synth_export(400, seed=1, **SYNTH)
+
+    latest = {}
+    for part in (rows[:150], rows[150:], updates[100:250], updates[:50]):
+        engine.analyze_delta({"columns": columns, "rows": part, "config": ROLLUPS}, store)
+        latest.update({row[3]: row for row in part})
+    _assert_same_rollups(store, columns, list(latest.values()))
+
+
+def test_concurrent_deltas_keep_every_update(tmp_path: Path) -> None:
+    store = _store(tmp_path)
+    engine = InsightEngine()
+    columns, rows = synth_export(480, seed=2, **SYNTH)
+    parts = [rows[i::12] for i in range(12)]
+    errors: List[BaseException] = []
+    start = threading.Barrier(len(parts))
+
+    def apply(part: List[List[Any]]) -> None:
+        try:
+            start.wait()
+            engine.analyze_delta({"columns": columns, "rows": part, "config": ROLLUPS}, store)
+        except BaseException as e:  # pragma: no cover
+            errors.append(e)
+
+    threads = [threading.Thread(target=apply, args=(part,)) for part in parts]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    _assert_same_rollups(store, columns, rows)
@@ -0,0 +1,106 @@
+from __future__ import annotations
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, ClassVar, Dict, Iterator, List
+
+import pytest
+
+from insight_agent import llm
+from insight_agent.models import Insight
+
+
+class StubOpenAI(BaseHTTPRequestHandler):
+    # Chat completions endpoint; model "slow" answers after the client's timeout
+    requests: ClassVar[List[Dict[str, Any]]] = []
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["content-length"])))
+        StubOpenAI.requests.append(body)
+        if body["model"] == "slow":
+            time.sleep(1.0)
+        message = {"role": "assistant", "content": "Stub summary."}
+        out = json.dumps(
+            {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop", "message": message}],
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+@pytest.fixture
+def stub(monkeypatch: pytest.MonkeyPatch) -> Iterator[List[Dict[str, Any]]]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenAI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+    monkeypatch.setattr(llm, "_client", None)
+    llm.summary_cache.clear()
+    StubOpenAI.requests = []
+    yield StubOpenAI.requests
+    server.shutdown()
+    server.server_close()
+    llm.summary_cache.clear()
+
+
+def _insights() -> List[Insight]:
+    return [
+        Insight(id="ctr-low-a", scope="ad", action="test", title="Low CTR", rationale="0.3%"),
+        Insight(id="roas-low-b", scope="ad", action="pause", title="Low ROAS", rationale="0.5x"),
+    ]
+
+
+def test_summary_is_cached_by_content(stub: List[Dict[str, Any]]) -> None:
+    first = llm.summarize_insights(_insights())
+    second = llm.summarize_insights(_insights())
+    assert first == second == "Stub summary."
+    assert len(stub) == 1
+    assert llm.summary_cache.hits == 1
+
+    # Another model is another cache entry
+    llm.summarize_insights(_insights(), model="gpt-4o")
+    assert len(stub) == 2
+
+
+def test_timeout_falls_back_to_deterministic_summary(stub: List[Dict[str, Any]]) -> None:
+    started = time.monotonic()
+    summary = llm.summarize_insights(_insights(), model="slow", timeout=0.2)
+    assert time.monotonic() - started < 1.0
+    assert summary == "2 insights. test: 1 pause: 1"
+    assert len(stub) == 1
+    # Fallbacks are not cached, so the next call asks again
+    assert llm.summary_cache.info()["size"] == 0
+
+
+def test_no_api_key_never_calls_the_endpoint(
+    stub: List[Dict[str, Any]], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.delenv("OPENAI_API_KEY")
+    assert llm.summarize_insights(_insights()) == "2 insights. test: 1 pause: 1"
+    assert stub == []
+
+
+def test_engine_only_calls_the_llm_when_enabled(stub: List[Dict[str, Any]]) -> None:
+    from insight_agent import InsightEngine
+
+    csv = "Ad Name,Spend,Impressions,Clicks,Revenue\na,10,1000,2,3\nb,20,100,9,50\n"
+    engine = InsightEngine()
+    result = engine.analyze({"csv": csv})
+    assert result.summary != "Stub summary."
+    assert stub == []
+
+    result = engine.analyze({"csv": csv, "config": {"llm_enabled": True}})
+    assert result.summary == "Stub summary."
+    assert len(stub) == 1
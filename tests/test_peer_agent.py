@@ -0,0 +1,89 @@
+from __future__ import annotations
+import random
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from benchmarks.synth import synth_export
+from insight_agent import InsightEngine
+from insight_agent.agents.peer_agent import peer_stats
+from insight_agent.incremental import AdStateStore
+
+PEERS = {"peer_outliers": True, "max_insights": 100000}
+
+
+def _peer_ids(result: Any) -> List[str]:
+    return [i.id for i in result.insights if i.id.startswith("peer-")]
+
+
+def test_off_by_default() -> None:
+    columns, rows = synth_export(2000, seed=1)
+    result = InsightEngine().analyze({"columns": columns, "rows": rows})
+    assert _peer_ids(result) == []
+
+
+def test_peers_span_every_chunk() -> None:
+    columns, rows = synth_export(6000, seed=1)
+    engine = InsightEngine()
+    config = {**PEERS, "chunk_rows": 50000}
+    whole = engine.analyze({"columns": columns, "rows": rows, "config": config})
+    assert _peer_ids(whole)
+    for config in ({"chunk_rows": 1000}, {"chunk_rows": 777, "workers": 3, "shard_rows": 1000}):
+        chunked = engine.analyze({"columns": columns, "rows": rows, "config": {**PEERS, **config}})
+        assert chunked.insights == whole.insights
+
+    # Row order does not change who the peers are
+    shuffled = rows[:]
+    random.Random(0).shuffle(shuffled)
+    config = {**PEERS, "chunk_rows": 1000}
+    reordered = engine.analyze({"columns": columns, "rows": shuffled, "config": config})
+    assert sorted(_peer_ids(reordered)) == sorted(_peer_ids(whole))
+
+
+def test_deltas_leave_peer_insights_alone(tmp_path: Path) -> None:
+    columns, rows = synth_export(2000, seed=1)
+    engine = InsightEngine()
+    seeded = engine.analyze({"columns": columns, "rows": rows, "config": PEERS})
+    flagged = {i.keys["ad_id"] for i in seeded.insights if i.id.startswith("peer-")}
+    assert flagged
+
+    store = AdStateStore(str(tmp_path / "state.sqlite3"))
+    store.open()
+    engine.analyze_delta({"columns": columns, "rows": rows, "config": PEERS}, store)
+    ad_id = columns.index(next(c for c in columns if "id" in c.lower()))
+    again = [r for r in rows if r[ad_id] in flagged][:5]
+    delta = engine.analyze_delta({"columns": columns, "rows": again, "config": PEERS}, store)
+    assert delta.ads_updated == 5
+    assert not delta.added and not delta.changed and not delta.resolved
+
+
+def test_peer_stats_against_a_direct_computation() -> None:
+    rng = np.random.default_rng(0)
+    codes = rng.integers(-1, 30, 600)
+    value = rng.lognormal(0, 0.5, 600)
+    weight = rng.exponential(10, 600)
+    z, _, median, size = peer_stats(codes, value, weight)
+
+    def weighted_median(x: np.ndarray, w: np.ndarray) -> float:
+        order = np.argsort(x, kind="stable")
+        cum = np.cumsum(w[order])
+        return float(x[order][np.argmax(cum >= 0.5 * cum[-1])])
+
+    expected: Dict[str, List[float]] = {"z": [], "median": [], "size": []}
+    rows = np.flatnonzero(codes >= 0)
+    for i in rows:
+        group = codes == codes[i]
+        center = weighted_median(value[group], weight[group])
+        deviation = np.abs(value[group] - center)
+        mad = weighted_median(deviation, weight[group])
+        # Mean absolute deviation when over half the weight sits on the median
+        mean_ad = (weight[group] * deviation).sum() / weight[group].sum()
+        scale = 1.4826 * mad if mad > 0 else 1.2533 * mean_ad
+        expected["z"].append((value[i] - center) / scale if scale > 0 else np.nan)
+        expected["median"].append(center)
+        expected["size"].append(group.sum())
+    assert np.allclose(z[rows], expected["z"], equal_nan=True)
+    assert np.allclose(median[rows], expected["median"])
+    assert (size[rows] == expected["size"]).all()
+    assert np.isnan(z[codes < 0]).all()
@@ -0,0 +1,53 @@
+from __future__ import annotations
+from typing import List
+
+from insight_agent import InsightEngine
+from insight_agent.agents.base import BaseAgent
+from insight_agent.models import Insight, RowMetrics
+
+COLUMNS = ["Ad ID", "Ad Name", "Amount Spent", "Impressions", "Link Clicks"]
+ROWS = [["1", "A", 50, 10000, 80], ["2", "B", 50, 10000, 150], ["3", "C", 50, 10000, 300]]
+
+
+class BigSpendAgent(BaseAgent):
+    # Row-based custom agent, as callers write them
+    name = "big_spend_agent"
+
+    def analyze(self, rows: List[RowMetrics]) -> List[Insight]:
+        return [
+            Insight(
+                id=f"big-spend-{r.ad_id}", scope="ad", action="keep", title="Big spender", rationale=""
+            )
+            for r in rows
+            if (r.spend or 0) >= 50
+        ]
+
+
+def _ids(engine: InsightEngine, **config: object) -> List[str]:
+    result = engine.analyze({"columns": COLUMNS, "rows": ROWS, "config": config or None})
+    return sorted(i.id for i in result.insights)
+
+
+def test_per_request_thresholds() -> None:
+    engine = InsightEngine()
+    # CTRs are 0.8%, 1.5% and 3%; the default healthy bar is 1%
+    assert [i for i in _ids(engine) if i.startswith("ctr-")] == ["ctr-weak-1"]
+    raised = [i for i in _ids(engine, ctr_healthy_pct=2.0) if i.startswith("ctr-")]
+    assert raised == ["ctr-weak-1", "ctr-weak-2"]
+    # Compiled once per threshold set, and the engine's own config is untouched
+    strict = engine.config.model_copy(update={"ctr_healthy_pct": 2.0})
+    assert engine.pipeline(strict) is engine.pipeline(strict.model_copy())
+    assert [i for i in _ids(engine) if i.startswith("ctr-")] == ["ctr-weak-1"]
+
+
+def test_custom_agents_run_with_any_thresholds() -> None:
+    engine = InsightEngine()
+    # Compiled before the agent is added, so the cached pipeline lacks it
+    _ids(engine, ctr_healthy_pct=2.0)
+    engine.agents.append(BigSpendAgent())
+    expected = ["big-spend-1", "big-spend-2", "big-spend-3"]
+    for config in ({}, {"ctr_healthy_pct": 2.0}, {"peer_outliers": True}):
+        ids = _ids(engine, **config)
+        assert [i for i in ids if i.startswith("big-spend-")] == expected
+    assert "ctr-weak-2" in _ids(engine, ctr_healthy_pct=2.0)
+
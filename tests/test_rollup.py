@@ -0,0 +1,102 @@
+from __future__ import annotations
+from typing import Any, Dict, List
+
+import numpy as np
+import pytest
+
+from benchmarks.synth import synth_export
+from insight_agent import InsightEngine
+from insight_agent.column_mapper import map_columns
+from insight_agent.frame import MetricsFrame, build_frame
+from insight_agent.rollup import ROLLUP_LEVELS, RollupAccumulator
+
+COLUMNS = [
+    "Campaign Name", "Ad Set Name", "Ad ID", "Amount Spent", "Impressions", "Link Clicks",
+    "Purchases", "Purchase Value", "CTR",
+]
+ROWS = [
+    ["C1", "S1", "1", 100, 10000, 100, 2, 150, 1.0],
+    ["C1", "S1", "2", 300, 20000, 600, 6, 900, 3.0],
+    ["C1", "S2", "3", 50, 5000, 25, "", 40, ""],
+    ["C2", "S1", "4", 200, 8000, 40, 1, 100, 0.5],
+    # No ad set: in C2 and the account, but in no ad set
+    ["C2", "", "5", 10, 1000, 5, 0, 0, 0.5],
+    # No campaign: only in the account
+    ["", "", "6", 40, 2000, 30, 1, 20, 1.5],
+]
+
+
+def _frame(columns: List[str], rows: List[List[Any]]) -> MetricsFrame:
+    return build_frame(columns, rows, map_columns(columns))
+
+
+def _levels(rollups: RollupAccumulator) -> Dict[str, Dict[Any, Dict[str, float]]]:
+    out: Dict[str, Dict[Any, Dict[str, float]]] = {}
+    for frame in rollups.frames():
+        level = out.setdefault(frame.scope, {})
+        for i in range(len(frame)):
+            keys = (frame.ids["campaign"][i], frame.ids["ad_set"][i])
+            group = tuple(k for k in keys if k is not None)
+            level[group] = {k: float(v[i]) for k, v in frame.values.items()}
+    return out
+
+
+def test_sums_and_ratios() -> None:
+    rollups = RollupAccumulator(ROLLUP_LEVELS)
+    rollups.add(_frame(COLUMNS, ROWS))
+    levels = _levels(rollups)
+    assert set(levels["ad_set"]) == {("C1", "S1"), ("C1", "S2"), ("C2", "S1")}
+    assert set(levels["campaign"]) == {("C1",), ("C2",)}
+
+    s1 = levels["ad_set"][("C1", "S1")]
+    assert s1["spend"] == 400 and s1["impressions"] == 30000 and s1["clicks"] == 700
+    assert s1["roas"] == pytest.approx(1050 / 400)
+    # CTR is weighted by spend
+    assert s1["ctr"] == pytest.approx((1.0 * 100 + 3.0 * 300) / 400)
+    # A blank counter counts as zero; a blank CTR falls back to clicks / impressions
+    s2 = levels["ad_set"][("C1", "S2")]
+    assert s2["purchases"] == 0 and s2["ctr"] == pytest.approx(0.5)
+
+    c2 = levels["campaign"][("C2",)]
+    assert c2["spend"] == 210 and c2["purchases"] == 1 and c2["roas"] == pytest.approx(100 / 210)
+    account = levels["account"][()]
+    assert account["spend"] == 700 and account["impressions"] == 46000
+    assert account["purchase_value"] == 1210 and account["roas"] == pytest.approx(1210 / 700)
+
+
+def test_chunks_and_retractions_add_up() -> None:
+    columns, rows = synth_export(3000, seed=4)
+    whole = RollupAccumulator(ROLLUP_LEVELS)
+    whole.add(_frame(columns, rows))
+    chunked = RollupAccumulator(ROLLUP_LEVELS)
+    for start in range(0, len(rows), 700):
+        chunked.add(_frame(columns, rows[start : start + 700]))
+    # Adding rows and taking them back out leaves the other rows' sums
+    extra = _frame(*synth_export(500, seed=5))
+    chunked.add(extra)
+    chunked.add(extra, sign=-1.0)
+
+    for level in ROLLUP_LEVELS:
+        expected = dict(whole.groups(level))
+        got = {g: s for g, s in chunked.groups(level) if s[0] > 0.5}
+        assert got.keys() == expected.keys()
+        for group, stats in expected.items():
+            assert np.allclose(got[group], stats), (level, group)
+
+
+def test_engine_rollup_insights() -> None:
+    columns, rows = synth_export(800, seed=6)
+    config = {"rollups": list(ROLLUP_LEVELS), "max_insights": 5000}
+    whole = InsightEngine().analyze({"columns": columns, "rows": rows, "config": config})
+    assert len(whole.insights) < 5000
+    scopes = {i.scope for i in whole.insights}
+    assert {"ad", "ad_set", "campaign"} <= scopes
+    chunked = InsightEngine().analyze(
+        {"columns": columns, "rows": rows, "config": {**config, "chunk_rows": 300}}
+    )
+    assert chunked.insights == whole.insights
+    # Without roll-ups only ad insights come back
+    plain = InsightEngine().analyze(
+        {"columns": columns, "rows": rows, "config": {"max_insights": 5000}}
+    )
+    assert plain.insights == [i for i in whole.insights if i.scope == "ad"]
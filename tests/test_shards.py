@@ -0,0 +1,36 @@
+from __future__ import annotations
+import threading
+
+import pytest
+from pydantic import ValidationError
+
+from benchmarks.synth import synth_export
+from insight_agent import InsightEngine
+from insight_agent import shards
+from insight_agent.models import AnalysisConfig
+
+
+def test_sharded_run_matches_serial() -> None:
+    columns, rows = synth_export(6000, null_density=0.05)
+    engine = InsightEngine()
+    serial = engine.analyze({"columns": columns, "rows": rows, "config": {"max_insights": 500}})
+    config = {"max_insights": 500, "workers": 3, "shard_rows": 1000}
+    sharded = engine.analyze({"columns": columns, "rows": rows, "config": config})
+    assert sharded.insights == serial.insights
+    assert sharded.summary == serial.summary
+
+
+def test_requests_share_one_bounded_pool() -> None:
+    columns, rows = synth_export(3000)
+    engine = InsightEngine()
+    for workers in (2, 7, 64):
+        config = {"workers": workers, "shard_rows": 1000}
+        engine.analyze({"columns": columns, "rows": rows, "config": config})
+    live = [t for t in threading.enumerate() if t.name.startswith("insight-shard")]
+    assert len(live) <= shards.SHARD_THREADS
+
+
+@pytest.mark.parametrize("field, value", [("workers", 0), ("workers", 65), ("shard_rows", 1)])
+def test_config_bounds(field: str, value: int) -> None:
+    with pytest.raises(ValidationError):
+        AnalysisConfig(**{field: value})
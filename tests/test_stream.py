@@ -0,0 +1,58 @@
+from __future__ import annotations
+import io
+import random
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from benchmarks.synth import synth_export, to_csv
+from insight_agent import InsightEngine
+
+CHUNKED = {"chunk_rows": 97}
+
+
+def _slices(data: bytes, seed: int) -> Iterator[bytes]:
+    # Uneven slices, so boundaries fall inside rows, "\r\n" pairs and UTF-8 sequences
+    rng = random.Random(seed)
+    start = 0
+    while start < len(data):
+        size = rng.randint(1, 64)
+        yield data[start : start + size]
+        start += size
+
+
+@pytest.fixture(scope="module")
+def export() -> str:
+    columns, rows = synth_export(600, seed=3)
+    for i, row in enumerate(rows[:40]):
+        # Quoted newlines, non-ASCII names and separators str.splitlines treats as line ends
+        row[2] = ["Été\nad", "Ad\u2028two", "Ad\x0cfeed", "Ad\x1cfs", "Ad\x85nel"][i % 5] + str(i)
+    return to_csv(columns, rows)
+
+
+def test_stream_matches_whole_text(export: str) -> None:
+    engine = InsightEngine()
+    config = engine.config.model_copy(update=CHUNKED)
+    whole = engine.analyze({"csv": export, "config": CHUNKED})
+    assert whole.totals["rows"] == 600
+    for newline in ("\n", "\r\n", "\r"):
+        data = ("\ufeff" + export.replace("\r\n", newline)).encode("utf-8")
+        for seed in range(3):
+            streamed = engine.analyze_stream(_slices(data, seed), config)
+            assert streamed.totals == whole.totals
+            assert streamed.insights == whole.insights
+
+
+def test_stream_sources(export: str, tmp_path: Path) -> None:
+    engine = InsightEngine()
+    whole = engine.analyze_stream(io.StringIO(export, newline=""))
+    path = tmp_path / "export.csv"
+    path.write_bytes(export.encode("utf-8-sig"))
+    assert engine.analyze_stream(str(path)).insights == whole.insights
+    assert engine.analyze_stream(io.BytesIO(path.read_bytes())).insights == whole.insights
+
+
+def test_empty_stream() -> None:
+    with pytest.raises(ValueError, match="empty"):
+        InsightEngine().analyze_stream(iter([b""]))